@@ -1,2 +1,19 @@
-from .databasemanager import DatabaseManager
-from .fileprocessor import FileProcessor
\ No newline at end of file
+import importlib
+
+# Exported names and the module defining each; a module is only imported when its name is first
+# used, so light entry points such as `python -m backend.ingest --help` do not load the heavy ones
+_EXPORTS = {
+    'DatabaseManager': '.databasemanager',
+    'FileProcessor': '.fileprocessor',
+    'StorageBackend': '.storage',
+    'create_storage_backend': '.storage',
+    'SQLiteManager': '.sqlitemanager',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(_EXPORTS[name], __name__), name)
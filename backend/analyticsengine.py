@@ -0,0 +1,245 @@
+import logging
+import threading
+import time
+import numpy as np
+import pandas as pd
+from backend.storage import statement_timeout
+
+logger = logging.getLogger(__name__)
+
+# Above this many (city, day) cells per row, Q2 groups by sorting instead of a dense bincount
+DENSE_GROUP_FACTOR = 4
+# The loaded data; a reload builds new arrays and swaps them in together
+ARRAY_ATTRIBUTES = ('days', 'city_codes', 'plan_codes', 'revenue', 'cities', 'plans')
+
+
+def _codes(column):
+    """Returns (integer codes, distinct values) for a column, reusing categorical codes when present."""
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        return column.cat.codes.to_numpy(), column.cat.categories.to_numpy()
+    codes, uniques = pd.factorize(column, sort=True)
+    return codes, np.asarray(uniques)
+
+
+def _smallest_int(count):
+    return np.int16 if count < np.iinfo(np.int16).max else np.int32
+
+
+class AnalyticsEngine:
+    """Answers the five dashboard questions from typed in-memory arrays in one vectorized pass.
+
+    The arrays are loaded from the storage backend (or a current Parquet snapshot) and reloaded only
+    when the storage data_version changes; the answers are computed once per version, as part of the
+    load. answers() never waits for a load: a changed version starts one on a background thread,
+    outside any dashboard query timeout, and callers fall back to the database until it finishes.
+    """
+
+    def __init__(self, snapshot_store=None, max_rows=20000000):
+        self.snapshot_store = snapshot_store
+        # Larger tables are left to the database rollups rather than held in memory
+        self.max_rows = max_rows
+        # Guards the swap of arrays, stamp and answers; never held while loading
+        self._lock = threading.Lock()
+        self._stamp = None  # (storage namespace, data version) of the loaded arrays
+        self._answers = None
+        self._loading = False
+        self._unservable = None  # stamp the engine found it cannot serve, so it is not retried
+        self.last_load_seconds = 0.0
+        self.last_answer_seconds = 0.0
+        self._clear()
+
+    def _clear(self):
+        self.days = np.empty(0, dtype=np.int32)  # days since 1970-01-01
+        self.city_codes = np.empty(0, dtype=np.int16)  # index into self.cities
+        self.plan_codes = np.empty(0, dtype=np.int16)  # index into self.plans
+        self.revenue = np.empty(0, dtype=np.float32)
+        self.cities = np.empty(0, dtype=np.int32)
+        self.plans = np.empty(0, dtype=object)
+
+    def load(self, df):
+        """Replaces the arrays with the rows of a revenue_data frame."""
+        if df.empty:
+            self._clear()
+            return
+        city_codes, cities = _codes(df['city_code'])
+        plan_codes, plans = _codes(df['plans'])
+        self.days = df['date'].to_numpy(dtype='datetime64[D]').astype(np.int32)
+        self.city_codes = city_codes.astype(_smallest_int(len(cities)))
+        self.plan_codes = plan_codes.astype(_smallest_int(len(plans)))
+        self.revenue = df['plan_revenue_crores'].to_numpy(dtype=np.float32)
+        self.cities = cities.astype(np.int32)
+        self.plans = plans.astype(object)
+
+    def _read_rows(self, storage):
+        if self.snapshot_store is not None and self.snapshot_store.is_current(storage):
+            return self.snapshot_store.read()
+        return storage.fetch_records_columnar()
+
+    @staticmethod
+    def _current_stamp(storage):
+        version = storage.data_version()
+        if version is None:
+            return None
+        return getattr(storage, 'cache_namespace', id(storage)), version
+
+    def refresh(self, storage, stamp=None):
+        """Reloads the arrays and answers in the calling thread if the storage data changed.
+
+        Returns False if the engine cannot serve the data. The readers keep the previous arrays and
+        answers until the new ones are swapped in.
+        """
+        stamp = stamp or self._current_stamp(storage)
+        if stamp is None:
+            return False
+        if stamp == self._stamp:
+            return True
+
+        row_count = storage.count_records()
+        if row_count is None or row_count > self.max_rows:
+            self._unservable = stamp
+            return False
+        started = time.perf_counter()
+        df = self._read_rows(storage)
+        if df.empty and row_count:
+            return False
+        loaded = AnalyticsEngine(max_rows=self.max_rows)
+        loaded.load(df)
+        load_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        answers = loaded.compute()
+        answer_seconds = time.perf_counter() - started
+
+        with self._lock:
+            for name in ARRAY_ATTRIBUTES:
+                setattr(self, name, getattr(loaded, name))
+            self._stamp = stamp
+            self._answers = answers
+            self.last_load_seconds = load_seconds
+            self.last_answer_seconds = answer_seconds
+        return True
+
+    def _refresh_in_background(self, storage, stamp):
+        with self._lock:
+            if self._loading:
+                return
+            self._loading = True
+
+        def run():
+            try:
+                # A full-table load takes longer than a dashboard query may; it runs without that limit
+                with statement_timeout(None):
+                    self.refresh(storage, stamp)
+            except Exception as e:
+                logger.exception("Error while loading the analytics engine")
+            finally:
+                with self._lock:
+                    self._loading = False
+
+        threading.Thread(target=run, name='analytics-engine-load', daemon=True).start()
+
+    def answers(self, storage):
+        """Returns all five answers for the storage's current data, or None to fall back to the database.
+
+        Returns at once: when the data changed since the last load, a reload starts in the background
+        and the caller gets None until it has finished.
+        """
+        try:
+            stamp = self._current_stamp(storage)
+        except Exception as e:
+            logger.exception("Error while reading the data version for the analytics engine")
+            return None
+        if stamp is None or stamp == self._unservable:
+            return None
+        with self._lock:
+            if stamp == self._stamp:
+                return dict(self._answers)
+        self._refresh_in_background(storage, stamp)
+        return None
+
+    def compute(self):
+        """Answers the five questions from the loaded arrays, in the formats the storage backends return."""
+        if len(self.revenue) == 0:
+            return {name: "No records found." for name in (
+                'total_revenue', 'record_with_max_revenue', 'plan_with_max_revenue', 'total_city_count',
+                'city_by_revenue_across_plans',
+            )}
+
+        # float32 values summed in double precision, as the databases do for FLOAT columns
+        revenue = self.revenue.astype(np.float64)
+        city_codes = self.city_codes.astype(np.intp)
+        plan_codes = self.plan_codes.astype(np.intp)
+        n_cities, n_plans = len(self.cities), len(self.plans)
+
+        # Q1: total revenue
+        total_revenue = revenue.sum()
+
+        # Q2: city and day with the highest revenue
+        first_day = int(self.days.min())
+        day_offsets = (self.days - first_day).astype(np.intp)
+        n_days = int(day_offsets.max()) + 1
+        cell_keys = city_codes * n_days + day_offsets
+        if n_cities * n_days <= DENSE_GROUP_FACTOR * len(revenue):
+            cell_totals = np.bincount(cell_keys, weights=revenue, minlength=n_cities * n_days)
+            best_cell = int(np.argmax(cell_totals))
+            best_cell_total = cell_totals[best_cell]
+        else:
+            # Sparse key space: sum sorted segments instead of allocating every (city, day) cell
+            order = np.argsort(cell_keys, kind='stable')
+            sorted_keys = cell_keys[order]
+            starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+            segment_totals = np.add.reduceat(revenue[order], starts)
+            best_segment = int(np.argmax(segment_totals))
+            best_cell = int(sorted_keys[starts[best_segment]])
+            best_cell_total = segment_totals[best_segment]
+        best_city, best_day = divmod(best_cell, n_days)
+
+        # Q3: plan with the highest total revenue
+        plan_totals = np.bincount(plan_codes, weights=revenue, minlength=n_plans)
+        best_plan = int(np.argmax(plan_totals))
+
+        # Q4: cities with non-zero revenue for plan p3
+        p3 = np.flatnonzero(self.plans == 'p3')
+        if len(p3):
+            contributing = (plan_codes == p3[0]) & (self.revenue != 0)
+            city_count = int(np.count_nonzero(np.bincount(city_codes[contributing], minlength=n_cities)))
+        else:
+            city_count = 0
+
+        # Q5: rows holding each plan's top revenue (ties included, like RANK() = 1), summed per city
+        plan_max = np.full(n_plans, -np.inf, dtype=np.float32)
+        np.maximum.at(plan_max, plan_codes, self.revenue)
+        top_rows = self.revenue == plan_max[plan_codes]
+        top_city_totals = np.bincount(city_codes[top_rows], weights=revenue[top_rows], minlength=n_cities)
+        top_city = int(np.argmax(top_city_totals))
+
+        return {
+            'total_revenue': {'total_revenue': round(float(total_revenue), 2)},
+            'record_with_max_revenue': {
+                'city_code': int(self.cities[best_city]),
+                'date': (np.datetime64(first_day + best_day, 'D')).astype(object),
+                'tot_revenue': round(float(best_cell_total), 2),
+            },
+            'plan_with_max_revenue': {
+                'plans': self.plans[best_plan],
+                'tot_revenue': round(float(plan_totals[best_plan]), 2),
+            },
+            'total_city_count': {'city_count': city_count},
+            'city_by_revenue_across_plans': {
+                'city_code': int(self.cities[top_city]),
+                'total_revenue': round(float(top_city_totals[top_city]), 2),
+            },
+        }
+
+
+# One engine per process, shared by every Streamlit session
+_shared_engine = None
+_shared_engine_lock = threading.Lock()
+
+
+def get_shared_engine(snapshot_store=None):
+    """Returns the process-wide AnalyticsEngine, creating it on first use."""
+    global _shared_engine
+    with _shared_engine_lock:
+        if _shared_engine is None:
+            _shared_engine = AnalyticsEngine(snapshot_store=snapshot_store)
+        return _shared_engine
@@ -0,0 +1,76 @@
+import asyncio
+import contextvars
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from backend.instrumentation import count, timed
+from backend.storage import statement_timeout
+
+logger = logging.getLogger(__name__)
+
+# Matches the default connection pool size, so concurrent queries do not queue for connections
+DEFAULT_MAX_WORKERS = 5
+
+
+def default_query_timeout():
+    """Seconds each dashboard query may take, from REVENUE_QUERY_TIMEOUT (default 10, 0 disables it)."""
+    value = float(os.environ.get('REVENUE_QUERY_TIMEOUT', '10'))
+    return value if value > 0 else None
+
+
+class AsyncQueryRunner:
+    """Runs blocking storage calls concurrently from asyncio on a shared thread pool.
+
+    Page latency becomes that of the slowest query instead of the sum of all of them. Every call
+    gets a timeout: the backend aborts its statements after it (MySQL max_execution_time, the
+    SQLite progress handler), a call still queued for a thread is cancelled, and its result is None.
+    """
+
+    def __init__(self, executor, timeout=None):
+        self.executor = executor
+        self.timeout = timeout
+
+    async def call(self, name, function, timeout=None):
+        """Runs function() on the pool and returns its result, or None if it failed or timed out."""
+        timeout = timeout if timeout is not None else self.timeout
+        loop = asyncio.get_running_loop()
+        # Threads do not inherit context variables; the copy carries the operation labels and the timeout
+        context = contextvars.copy_context()
+        future = loop.run_in_executor(self.executor, context.run, self._run, function, timeout)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            count('query_timeouts', operation=name)
+            logger.warning("Dashboard query %s timed out after %ss", name, timeout)
+        except Exception as e:
+            logger.warning("Dashboard query %s failed: %s", name, e)
+        return None
+
+    @staticmethod
+    def _run(function, timeout):
+        with statement_timeout(timeout):
+            return function()
+
+    async def gather(self, calls, timeout=None):
+        """Runs {name: function} concurrently and returns {name: result}."""
+        results = await asyncio.gather(*(self.call(name, function, timeout) for name, function in calls.items()))
+        return dict(zip(calls, results))
+
+    def run_all(self, calls, timeout=None):
+        """Blocking entry point for callers without an event loop, such as a Streamlit script run."""
+        with timed('dashboard_queries'):
+            return asyncio.run(self.gather(calls, timeout))
+
+
+_shared_executor = None
+_shared_executor_lock = threading.Lock()
+
+
+def get_shared_runner(max_workers=DEFAULT_MAX_WORKERS, timeout=None):
+    """Returns a runner on the process-wide query thread pool, shared by all Streamlit sessions."""
+    global _shared_executor
+    with _shared_executor_lock:
+        if _shared_executor is None:
+            _shared_executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='dashboard-query')
+    return AsyncQueryRunner(_shared_executor, timeout=timeout if timeout is not None else default_query_timeout())
@@ -0,0 +1,280 @@
+import csv
+import logging
+import os
+import tempfile
+import time
+from mysql.connector import Error
+
+logger = logging.getLogger(__name__)
+
+REVENUE_COLUMNS = ['date', 'city_code', 'plans', 'plan_revenue_crores']
+
+
+class BulkLoadResult:
+    def __init__(self):
+        self.rows_received = 0
+        self.rows_inserted = 0
+        self.batches = 0
+        self.elapsed = 0.0
+        self.rejected = []  # One dict per rejected row: {'row': (...), 'error': '...'}
+        self.error = None  # Why the load failed as a whole; nothing was written then
+
+    @property
+    def failed(self):
+        return self.error is not None
+
+    @property
+    def rows_rejected(self):
+        return len(self.rejected)
+
+    @property
+    def rows_per_second(self):
+        return self.rows_inserted / self.elapsed if self.elapsed > 0 else 0.0
+
+    def reject(self, row, error):
+        self.rejected.append({'row': row, 'error': str(error)})
+
+    def __repr__(self):
+        return (
+            f"BulkLoadResult(inserted={self.rows_inserted}, rejected={self.rows_rejected}, "
+            f"batches={self.batches}, rows_per_second={self.rows_per_second:.0f})"
+        )
+
+
+class BulkLoader:
+    def __init__(self, connection_manager, batch_size=5000, use_load_data=False, reject_table=None, upsert=False,
+                 rollups=None, table='revenue_data', plan_codes=None, single_transaction=False):
+        self.connection_manager = connection_manager
+        self.table = table
+        # PlanCodes (backend/dimensions.py) for a table that stores plan_id instead of the plan
+        # label; rows keep their labels until the moment they are sent
+        self.plan_codes = plan_codes
+        self._plan_ids = {}
+        self.batch_size = batch_size
+        self.use_load_data = use_load_data
+        self.reject_table = reject_table
+        self.upsert = upsert
+        # RollupManager kept in step with every batch, in the same transaction as the batch itself
+        self.rollups = rollups
+        # By default every batch is committed on its own; single_transaction commits a whole load()
+        # at once, undoing a failed batch back to a savepoint instead of rolling the transaction back
+        self.single_transaction = single_transaction
+
+    @staticmethod
+    def rows_from_dataframe(df):
+        """Builds insert tuples from the DataFrame's column arrays without creating per-row Series."""
+        columns = [BulkLoader._column_values(df[column]) for column in REVENUE_COLUMNS]
+        return list(zip(*columns))
+
+    @staticmethod
+    def _column_values(column):
+        if column.dtype.kind == 'M':
+            # Native dates go to the driver as datetime.date, without formatting them as strings
+            return column.to_numpy(dtype='datetime64[D]').tolist()
+        return column.tolist()
+
+    @property
+    def _columns(self):
+        return 'date, city_code, plan_id, plan_revenue_crores' if self.plan_codes is not None else ', '.join(REVENUE_COLUMNS)
+
+    def _encode(self, rows):
+        """Replaces the plan label of each row with its plan_id when the table stores ids."""
+        if self.plan_codes is None:
+            return rows
+        return [(date, city_code, self._plan_ids[plans], revenue) for date, city_code, plans, revenue in rows]
+
+    def _insert_query(self):
+        insert_query = f"""
+        INSERT INTO {self.table} ({self._columns})
+        VALUES (%s, %s, %s, %s)
+        """
+        if self.upsert:
+            insert_query += "ON DUPLICATE KEY UPDATE plan_revenue_crores = VALUES(plan_revenue_crores)"
+        return insert_query
+
+    def load(self, df, before_commit=None):
+        """Inserts a DataFrame into the table in batches and returns a BulkLoadResult.
+
+        With single_transaction, before_commit(cursor, result) runs just before the one commit, so
+        whatever it writes is committed together with the rows.
+        """
+        result = BulkLoadResult()
+        started = time.perf_counter()
+
+        with self.connection_manager.get_connection_and_cursor() as (connection, cursor):
+            if connection is None or cursor is None:
+                logger.error("Failed to insert data due to database connection error.")
+                result.error = "database connection error"
+                return result
+
+            self.write(connection, cursor, df, result)
+            if self.single_transaction:
+                if before_commit is not None:
+                    before_commit(cursor, result)
+                connection.commit()
+            if self.reject_table and result.rejected:
+                self.store_rejects(connection, cursor, result.rejected)
+
+        result.elapsed = time.perf_counter() - started
+        return result
+
+    def write(self, connection, cursor, df, result):
+        """Writes a DataFrame in batches over an open connection, adding the outcome to result."""
+        result.rows_received += len(df)
+
+        # Rows with missing values can never satisfy the NOT NULL columns, reject them up front
+        missing = df[REVENUE_COLUMNS].isna().any(axis=1)
+        if missing.any():
+            missing_rows = df.loc[missing, REVENUE_COLUMNS].astype(object)
+            missing_rows = missing_rows.where(missing_rows.notna(), None)
+            for row in self.rows_from_dataframe(missing_rows):
+                result.reject(row, "Missing or invalid value in a required column")
+            df = df[~missing]
+
+        if self.plan_codes is not None and len(df):
+            self._plan_ids.update(self.plan_codes.register(connection, cursor, df['plans'].unique()))
+            unknown = ~df['plans'].isin(list(self._plan_ids))
+            if unknown.any():
+                for row in self.rows_from_dataframe(df[unknown]):
+                    result.reject(row, "Plan label cannot be stored")
+                df = df[~unknown]
+
+        for start in range(0, len(df), self.batch_size):
+            rows = self.rows_from_dataframe(df.iloc[start:start + self.batch_size])
+            if self.rollups is not None:
+                self._write_batch_with_rollups(connection, cursor, rows, result)
+            elif self.use_load_data:
+                self._load_data_batch(connection, cursor, rows, result)
+            else:
+                self._insert_batch(connection, cursor, rows, result)
+            result.batches += 1
+
+    def _begin_batch(self, cursor):
+        if self.single_transaction:
+            cursor.execute("SAVEPOINT bulk_batch")
+
+    def _end_batch(self, connection, cursor):
+        if self.single_transaction:
+            cursor.execute("RELEASE SAVEPOINT bulk_batch")
+        else:
+            connection.commit()
+
+    def _undo_batch(self, connection, cursor):
+        if self.single_transaction:
+            cursor.execute("ROLLBACK TO SAVEPOINT bulk_batch")
+        else:
+            connection.rollback()
+
+    def _write_rows_with_rollups(self, connection, cursor, rows, result):
+        """Writes rows and their rollup deltas in a single transaction (or savepoint)."""
+        self._begin_batch(cursor)
+        existing = self.rollups.lock_existing(cursor, rows, self._plan_ids if self.plan_codes is not None else None)
+        accepted, rejected, changes = self.rollups.compute_changes(rows, existing, self.upsert)
+        if accepted:
+            if self.use_load_data:
+                self._load_data_rows(cursor, accepted)
+            else:
+                cursor.executemany(self._insert_query(), self._encode(accepted))
+        self.rollups.apply_changes(cursor, changes)
+        self._end_batch(connection, cursor)
+
+        result.rows_inserted += len(accepted)
+        for row, error in rejected:
+            result.reject(row, error)
+
+    def _write_batch_with_rollups(self, connection, cursor, rows, result):
+        """Writes one batch with its rollups; on failure retries row by row to isolate rejects."""
+        try:
+            self._write_rows_with_rollups(connection, cursor, rows, result)
+            return
+        except Error:
+            self._undo_batch(connection, cursor)
+
+        for row in rows:
+            try:
+                self._write_rows_with_rollups(connection, cursor, [row], result)
+            except Error as row_error:
+                self._undo_batch(connection, cursor)
+                result.reject(row, row_error)
+
+    def _insert_batch(self, connection, cursor, rows, result):
+        """Sends one multi-row INSERT; on failure retries the batch row by row to isolate rejects."""
+        insert_query = self._insert_query()
+        self._begin_batch(cursor)
+        try:
+            cursor.executemany(insert_query, self._encode(rows))
+            self._end_batch(connection, cursor)
+            result.rows_inserted += len(rows)
+            return
+        except Error:
+            self._undo_batch(connection, cursor)
+
+        for row in rows:
+            try:
+                cursor.execute(insert_query, self._encode([row])[0])
+                result.rows_inserted += 1
+            except Error as row_error:
+                result.reject(row, row_error)
+        self._end_batch(connection, cursor)
+
+    def _load_data_rows(self, cursor, rows):
+        """Streams rows through LOAD DATA LOCAL INFILE; returns (rows_written, warnings)."""
+        handle, path = tempfile.mkstemp(suffix='.csv')
+        try:
+            with os.fdopen(handle, 'w', newline='') as temp_file:
+                csv.writer(temp_file).writerows(self._encode(rows))
+
+            load_query = """
+            LOAD DATA LOCAL INFILE %s {mode} INTO TABLE {table}
+            FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"'
+            LINES TERMINATED BY '\\r\\n'
+            ({columns})
+            """.format(mode='REPLACE' if self.upsert else 'IGNORE', table=self.table, columns=self._columns)
+            cursor.execute(load_query, (path,))
+            # REPLACE counts an overwritten row twice, and never skips rows on duplicate keys
+            written = len(rows) if self.upsert else cursor.rowcount
+            cursor.execute("SHOW WARNINGS")
+            return written, cursor.fetchall()
+        finally:
+            os.remove(path)
+
+    def _load_data_batch(self, connection, cursor, rows, result):
+        """Loads one batch with LOAD DATA; duplicate keys are skipped and reported.
+
+        If the statement fails the batch is undone and all its rows are rejected with the error.
+        """
+        self._begin_batch(cursor)
+        try:
+            inserted, warnings = self._load_data_rows(cursor, rows)
+            self._end_batch(connection, cursor)
+        except Error as e:
+            self._undo_batch(connection, cursor)
+            for row in rows:
+                result.reject(row, e)
+            return
+
+        result.rows_inserted += inserted
+        skipped = len(rows) - inserted
+        # The server only reports a bounded number of warnings, so the row itself is not always known
+        for warning in warnings[:skipped]:
+            result.reject(None, warning['Message'])
+        for _ in range(skipped - min(skipped, len(warnings))):
+            result.reject(None, "Row skipped by LOAD DATA")
+
+    def store_rejects(self, connection, cursor, rejected):
+        """Persists rejected rows so they can be inspected after the import."""
+        insert_query = f"""
+        INSERT INTO {self.reject_table} (date, city_code, plans, plan_revenue_crores, error)
+        VALUES (%s, %s, %s, %s, %s)
+        """
+        rows = [
+            tuple(reject['row']) + (reject['error'][:255],)
+            for reject in rejected
+            if reject['row'] is not None
+        ]
+        try:
+            cursor.executemany(insert_query, rows)
+            connection.commit()
+        except Error as e:
+            connection.rollback()
+            logger.exception("Error while storing rejected rows")
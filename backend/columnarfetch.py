@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+
+# Target dtype of each revenue_data column in columnar results
+COLUMN_DTYPES = {
+    'date': 'datetime64[D]',
+    'city_code': 'category',
+    'plans': 'category',
+    'plan_revenue_crores': np.float32,
+}
+CATEGORY_BASE_DTYPES = {
+    'city_code': np.int32,
+    'plans': None,  # kept as text
+}
+
+
+def _to_array(values):
+    """Turns one column of a fetched batch into a NumPy array without per-value Python objects."""
+    if values and isinstance(values[0], (bytes, bytearray)):
+        # Raw cursors return bytearrays; joining and splitting once is much cheaper than bytes() per value
+        return np.array(b'\n'.join(values).split(b'\n'), dtype='S')
+    return np.array(values)
+
+
+def _categorical(array, base_dtype):
+    """Builds a categorical column, decoding or converting only the distinct values."""
+    codes, uniques = pd.factorize(array)
+    if uniques.dtype.kind == 'S':
+        uniques = np.char.decode(uniques.astype('S'))
+    if base_dtype is not None:
+        uniques = uniques.astype(base_dtype)
+    return pd.Categorical.from_codes(codes, uniques)
+
+
+class ColumnarFetcher:
+    def __init__(self, batch_size=50000):
+        self.batch_size = batch_size
+
+    def fetch(self, cursor):
+        """Reads the result of an executed query with fetchmany and assembles typed columns.
+
+        Works with raw and converting tuple cursors; only one batch of Python rows is held at a time.
+        """
+        column_names = [column[0] for column in cursor.description]
+        chunks = {name: [] for name in column_names}
+        while True:
+            rows = cursor.fetchmany(self.batch_size)
+            if not rows:
+                break
+            for name, values in zip(column_names, zip(*rows)):
+                array = _to_array(list(values))
+                dtype = COLUMN_DTYPES.get(name)
+                if dtype is not None and dtype != 'category':
+                    array = array.astype(dtype)
+                chunks[name].append(array)
+
+        columns = {}
+        for name in column_names:
+            array = np.concatenate(chunks[name]) if chunks[name] else np.array([])
+            dtype = COLUMN_DTYPES.get(name)
+            if dtype == 'category':
+                columns[name] = _categorical(array, CATEGORY_BASE_DTYPES.get(name))
+            elif dtype is not None:
+                columns[name] = array.astype(dtype)
+            elif array.dtype.kind == 'S':
+                columns[name] = np.char.decode(array)
+            else:
+                columns[name] = array
+        return pd.DataFrame(columns)
@@ -1,28 +1,104 @@
 from backend.dbcon import DatabaseConnectionManager
+from backend.bulkloader import BulkLoader, BulkLoadResult
+from backend.rollups import RollupManager
+from backend.schema import FACT_TABLE, SchemaManager
+from backend.dimensions import get_shared_plan_codes
+from backend.querycache import cached_query, get_shared_cache
+from backend.columnarfetch import ColumnarFetcher
+from backend.storage import INGEST_JOB_FIELDS, StorageBackend
+from backend.instrumentation import count, instrumented_operation, timed
+import json
+import logging
+import time
 import pandas as pd
+from mysql.connector import Error
 
-class DatabaseManager:
-    def __init__(self, host, user, password, database):
-        self.db_manager = DatabaseConnectionManager(host, user, password, database)
+logger = logging.getLogger(__name__)
+
+# Tables that can answer a grouped revenue sum, smallest first:
+# (table, revenue column, columns it can group by, columns it can filter on)
+AGGREGATE_SOURCES = [
+    ('revenue_rollup_month', 'total_revenue', {'month'}, set()),
+    ('revenue_rollup_plan', 'total_revenue', {'plans'}, {'plans'}),
+    ('revenue_rollup_city', 'total_revenue', {'city_code'}, {'city_code'}),
+    ('revenue_rollup_plan_city', 'total_revenue', {'plans', 'city_code'}, {'plans', 'city_code'}),
+    ('revenue_rollup_city_date', 'total_revenue', {'city_code', 'date', 'month'}, {'city_code', 'date'}),
+    ('revenue_data', 'plan_revenue_crores', {'plans', 'city_code', 'date', 'month'}, {'plans', 'city_code', 'date'}),
+]
+
+# Per-session table a file is bulk loaded into before it is merged into revenue_data
+STAGE_TABLE = 'revenue_stage'
+CREATE_STAGE_TABLE_QUERY = f"""
+CREATE TEMPORARY TABLE {STAGE_TABLE} (
+    date DATE NOT NULL,
+    city_code INT NOT NULL,
+    plans VARCHAR(10) NOT NULL,
+    plan_revenue_crores FLOAT NOT NULL,
+    PRIMARY KEY (date, city_code, plans)
+);
+"""
+MERGE_STAGE_QUERY = f"""
+INSERT INTO {FACT_TABLE} (date, city_code, plan_id, plan_revenue_crores)
+SELECT s.date, s.city_code, d.plan_id, s.plan_revenue_crores
+FROM {STAGE_TABLE} s
+JOIN dim_plan d ON d.plans = s.plans
+ON DUPLICATE KEY UPDATE plan_revenue_crores = VALUES(plan_revenue_crores);
+"""
+
+# Columns added to imported_files for content-hash dedup; older deployments get them via ALTER TABLE
+IMPORTED_FILES_HASH_COLUMNS = {
+    'content_hash': "ALTER TABLE imported_files ADD COLUMN content_hash CHAR(64) NULL",
+    'row_count': "ALTER TABLE imported_files ADD COLUMN row_count BIGINT NULL",
+    'chunk_rows': "ALTER TABLE imported_files ADD COLUMN chunk_rows INT NULL",
+    'chunk_hashes': "ALTER TABLE imported_files ADD COLUMN chunk_hashes MEDIUMTEXT NULL",
+    'imported_at': "ALTER TABLE imported_files ADD COLUMN imported_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP",
+}
+
+class DatabaseManager(StorageBackend):
+    def __init__(self, host, user, password, database, batch_size=5000, use_load_data=False, query_cache=None,
+                 partition_by_month=False, months_ahead=3, **pool_options):
+        # Connections come from a process-wide pool shared by every session using these credentials;
+        # pool_options may also name a port and read replicas for the read-only queries
+        self.db_manager = DatabaseConnectionManager(
+            host, user, password, database, allow_local_infile=use_load_data, **pool_options
+        )
+        self.batch_size = batch_size
+        self.use_load_data = use_load_data
+        self.rollups = RollupManager()
+        # Secondary indexes come from versioned migrations; monthly partitioning is opt-in
+        self.schema = SchemaManager(partition_by_month=partition_by_month, months_ahead=months_ahead)
+        # Read results are cached per process and keyed by the data version bumped on every write
+        self.query_cache = query_cache or get_shared_cache()
+        self.cache_namespace = (host, database)
+        # Plan label -> plan_id codes of dim_plan, cached per process for the writes to revenue_fact
+        self.plan_codes = get_shared_plan_codes(self.cache_namespace)
 
     def create_tables(self):
         """Creates necessary tables in the database."""
         try:
             with self.db_manager.get_connection_and_cursor() as (connection, cursor):
                 if connection is None or cursor is None:
-                    print("Failed to create tables due to database connection error.")
+                    logger.error("Failed to create tables due to database connection error.")
                     return
 
                 # Table to store the imported files
                 create_imported_files_table_query = """
                 CREATE TABLE IF NOT EXISTS imported_files (
-                    filename VARCHAR(255) NOT NULL PRIMARY KEY
+                    filename VARCHAR(255) NOT NULL PRIMARY KEY,
+                    content_hash CHAR(64) NULL,
+                    row_count BIGINT NULL,
+                    chunk_rows INT NULL,
+                    chunk_hashes MEDIUMTEXT NULL,
+                    imported_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    INDEX idx_imported_files_content_hash (content_hash)
                 );
                 """
                 cursor.execute(create_imported_files_table_query)
                 connection.commit()
+                self._migrate_imported_files(connection, cursor)
 
-                # Table for the revenue data
+                # Table for the revenue data; schema migration 3 moves the rows into revenue_fact and
+                # replaces it with a view of the same name, which this statement then leaves alone
                 create_revenue_data_table_query = """
                 CREATE TABLE IF NOT EXISTS revenue_data (
                     date DATE NOT NULL,
@@ -34,15 +110,150 @@ class DatabaseManager:
                 """
                 cursor.execute(create_revenue_data_table_query)
                 connection.commit()
+
+                # Rows rejected by the bulk loader (e.g. primary key conflicts)
+                create_revenue_data_rejects_table_query = """
+                CREATE TABLE IF NOT EXISTS revenue_data_rejects (
+                    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+                    date VARCHAR(32),
+                    city_code VARCHAR(32),
+                    plans VARCHAR(32),
+                    plan_revenue_crores DOUBLE,
+                    error VARCHAR(255) NOT NULL,
+                    rejected_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+                );
+                """
+                cursor.execute(create_revenue_data_rejects_table_query)
+                connection.commit()
+
+                # Last committed chunk of each streaming import, used to resume interrupted imports
+                create_import_checkpoints_table_query = """
+                CREATE TABLE IF NOT EXISTS import_checkpoints (
+                    filename VARCHAR(255) NOT NULL PRIMARY KEY,
+                    last_chunk INT NOT NULL,
+                    rows_committed BIGINT NOT NULL,
+                    chunksize INT NOT NULL,
+                    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+                );
+                """
+                cursor.execute(create_import_checkpoints_table_query)
+                connection.commit()
+
+                # Uploads waiting for, or processed by, the background ingest worker
+                create_ingest_jobs_table_query = """
+                CREATE TABLE IF NOT EXISTS ingest_jobs (
+                    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+                    filename VARCHAR(255) NOT NULL,
+                    path VARCHAR(1024) NOT NULL,
+                    status VARCHAR(16) NOT NULL DEFAULT 'queued',
+                    attempts INT NOT NULL DEFAULT 0,
+                    max_attempts INT NOT NULL DEFAULT 3,
+                    progress DOUBLE NOT NULL DEFAULT 0,
+                    rows_inserted BIGINT NOT NULL DEFAULT 0,
+                    rows_rejected BIGINT NOT NULL DEFAULT 0,
+                    rows_per_second DOUBLE NULL,
+                    message VARCHAR(1024) NULL,
+                    worker VARCHAR(255) NULL,
+                    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    started_at TIMESTAMP NULL,
+                    finished_at TIMESTAMP NULL,
+                    heartbeat_at TIMESTAMP NULL,
+                    next_attempt_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    INDEX idx_ingest_jobs_status (status, next_attempt_at)
+                );
+                """
+                cursor.execute(create_ingest_jobs_table_query)
+                connection.commit()
+
+                # Single-row counter bumped on every write; cached query results are keyed by it
+                create_data_version_table_query = """
+                CREATE TABLE IF NOT EXISTS data_version (
+                    id TINYINT NOT NULL PRIMARY KEY,
+                    version BIGINT NOT NULL
+                );
+                """
+                cursor.execute(create_data_version_table_query)
+                cursor.execute("INSERT IGNORE INTO data_version (id, version) VALUES (1, 0);")
+                connection.commit()
+
+                self.schema.migrate(connection, cursor)
+
+                # Pre-aggregated tables behind the dashboard queries, maintained on every ingest batch
+                self.rollups.create_tables(cursor)
+                connection.commit()
+                if self.rollups.needs_backfill(cursor):
+                    self.rollups.rebuild(connection, cursor)
         except Exception as e:
-            print(f"Error while creating tables: {e}")
+            logger.exception("Error while creating tables")
+
+    def _migrate_imported_files(self, connection, cursor):
+        """Adds the content-hash columns to an imported_files table created by an older version."""
+        cursor.execute(
+            """
+            SELECT column_name AS column_name
+            FROM information_schema.columns
+            WHERE table_schema = DATABASE() AND table_name = 'imported_files';
+            """
+        )
+        existing_columns = {row['column_name'] for row in cursor.fetchall()}
+        if 'content_hash' in existing_columns:
+            return
+
+        for column, alter_query in IMPORTED_FILES_HASH_COLUMNS.items():
+            if column not in existing_columns:
+                cursor.execute(alter_query)
+        cursor.execute("CREATE INDEX idx_imported_files_content_hash ON imported_files (content_hash)")
+        connection.commit()
+
+    def data_version(self):
+        """Returns the current data version, read from the database unless the cache's poll interval allows reuse."""
+        version, needs_poll = self.query_cache.known_version(self.cache_namespace)
+        if not needs_poll:
+            # Replicas only answer this session's reads once they have caught up with this version
+            self.db_manager.require_version(version)
+            return version
+        try:
+            with self.db_manager.get_connection_and_cursor() as (connection, cursor):
+                if connection is None or cursor is None:
+                    logger.error("Failed to read data version due to database connection error.")
+                    return None
+
+                cursor.execute("SELECT version FROM data_version WHERE id = 1;")
+                row = cursor.fetchone()
+        except Exception as e:
+            logger.exception("Error while reading data version")
+            return None
+
+        version = row['version'] if row else None
+        if version is not None:
+            self.query_cache.set_version(self.cache_namespace, version)
+            self.db_manager.require_version(version)
+        return version
+
+    def bump_data_version(self):
+        """Marks the data as changed so no cached query result from before the write is served."""
+        try:
+            with self.db_manager.get_connection_and_cursor() as (connection, cursor):
+                if connection is None or cursor is None:
+                    raise RuntimeError("database connection error")
+
+                cursor.execute("UPDATE data_version SET version = LAST_INSERT_ID(version + 1) WHERE id = 1;")
+                cursor.execute("SELECT LAST_INSERT_ID() AS version;")
+                row = cursor.fetchone()
+                connection.commit()
+            self.query_cache.set_version(self.cache_namespace, row['version'])
+            self.db_manager.require_version(row['version'])
+        except Exception as e:
+            logger.exception("Error while bumping data version")
+            # Without a new version stamp the only safe option is to drop everything cached
+            self.query_cache.clear()
 
     def is_file_imported(self, filename):
         """Checks if a file has already been imported."""
         try:
             with self.db_manager.get_connection_and_cursor() as (connection, cursor):
                 if connection is None or cursor is None:
-                    print("Failed to check file due to database connection error.")
+                    logger.error("Failed to check file due to database connection error.")
                     return False
 
                 query = "SELECT 1 FROM imported_files WHERE filename = %s;"
@@ -50,83 +261,658 @@ class DatabaseManager:
                 result = cursor.fetchone()
                 return result is not None
         except Exception as e:
-            print(f"Error while checking if file is imported: {e}")
+            logger.exception("Error while checking if file is imported")
             return False
 
-    def mark_file_as_imported(self, filename):
-        """Marks a file as imported in the database."""
+    def find_imported_file_by_hash(self, content_hash):
+        """Returns the imported_files record with this content hash, or None."""
+        try:
+            with self.db_manager.get_connection_and_cursor() as (connection, cursor):
+                if connection is None or cursor is None:
+                    logger.error("Failed to check file hash due to database connection error.")
+                    return None
+
+                query = "SELECT filename, row_count FROM imported_files WHERE content_hash = %s LIMIT 1;"
+                cursor.execute(query, (content_hash,))
+                return cursor.fetchone()
+        except Exception as e:
+            logger.exception("Error while checking file hash")
+            return None
+
+    def get_imported_file(self, filename):
+        """Returns the imported_files record for a filename with its chunk hashes decoded, or None."""
+        try:
+            with self.db_manager.get_connection_and_cursor() as (connection, cursor):
+                if connection is None or cursor is None:
+                    logger.error("Failed to read imported file due to database connection error.")
+                    return None
+
+                query = """
+                SELECT filename, content_hash, row_count, chunk_rows, chunk_hashes
+                FROM imported_files
+                WHERE filename = %s;
+                """
+                cursor.execute(query, (filename,))
+                row = cursor.fetchone()
+                if row:
+                    row['chunk_hashes'] = json.loads(row['chunk_hashes']) if row['chunk_hashes'] else None
+                return row
+        except Exception as e:
+            logger.exception("Error while reading imported file")
+            return None
+
+    @instrumented_operation
+    def mark_file_as_imported(self, filename, fingerprint=None):
+        """Marks a file as imported in the database, recording its content fingerprint when given."""
         try:
             with self.db_manager.get_connection_and_cursor() as (connection, cursor):
                 if connection is None or cursor is None:
-                    print("Failed to mark file as imported due to database connection error.")
+                    logger.error("Failed to mark file as imported due to database connection error.")
                     return
 
-                query = "INSERT INTO imported_files (filename) VALUES (%s);"
+                self._record_imported_file(cursor, filename, fingerprint)
+                connection.commit()
+            self.bump_data_version()
+        except Exception as e:
+            logger.exception("Error while marking file as imported")
+
+    @staticmethod
+    def _record_imported_file(cursor, filename, fingerprint=None):
+        if fingerprint is None:
+            query = "INSERT INTO imported_files (filename) VALUES (%s);"
+            cursor.execute(query, (filename,))
+            return
+        query = """
+        INSERT INTO imported_files (filename, content_hash, row_count, chunk_rows, chunk_hashes)
+        VALUES (%s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            content_hash = VALUES(content_hash),
+            row_count = VALUES(row_count),
+            chunk_rows = VALUES(chunk_rows),
+            chunk_hashes = VALUES(chunk_hashes),
+            imported_at = CURRENT_TIMESTAMP;
+        """
+        cursor.execute(query, (
+            filename,
+            fingerprint.content_hash,
+            fingerprint.row_count,
+            fingerprint.chunk_rows,
+            json.dumps(fingerprint.chunk_hashes),
+        ))
+
+    def get_import_checkpoint(self, filename):
+        """Returns the last committed chunk of an interrupted streaming import, or None."""
+        try:
+            with self.db_manager.get_connection_and_cursor() as (connection, cursor):
+                if connection is None or cursor is None:
+                    logger.error("Failed to read import checkpoint due to database connection error.")
+                    return None
+
+                query = """
+                SELECT last_chunk, rows_committed, chunksize
+                FROM import_checkpoints
+                WHERE filename = %s;
+                """
                 cursor.execute(query, (filename,))
+                return cursor.fetchone()
+        except Exception as e:
+            logger.exception("Error while reading import checkpoint")
+            return None
+
+    def save_import_checkpoint(self, filename, last_chunk, rows_committed, chunksize):
+        """Records the last chunk of a streaming import that has been committed."""
+        try:
+            with self.db_manager.get_connection_and_cursor() as (connection, cursor):
+                if connection is None or cursor is None:
+                    logger.error("Failed to save import checkpoint due to database connection error.")
+                    return
+
+                self._save_import_checkpoint(cursor, filename, last_chunk, rows_committed, chunksize)
                 connection.commit()
         except Exception as e:
-            print(f"Error while marking file as imported: {e}")
+            logger.exception("Error while saving import checkpoint")
+
+    @staticmethod
+    def _save_import_checkpoint(cursor, filename, last_chunk, rows_committed, chunksize):
+        query = """
+        INSERT INTO import_checkpoints (filename, last_chunk, rows_committed, chunksize)
+        VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            last_chunk = VALUES(last_chunk),
+            rows_committed = VALUES(rows_committed),
+            chunksize = VALUES(chunksize);
+        """
+        cursor.execute(query, (filename, last_chunk, rows_committed, chunksize))
 
-    def insert_data_to_revenue_table(self, df):
-        """Inserts data from a DataFrame into the revenue_data table."""
+    def clear_import_checkpoint(self, filename):
+        """Removes the checkpoint of a streaming import once the file is fully imported."""
         try:
             with self.db_manager.get_connection_and_cursor() as (connection, cursor):
                 if connection is None or cursor is None:
-                    print("Failed to insert data due to database connection error.")
+                    logger.error("Failed to clear import checkpoint due to database connection error.")
                     return
 
-                for _, row in df.iterrows():
-                    try:
-                        insert_query = """
-                        INSERT INTO revenue_data (date, city_code, plans, plan_revenue_crores)
-                        VALUES (%s, %s, %s, %s);
-                        """
-                        cursor.execute(insert_query, (row['date'], row['city_code'], row['plans'], row['plan_revenue_crores']))
-                    except Exception as row_error:
-                        print(f"Error inserting row {row}: {row_error}")
+                query = "DELETE FROM import_checkpoints WHERE filename = %s;"
+                cursor.execute(query, (filename,))
+                connection.commit()
+        except Exception as e:
+            logger.exception("Error while clearing import checkpoint")
 
+    def enqueue_ingest_job(self, filename, path, max_attempts=3):
+        """Queues a spooled upload for the ingest worker and returns the job id, or None on error."""
+        try:
+            with self.db_manager.get_connection_and_cursor() as (connection, cursor):
+                if connection is None or cursor is None:
+                    logger.error("Failed to enqueue ingest job due to database connection error.")
+                    return None
+
+                query = "INSERT INTO ingest_jobs (filename, path, max_attempts) VALUES (%s, %s, %s);"
+                cursor.execute(query, (filename, path, max_attempts))
+                connection.commit()
+                return cursor.lastrowid
+        except Exception as e:
+            logger.exception("Error while enqueuing ingest job")
+            return None
+
+    def claim_ingest_job(self, worker, lease_seconds=300):
+        """Claims the oldest runnable job for a worker and returns it, or None if there is none.
+
+        Jobs whose worker stopped sending heartbeats for lease_seconds are claimed again. SKIP LOCKED
+        lets several workers claim different jobs at the same time.
+        """
+        try:
+            with self.db_manager.get_connection_and_cursor() as (connection, cursor):
+                if connection is None or cursor is None:
+                    logger.error("Failed to claim ingest job due to database connection error.")
+                    return None
+
+                query = """
+                SELECT id
+                FROM ingest_jobs
+                WHERE (status = 'queued' AND next_attempt_at <= NOW())
+                   OR (status = 'running' AND heartbeat_at < NOW() - INTERVAL %s SECOND)
+                ORDER BY id
+                LIMIT 1
+                FOR UPDATE SKIP LOCKED;
+                """
+                cursor.execute(query, (lease_seconds,))
+                row = cursor.fetchone()
+                if row is None:
+                    connection.commit()
+                    return None
+
+                cursor.execute(
+                    """
+                    UPDATE ingest_jobs
+                    SET status = 'running', attempts = attempts + 1, worker = %s, progress = 0,
+                        started_at = NOW(), heartbeat_at = NOW(), finished_at = NULL
+                    WHERE id = %s;
+                    """,
+                    (worker, row['id']),
+                )
+                cursor.execute("SELECT * FROM ingest_jobs WHERE id = %s;", (row['id'],))
+                job = cursor.fetchone()
+                connection.commit()
+                return job
+        except Exception as e:
+            logger.exception("Error while claiming ingest job")
+            return None
+
+    def update_ingest_job(self, job_id, **fields):
+        """Records progress or the outcome of a job and renews its heartbeat.
+
+        fields may set status, progress, rows_inserted, rows_rejected, rows_per_second and message.
+        """
+        columns = [column for column in INGEST_JOB_FIELDS if column in fields]
+        assignments = [f"{column} = %s" for column in columns] + ["heartbeat_at = NOW()"]
+        if fields.get('status') in ('done', 'failed'):
+            assignments.append("finished_at = NOW()")
+        try:
+            with self.db_manager.get_connection_and_cursor() as (connection, cursor):
+                if connection is None or cursor is None:
+                    logger.error("Failed to update ingest job due to database connection error.")
+                    return
+
+                query = f"UPDATE ingest_jobs SET {', '.join(assignments)} WHERE id = %s;"
+                cursor.execute(query, [fields[column] for column in columns] + [job_id])
                 connection.commit()
         except Exception as e:
-            print(f"Error while inserting data into revenue table: {e}")
+            logger.exception("Error while updating ingest job")
+
+    def fail_ingest_job(self, job_id, message, retry_delay=30):
+        """Requeues a failed job after retry_delay seconds, or marks it failed after its last attempt."""
+        try:
+            with self.db_manager.get_connection_and_cursor() as (connection, cursor):
+                if connection is None or cursor is None:
+                    logger.error("Failed to update ingest job due to database connection error.")
+                    return
 
+                query = """
+                UPDATE ingest_jobs
+                SET status = IF(attempts < max_attempts, 'queued', 'failed'),
+                    next_attempt_at = NOW() + INTERVAL %s SECOND,
+                    finished_at = IF(attempts < max_attempts, NULL, NOW()),
+                    message = %s
+                WHERE id = %s;
+                """
+                cursor.execute(query, (retry_delay, message[:1024], job_id))
+                connection.commit()
+        except Exception as e:
+            logger.exception("Error while failing ingest job")
+
+    def list_ingest_jobs(self, limit=20):
+        """Returns the most recent ingest jobs, newest first."""
+        try:
+            with self.db_manager.get_connection_and_cursor() as (connection, cursor):
+                if connection is None or cursor is None:
+                    logger.error("Failed to list ingest jobs due to database connection error.")
+                    return []
+
+                cursor.execute("SELECT * FROM ingest_jobs ORDER BY id DESC LIMIT %s;", (limit,))
+                return cursor.fetchall()
+        except Exception as e:
+            logger.exception("Error while listing ingest jobs")
+            return []
+
+    @instrumented_operation
+    def insert_data_to_revenue_table(self, df, batch_size=None, use_load_data=None, upsert=False, checkpoint=None):
+        """Bulk inserts a DataFrame into revenue_fact (read as revenue_data) and returns a BulkLoadResult.
+
+        With upsert=True existing (date, city_code, plans) rows are overwritten instead of rejected.
+        With checkpoint=(filename, last_chunk, rows_committed_before, chunksize) the DataFrame is one
+        chunk of a streaming import: its rows and the import checkpoint commit as one transaction.
+        """
+        before_commit = None
+        if checkpoint is not None:
+            filename, last_chunk, rows_committed_before, chunksize = checkpoint
+
+            def before_commit(cursor, result):
+                self._save_import_checkpoint(
+                    cursor, filename, last_chunk, rows_committed_before + result.rows_inserted, chunksize
+                )
+
+        loader = BulkLoader(
+            self.db_manager,
+            batch_size=batch_size or self.batch_size,
+            use_load_data=self.use_load_data if use_load_data is None else use_load_data,
+            reject_table='revenue_data_rejects',
+            upsert=upsert,
+            rollups=self.rollups,
+            table=FACT_TABLE,
+            plan_codes=self.plan_codes,
+            single_transaction=checkpoint is not None,
+        )
+        try:
+            result = loader.load(df, before_commit=before_commit)
+            count('rows_inserted', result.rows_inserted)
+            count('rows_rejected', result.rows_rejected)
+            if result.rows_inserted:
+                self.bump_data_version()
+            logger.info(
+                "Inserted %s rows (%.0f rows/sec), %s rejected.",
+                result.rows_inserted, result.rows_per_second, result.rows_rejected,
+            )
+            return result
+        except Exception as e:
+            logger.exception("Error while inserting data into revenue table")
+            result = BulkLoadResult()
+            result.error = str(e)
+            return result
+
+    @instrumented_operation
+    def import_file_atomically(self, filename, chunks, fingerprint=None):
+        """Imports a whole file as one transaction and returns a BulkLoadResult, or None if nothing was written.
+
+        The cleaned chunks are bulk loaded into a temporary stage table first. One transaction then
+        applies the rollup deltas, merges the stage into revenue_data with a set-based upsert and
+        records the file, so a failed import leaves no partial data and can simply be retried.
+        """
+        stage_loader = BulkLoader(
+            self.db_manager,
+            batch_size=self.batch_size,
+            use_load_data=self.use_load_data,
+            reject_table='revenue_data_rejects',
+            upsert=True,  # The last row of the file wins for a repeated key
+            table=STAGE_TABLE,
+        )
+        result = BulkLoadResult()
+        started = time.perf_counter()
+        try:
+            with self.db_manager.get_connection_and_cursor() as (connection, cursor):
+                if connection is None or cursor is None:
+                    logger.error("Failed to import file due to database connection error.")
+                    return None
+
+                cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS {STAGE_TABLE};")
+                cursor.execute(CREATE_STAGE_TABLE_QUERY)
+                try:
+                    with timed('stage_load'):
+                        for chunk in chunks:
+                            stage_loader.write(connection, cursor, chunk, result)
+                    cursor.execute(f"SELECT COUNT(*) AS staged FROM {STAGE_TABLE};")
+                    result.rows_inserted = cursor.fetchone()['staged']
+                    cursor.execute(f"SELECT DISTINCT plans FROM {STAGE_TABLE};")
+                    staged_plans = [row['plans'] for row in cursor.fetchall()]
+                    # New plans get their dim_plan row (committed on its own) before the merge joins on it
+                    self.plan_codes.register(connection, cursor, staged_plans)
+
+                    with timed('stage_merge'):
+                        self.rollups.apply_stage(cursor, STAGE_TABLE)
+                        cursor.execute(MERGE_STAGE_QUERY)
+                        self.rollups.refresh_plan_max(cursor, staged_plans)
+                        self._record_imported_file(cursor, filename, fingerprint)
+                        cursor.execute("DELETE FROM import_checkpoints WHERE filename = %s;", (filename,))
+                        cursor.execute("UPDATE data_version SET version = LAST_INSERT_ID(version + 1) WHERE id = 1;")
+                        cursor.execute("SELECT LAST_INSERT_ID() AS version;")
+                        version = cursor.fetchone()['version']
+                        connection.commit()
+                except Exception:
+                    try:
+                        connection.rollback()
+                    except Error as rollback_error:
+                        logger.warning("Rolling back the import of '%s' failed: %s", filename, rollback_error)
+                    raise
+                finally:
+                    # A lost connection fails this too; that must not hide the error that ended the import
+                    try:
+                        cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS {STAGE_TABLE};")
+                    except Error as drop_error:
+                        logger.warning("Dropping the stage table of '%s' failed: %s", filename, drop_error)
+
+                if result.rejected:
+                    stage_loader.store_rejects(connection, cursor, result.rejected)
+            self.query_cache.set_version(self.cache_namespace, version)
+            self.db_manager.require_version(version)
+        except Exception as e:
+            logger.exception("Error while importing '%s'", filename)
+            return None
+
+        result.elapsed = time.perf_counter() - started
+        count('rows_inserted', result.rows_inserted)
+        count('rows_rejected', result.rows_rejected)
+        logger.info(
+            "Merged %s rows of '%s' (%.0f rows/sec), %s rejected.",
+            result.rows_inserted, filename, result.rows_per_second, result.rows_rejected,
+        )
+        return result
+
+    def rebuild_rollups(self):
+        """Recomputes the rollup tables from revenue_data, e.g. after loading data outside the app."""
+        try:
+            with self.db_manager.get_connection_and_cursor() as (connection, cursor):
+                if connection is None or cursor is None:
+                    logger.error("Failed to rebuild rollups due to database connection error.")
+                    return
+
+                self.rollups.rebuild(connection, cursor)
+            self.bump_data_version()
+        except Exception as e:
+            logger.exception("Error while rebuilding rollups")
+
+    def explain_analytic_queries(self):
+        """EXPLAINs the analytic queries on revenue_data; returns the report, or None on error."""
+        try:
+            with self.db_manager.get_connection_and_cursor() as (connection, cursor):
+                if connection is None or cursor is None:
+                    logger.error("Failed to explain queries due to database connection error.")
+                    return None
+
+                return self.schema.explain_analytic_queries(cursor)
+        except Exception as e:
+            logger.exception("Error while explaining analytic queries")
+            return None
+
+    @instrumented_operation
     def fetch_all_records_as_dataframe(self):
-        """Fetches all records from the revenue_data table and returns them as a DataFrame."""
+        """Fetches all records from the revenue_data table and returns them as a DataFrame.
+
+        Full-table reads are not cached; the data version is still read so a replica that has
+        not caught up with it does not answer.
+        """
         try:
+            self.data_version()
             query = "SELECT * FROM revenue_data"
-            with self.db_manager.get_connection_and_cursor() as (connection, cursor):
+            with self.db_manager.get_connection_and_cursor(read_only=True) as (connection, cursor):
                 if connection is None or cursor is None:
-                    print("Failed to fetch records due to database connection error.")
+                    logger.error("Failed to fetch records due to database connection error.")
                     return pd.DataFrame()
 
                 cursor.execute(query)
                 rows = cursor.fetchall()
                 columns = [desc[0] for desc in cursor.description]  # Get column names
-                return pd.DataFrame(rows, columns=columns)
+                with timed('dataframe_build'):
+                    return pd.DataFrame(rows, columns=columns)
         except Exception as e:
-            print(f"Error while fetching records as DataFrame: {e}")
+            logger.exception("Error while fetching records as DataFrame")
             return pd.DataFrame()
 
+    @staticmethod
+    def _record_filters(start_date=None, end_date=None, city_code=None, plans=None):
+        """Builds the WHERE conditions and parameters shared by the paginated record queries."""
+        conditions, params = [], []
+        if start_date is not None:
+            conditions.append("date >= %s")
+            params.append(start_date)
+        if end_date is not None:
+            conditions.append("date <= %s")
+            params.append(end_date)
+        if city_code is not None:
+            conditions.append("city_code = %s")
+            params.append(city_code)
+        if plans is not None:
+            conditions.append("plans = %s")
+            params.append(plans)
+        return conditions, params
+
+    @staticmethod
+    def _fact_record_filters(start_date=None, end_date=None, city_code=None, plans=None):
+        """Builds the record filters on revenue_fact columns, matching a plan label through its plan_id."""
+        conditions, params = DatabaseManager._record_filters(start_date, end_date, city_code)
+        conditions = [f"{FACT_TABLE}.{condition}" for condition in conditions]
+        if plans is not None:
+            conditions.append(f"{FACT_TABLE}.plan_id = (SELECT plan_id FROM dim_plan WHERE plans = %s)")
+            params.append(plans)
+        return conditions, params
+
+    @cached_query
+    def fetch_records_page(self, page_size=100, after=None, start_date=None, end_date=None, city_code=None,
+                           plans=None):
+        """Fetches one page of revenue_data in primary-key order as a DataFrame.
+
+        Pages are read from revenue_fact in its (date, city_code, plan_id) key order, and dim_plan
+        is joined only for the rows of the page. after is the (date, city_code, plans) key of the
+        last row of the previous page; the query seeks past it on the primary key instead of using
+        OFFSET.
+        """
+        try:
+            conditions, params = self._fact_record_filters(start_date, end_date, city_code, plans)
+            if after is not None:
+                # Expanded form of (date, city_code, plan_id) > after so MySQL can range-scan the primary key
+                conditions.append(
+                    f"({FACT_TABLE}.date > %s OR ({FACT_TABLE}.date = %s AND ({FACT_TABLE}.city_code > %s OR "
+                    f"({FACT_TABLE}.city_code = %s AND "
+                    f"{FACT_TABLE}.plan_id > (SELECT plan_id FROM dim_plan WHERE plans = %s)))))"
+                )
+                after_date, after_city_code, after_plans = after
+                params.extend([after_date, after_date, after_city_code, after_city_code, after_plans])
+            where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+            # STRAIGHT_JOIN keeps revenue_fact first, so rows are read in key order and the LIMIT stops the scan
+            query = f"""
+            SELECT {FACT_TABLE}.date, {FACT_TABLE}.city_code, dim_plan.plans, {FACT_TABLE}.plan_revenue_crores
+            FROM {FACT_TABLE}
+            STRAIGHT_JOIN dim_plan ON dim_plan.plan_id = {FACT_TABLE}.plan_id
+            {where}
+            ORDER BY {FACT_TABLE}.date, {FACT_TABLE}.city_code, {FACT_TABLE}.plan_id
+            LIMIT %s
+            """
+            with self.db_manager.get_connection_and_cursor(read_only=True) as (connection, cursor):
+                if connection is None or cursor is None:
+                    logger.error("Failed to fetch records due to database connection error.")
+                    return pd.DataFrame()
+
+                cursor.execute(query, params + [page_size])
+                rows = cursor.fetchall()
+                columns = [desc[0] for desc in cursor.description]
+                with timed('dataframe_build'):
+                    return pd.DataFrame(rows, columns=columns)
+        except Exception as e:
+            logger.exception("Error while fetching records page")
+            return pd.DataFrame()
+
+    @instrumented_operation
+    def fetch_records_columnar(self, columns=None, batch_size=50000, start_date=None, end_date=None, city_code=None,
+                               plans=None):
+        """Fetches revenue_data as a compact, typed DataFrame through a streamed raw cursor.
+
+        plans and city_code come back categorical, plan_revenue_crores as float32 and date as
+        datetime64. columns is a tuple of column names to fetch (all by default). The result is
+        not cached, so a full-table load is held only by its caller.
+        """
+        try:
+            self.data_version()
+            selected = ', '.join(columns or ('date', 'city_code', 'plans', 'plan_revenue_crores'))
+            conditions, params = self._record_filters(start_date, end_date, city_code, plans)
+            where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+            query = f"SELECT {selected} FROM revenue_data {where}"
+            with self.db_manager.get_connection_and_cursor(dictionary=False, raw=True, read_only=True) as (connection, cursor):
+                if connection is None or cursor is None:
+                    logger.error("Failed to fetch records due to database connection error.")
+                    return pd.DataFrame()
+
+                cursor.execute(query, params)
+                return ColumnarFetcher(batch_size).fetch(cursor)
+        except Exception as e:
+            logger.exception("Error while fetching columnar records")
+            return pd.DataFrame()
+
+    @cached_query
+    def count_records(self, start_date=None, end_date=None, city_code=None, plans=None):
+        """Returns the number of revenue_data rows matching the record filters, or None on error."""
+        try:
+            conditions, params = self._record_filters(start_date, end_date, city_code, plans)
+            where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+            query = f"SELECT COUNT(*) AS record_count FROM revenue_data {where}"
+            with self.db_manager.get_connection_and_cursor(read_only=True) as (connection, cursor):
+                if connection is None or cursor is None:
+                    logger.error("Failed to count records due to database connection error.")
+                    return None
+
+                cursor.execute(query, params)
+                return cursor.fetchone()['record_count']
+        except Exception as e:
+            logger.exception("Error while counting records")
+            return None
+
+    def _aggregate_revenue(self, group_by, start_date=None, end_date=None, city_code=None, plans=None):
+        """Sums revenue per group_by ('date', 'month', 'city_code' or 'plans') in the database.
+
+        The query runs on the smallest rollup table that supports the grouping and filters, and
+        falls back to revenue_data. Returns a DataFrame with the group column and plan_revenue_crores.
+        """
+        filters_used = set()
+        if start_date is not None or end_date is not None:
+            filters_used.add('date')
+        if city_code is not None:
+            filters_used.add('city_code')
+        if plans is not None:
+            filters_used.add('plans')
+        table, revenue_column = next(
+            (table, revenue_column)
+            for table, revenue_column, groups, filters in AGGREGATE_SOURCES
+            if group_by in groups and filters_used <= filters
+        )
+
+        if group_by == 'month' and table != 'revenue_rollup_month':
+            group_expression = "DATE_FORMAT(date, '%Y-%m-01')"
+        else:
+            group_expression = group_by
+        output_column = 'date' if group_by == 'month' else group_by
+
+        conditions, params = self._record_filters(start_date, end_date, city_code, plans)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        query = f"""
+        SELECT {group_expression} AS {output_column}, SUM({revenue_column}) AS plan_revenue_crores
+        FROM {table}
+        {where}
+        GROUP BY {group_expression}
+        ORDER BY {output_column}
+        """
+        try:
+            with self.db_manager.get_connection_and_cursor(read_only=True) as (connection, cursor):
+                if connection is None or cursor is None:
+                    logger.error("Failed to aggregate revenue due to database connection error.")
+                    return pd.DataFrame(columns=[output_column, 'plan_revenue_crores'])
+
+                cursor.execute(query, params)
+                rows = cursor.fetchall()
+                with timed('dataframe_build'):
+                    return pd.DataFrame(rows, columns=[output_column, 'plan_revenue_crores'])
+        except Exception as e:
+            logger.exception("Error while aggregating revenue by %s", group_by)
+            return pd.DataFrame(columns=[output_column, 'plan_revenue_crores'])
+
+    @cached_query
+    def get_revenue_by_date(self, bucket='day', start_date=None, end_date=None, city_code=None, plans=None):
+        """Returns total revenue per day, or per month with bucket='month', as a DataFrame."""
+        group_by = 'month' if bucket == 'month' else 'date'
+        return self._aggregate_revenue(group_by, start_date, end_date, city_code, plans)
+
+    @cached_query
+    def get_revenue_by_city(self, start_date=None, end_date=None, city_code=None, plans=None):
+        """Returns total revenue per city_code as a DataFrame."""
+        return self._aggregate_revenue('city_code', start_date, end_date, city_code, plans)
+
+    @cached_query
+    def get_revenue_by_plan(self, start_date=None, end_date=None, city_code=None, plans=None):
+        """Returns total revenue per plan as a DataFrame."""
+        return self._aggregate_revenue('plans', start_date, end_date, city_code, plans)
+
+    @cached_query
+    def get_total_revenue(self):
+        """Returns the total revenue across all plans and cities from the plan rollup."""
+        try:
+            query = """
+            SELECT
+                round(sum(total_revenue),2) as total_revenue
+            FROM revenue_rollup_plan
+            """
+            with self.db_manager.get_connection_and_cursor(read_only=True) as (connection, cursor):
+                if connection is None or cursor is None:
+                    logger.error("Failed to fetch records due to database connection error.")
+                    return "No data available."
+
+                cursor.execute(query)
+                row = cursor.fetchone()
+                if row and row['total_revenue'] is not None:
+                    return row
+                else:
+                    return "No records found."
+        except Exception as e:
+            logger.exception("Error while fetching total revenue")
+            return "Error fetching record."
+
+    @cached_query
     def get_record_with_max_revenue(self):
         """Fetches all records from the revenue_data table and returns them as a DataFrame."""
         try:
             query = """
-            SELECT 
+            SELECT
                 city_code,
                 date,
-                round(sum(plan_revenue_crores),2) as tot_revenue
-            FROM revenue_data
-            GROUP BY city_code, date
-            ORDER BY tot_revenue DESC
+                round(total_revenue,2) as tot_revenue
+            FROM revenue_rollup_city_date
+            ORDER BY total_revenue DESC
             LIMIT 1;
             """
-            with self.db_manager.get_connection_and_cursor() as (connection, cursor):
+            with self.db_manager.get_connection_and_cursor(read_only=True) as (connection, cursor):
                 if connection is None or cursor is None:
-                    print("Failed to fetch records due to database connection error.")
+                    logger.error("Failed to fetch records due to database connection error.")
                     return "No data available."
 
                 cursor.execute(query)
                 row = cursor.fetchone()  # Fetch one row (the one with max revenue)
-                print("Row fetched:", row)  # Debugging: print the row fetched
+                logger.debug("Row fetched: %s", row)
                 if row:
                     # Access dictionary values correctly
                     city_code = row['city_code']
@@ -137,29 +923,29 @@ class DatabaseManager:
                 else:
                     return "No records found."
         except Exception as e:
-            print(f"Error while fetching record with maximum revenue: {e}")
+            logger.exception("Error while fetching record with maximum revenue")
             return "Error fetching record."
 
+    @cached_query
     def get_plan_with_max_revenue(self):
         """Fetches all records from the revenue_data table and returns them as a DataFrame."""
         try:
             query = """
-            SELECT 
-                plans, 
-                round(sum(plan_revenue_crores),2) as tot_revenue 
-            from revenue_data
-            group by plans
-            order by tot_revenue desc
+            SELECT
+                plans,
+                round(total_revenue,2) as tot_revenue
+            from revenue_rollup_plan
+            order by total_revenue desc
             limit 1
             """
-            with self.db_manager.get_connection_and_cursor() as (connection, cursor):
+            with self.db_manager.get_connection_and_cursor(read_only=True) as (connection, cursor):
                 if connection is None or cursor is None:
-                    print("Failed to fetch records due to database connection error.")
+                    logger.error("Failed to fetch records due to database connection error.")
                     return "No data available."
 
                 cursor.execute(query)
                 row = cursor.fetchone()  # Fetch one row (the one with max revenue)
-                print("Row fetched:", row)  # Debugging: print the row fetched
+                logger.debug("Row fetched: %s", row)
                 if row:
                     # Access dictionary values correctly
                     plan = row['plans']
@@ -169,26 +955,27 @@ class DatabaseManager:
                 else:
                     return "No records found."
         except Exception as e:
-            print(f"Error while fetching record with maximum revenue: {e}")
+            logger.exception("Error while fetching record with maximum revenue")
             return "Error fetching record."
 
+    @cached_query
     def get_total_city_count(self):
         """Fetches all records from the revenue_data table and returns them as a DataFrame."""
         try:
             query = """
-           select 
-                count(distinct(city_code)) as city_count 
-            from revenue_data
-            where plans='p3' and plan_revenue_crores <> 0
+           select
+                count(*) as city_count
+            from revenue_rollup_plan_city
+            where plans='p3' and nonzero_rows > 0
                """
-            with self.db_manager.get_connection_and_cursor() as (connection, cursor):
+            with self.db_manager.get_connection_and_cursor(read_only=True) as (connection, cursor):
                 if connection is None or cursor is None:
-                    print("Failed to fetch records due to database connection error.")
+                    logger.error("Failed to fetch records due to database connection error.")
                     return "No data available."
 
                 cursor.execute(query)
                 row = cursor.fetchone()  # Fetch one row (the one with max revenue)
-                print("Row fetched:", row)  # Debugging: print the row fetched
+                logger.debug("Row fetched: %s", row)
                 if row:
                     # Access dictionary values correctly
                     city_count = row['city_count']
@@ -197,43 +984,33 @@ class DatabaseManager:
                 else:
                     return "No records found."
         except Exception as e:
-            print(f"Error while fetching record with maximum revenue: {e}")
+            logger.exception("Error while fetching record with maximum revenue")
             return "Error fetching record."
 
+    @cached_query
     def get_city_by_revenue_across_plans(self):
         """Fetches all records from the revenue_data table and returns them as a DataFrame."""
         try:
             query = """
-                WITH RankedRevenue AS (
-                SELECT
-                    city_code,
-                    plans,
-                    plan_revenue_crores,
-                    RANK() OVER (PARTITION BY plans ORDER BY plan_revenue_crores DESC) AS ranking
-                FROM
-                    revenue_data
-                )
                 SELECT
                     city_code,
                     ROUND(SUM(plan_revenue_crores),2) AS total_revenue
                 FROM
-                    RankedRevenue
-                WHERE
-                    ranking = 1
+                    revenue_rollup_plan_max
                 GROUP BY
                     city_code
                 ORDER BY
                     total_revenue DESC
                 LIMIT 1;
                """
-            with self.db_manager.get_connection_and_cursor() as (connection, cursor):
+            with self.db_manager.get_connection_and_cursor(read_only=True) as (connection, cursor):
                 if connection is None or cursor is None:
-                    print("Failed to fetch records due to database connection error.")
+                    logger.error("Failed to fetch records due to database connection error.")
                     return "No data available."
 
                 cursor.execute(query)
                 row = cursor.fetchone()  # Fetch one row (the one with max revenue)
-                print("Row fetched:", row)  # Debugging: print the row fetched
+                logger.debug("Row fetched: %s", row)
                 if row:
                     # Access dictionary values correctly
                     city_code = row['city_code']
@@ -243,7 +1020,7 @@ class DatabaseManager:
                 else:
                     return "No records found."
         except Exception as e:
-            print(f"Error while fetching record with maximum revenue: {e}")
+            logger.exception("Error while fetching record with maximum revenue")
             return "Error fetching record."
 # if __name__ == "__main__":
 #     # Replace these with your actual database credentials
@@ -0,0 +1,119 @@
+import logging
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Unambiguous layouts and the explicit format each one is parsed with
+FIXED_FORMATS = [
+    (r'^\d{4}-\d{1,2}-\d{1,2}$', '%Y-%m-%d'),
+    (r'^\d{4}/\d{1,2}/\d{1,2}$', '%Y/%m/%d'),
+    (r'^\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}(:\d{2})?$', 'ISO8601'),
+]
+# Day and month order is ambiguous in these layouts; the separator picks the format
+AMBIGUOUS_LAYOUTS = {
+    '-': r'^\d{1,2}-\d{1,2}-\d{4}$',
+    '/': r'^\d{1,2}/\d{1,2}/\d{4}$',
+    '.': r'^\d{1,2}\.\d{1,2}\.\d{4}$',
+}
+
+
+class AmbiguousDateError(ValueError):
+    """Raised when a file's D-M-Y / M-D-Y dates have days above 12 in both positions."""
+
+
+class DateNormalizer:
+    """Parses a file's date column with one explicit format per detected layout.
+
+    Only the distinct date strings are parsed, and their values are memoized for the next chunks of
+    the same file. The day/month order of ambiguous D-M-Y / M-D-Y layouts is decided once for the
+    whole file, before anything is parsed: scan() every chunk of the date column, then call
+    decide_order(). A layout whose values never have a day above 12 is read month-first, as
+    pd.to_datetime reads it; one with days above 12 in both positions raises AmbiguousDateError.
+    normalize() called without a scan decides from the values it is given, which suits a file read
+    in one piece. Layouts it does not recognise fall back to format='mixed'.
+    """
+
+    def __init__(self, max_cached=200000):
+        self.max_cached = max_cached
+        self.day_first = {}  # separator -> True (D-M-Y) / False (M-D-Y), fixed by decide_order
+        self.order_decided = False
+        self._evidence = {}  # separator -> [first field above 12 seen, second field above 12 seen, example]
+        self._cache = {}  # date string -> datetime64[ns] value
+
+    def scan(self, values):
+        """Collects day/month order evidence from a Series of date strings, e.g. one chunk of the file."""
+        strings = pd.Series(pd.unique(values.dropna()), dtype=object).astype(str).str.strip()
+        for separator, pattern in AMBIGUOUS_LAYOUTS.items():
+            group = strings[strings.str.match(pattern)]
+            if group.empty:
+                continue
+            parts = group.str.split(separator, expand=True).astype(int)
+            evidence = self._evidence.setdefault(separator, [False, False, group.iloc[0]])
+            evidence[0] = evidence[0] or bool((parts[0] > 12).any())
+            evidence[1] = evidence[1] or bool((parts[1] > 12).any())
+
+    def decide_order(self):
+        """Fixes the order of every ambiguous layout scanned; raises AmbiguousDateError if one mixes both orders."""
+        for separator, (first_is_day, second_is_day, example) in self._evidence.items():
+            if first_is_day and second_is_day:
+                raise AmbiguousDateError(
+                    f"Dates written like '{example}' mix day-first and month-first values. "
+                    f"Please use one order, or YYYY-MM-DD dates."
+                )
+            if not first_is_day and not second_is_day:
+                logger.warning(
+                    "No day above 12 shows the order of dates written like '%s'; reading them month-first.", example
+                )
+            self.day_first[separator] = first_is_day
+        self.order_decided = True
+
+    def normalize(self, values):
+        """Returns a datetime64[ns] Series for a Series of date strings; unparseable values become NaT."""
+        if not self.order_decided:
+            self.scan(values)
+            self.decide_order()
+        codes, uniques = pd.factorize(values)
+        uniques = np.asarray(uniques, dtype=object)
+        cached = [self._cache.get(value) for value in uniques]
+        unseen = np.array([value is None for value in cached], dtype=bool)
+        parsed_uniques = np.empty(len(uniques), dtype='datetime64[ns]')
+        if unseen.any():
+            parsed = self._parse(uniques[unseen])
+            if len(self._cache) + len(parsed) > self.max_cached:
+                self._cache.clear()
+            self._cache.update(zip(uniques[unseen].tolist(), parsed))
+            parsed_uniques[unseen] = parsed
+        if not unseen.all():
+            parsed_uniques[~unseen] = [cached[index] for index in np.flatnonzero(~unseen)]
+
+        # factorize gives missing values the code -1; append NaT so they map to it
+        parsed_uniques = np.append(parsed_uniques, np.datetime64('NaT', 'ns'))
+        return pd.Series(parsed_uniques[codes], index=values.index, name=values.name)
+
+    def _parse(self, values):
+        """Parses distinct date strings, one vectorized to_datetime call per detected format."""
+        strings = pd.Series(values, dtype=object).astype(str).str.strip()
+        parsed = np.full(len(strings), np.datetime64('NaT', 'ns'), dtype='datetime64[ns]')
+        remaining = np.ones(len(strings), dtype=bool)
+
+        layouts = [(pattern, date_format, None) for pattern, date_format in FIXED_FORMATS]
+        layouts += [(pattern, None, separator) for separator, pattern in AMBIGUOUS_LAYOUTS.items()]
+        for pattern, date_format, separator in layouts:
+            group = remaining & strings.str.match(pattern).to_numpy()
+            if not group.any():
+                continue
+            if separator is not None:
+                # A layout missing from the scanned values is read month-first, like an undecided one
+                day_first = self.day_first.get(separator, False)
+                date_format = f'%d{separator}%m{separator}%Y' if day_first else f'%m{separator}%d{separator}%Y'
+            parsed[group] = pd.to_datetime(strings[group], format=date_format, errors='coerce').to_numpy(
+                dtype='datetime64[ns]'
+            )
+            remaining &= ~group
+
+        if remaining.any():
+            parsed[remaining] = pd.to_datetime(strings[remaining], format='mixed', errors='coerce').to_numpy(
+                dtype='datetime64[ns]'
+            )
+        return parsed
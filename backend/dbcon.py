@@ -1,42 +1,357 @@
+import itertools
+import logging
+import queue
+import threading
+import time
 from contextlib import contextmanager
 import mysql.connector
 from mysql.connector import Error
+from backend.instrumentation import InstrumentedCursor, count, timed
+from backend.storage import current_statement_timeout
+
+logger = logging.getLogger(__name__)
+
+# Seconds a replica that failed to connect is left out of the read rotation
+REPLICA_RETRY_SECONDS = 30.0
+# A replica serves reads only once it has replicated the data version the reader expects
+REPLICA_VERSION_QUERY = "SELECT version FROM data_version WHERE id = 1"
+
+
+class PoolTimeoutError(Error):
+    """Raised when no pooled connection becomes available within the checkout timeout."""
+
+
+class ConnectionPool:
+    def __init__(self, connect_kwargs, pool_size=5, checkout_timeout=10.0, health_check_interval=30.0):
+        self.connect_kwargs = dict(connect_kwargs)
+        self.pool_size = pool_size
+        self.checkout_timeout = checkout_timeout
+        self.health_check_interval = health_check_interval
+
+        # Idle connections are stored as (connection, last_used) pairs, most recently used first
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._lock = threading.Lock()
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'connects': 0,
+            'reconnects': 0,
+            'discarded': 0,
+            'in_use': 0,
+        }
+        # Routing state, used when the pool connects to a read replica
+        self.unavailable_until = 0.0
+        self.replicated_version = None
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def _connect(self):
+        with timed('db_connect', operation=''):
+            connection = mysql.connector.connect(**self.connect_kwargs)
+        self._count('connects')
+        if connection.is_connected():
+            logger.debug("Connected to %s", self.connect_kwargs['host'])
+        else:
+            logger.warning("Failed to connect to the server %s", self.connect_kwargs['host'])
+        return connection
+
+    def _ensure_healthy(self, connection, last_used):
+        """Pings connections that sat idle longer than the health check interval and reconnects dead ones."""
+        if time.monotonic() - last_used < self.health_check_interval:
+            return connection
+        if not connection.is_connected():
+            connection.reconnect(attempts=1, delay=0)
+            self._count('reconnects')
+        return connection
+
+    def acquire(self):
+        """Checks out a connection, waiting up to checkout_timeout seconds for a free slot."""
+        if not self._slots.acquire(blocking=False):
+            self._count('waits')
+            if not self._slots.acquire(timeout=self.checkout_timeout):
+                self._count('timeouts')
+                raise PoolTimeoutError(
+                    msg=f"No pooled connection available after {self.checkout_timeout} seconds"
+                )
+
+        try:
+            try:
+                connection, last_used = self._idle.get_nowait()
+                connection = self._ensure_healthy(connection, last_used)
+            except queue.Empty:
+                connection = self._connect()
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._stats['checkouts'] += 1
+            self._stats['in_use'] += 1
+        return connection
+
+    def release(self, connection, verify=False):
+        """Returns a connection to the pool, reading any unread result and ending any open transaction first."""
+        try:
+            if verify and not connection.is_connected():
+                raise Error(msg="Connection lost while checked out")
+            if connection.unread_result:
+                # Otherwise the next borrower's first query fails with "Unread result found"
+                connection.consume_results()
+            if connection.in_transaction:
+                connection.rollback()
+            self._idle.put((connection, time.monotonic()))
+        except Error:
+            # The connection is unusable; drop it so the slot gets a fresh one next time
+            self._close(connection)
+        finally:
+            self._count('in_use', -1)
+            self._slots.release()
+
+    def discard(self, connection):
+        """Closes a checked-out connection instead of returning it, freeing its slot for a fresh one."""
+        try:
+            self._close(connection)
+        finally:
+            self._count('in_use', -1)
+            self._slots.release()
+
+    def _close(self, connection):
+        self._count('discarded')
+        try:
+            connection.close()
+        except Error:
+            pass
+
+    def close_all(self):
+        """Closes every idle connection held by the pool."""
+        while True:
+            try:
+                connection, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                connection.close()
+            except Error:
+                pass
+
+    def stats(self):
+        """Returns a snapshot of the pool counters."""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['idle'] = self._idle.qsize()
+        stats['pool_size'] = self.pool_size
+        return stats
+
+
+# Pools are kept per process so every Streamlit session and rerun reuses the same connections;
+# callers asking for different pool settings get a pool of their own
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_shared_pool(host, user, password, database, allow_local_infile=False, port=None, **pool_options):
+    """Returns the process-wide pool for these credentials and pool settings, creating it on first use."""
+    key = (host, port, user, password, database, allow_local_infile, tuple(sorted(pool_options.items())))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            connect_kwargs = {'host': host, 'user': user, 'password': password, 'database': database}
+            if port is not None:
+                connect_kwargs['port'] = port
+            if allow_local_infile:
+                # Needed by the LOAD DATA LOCAL INFILE bulk ingest path
+                connect_kwargs['allow_local_infile'] = True
+            pool = ConnectionPool(connect_kwargs, **pool_options)
+            _pools[key] = pool
+        return pool
+
+
+def parse_address(address, port=None):
+    """Splits 'host' or 'host:port' into (host, port); port is the default when none is given."""
+    host, separator, address_port = address.strip().rpartition(':')
+    if not separator:
+        return address.strip(), port
+    return host, int(address_port)
 
 
 class DatabaseConnectionManager:
-    def __init__(self, host, user, password, database):
-        self.host = host
+    """Pooled connections to a primary and, optionally, read replicas.
+
+    Checkouts go to the primary unless they are read_only. Read-only checkouts rotate over the
+    replicas and skip any that is down or has not yet replicated required_version, falling back
+    to the primary; so a reader never sees data older than the newest version it knows of.
+    """
+
+    def __init__(self, host, user, password, database, pool_size=5, checkout_timeout=10.0,
+                 health_check_interval=30.0, allow_local_infile=False, port=None, replicas=()):
+        self.host, self.port = parse_address(host, port)
         self.user = user
         self.password = password
         self.database = database
+        self.pool = get_shared_pool(
+            self.host, user, password, database,
+            allow_local_infile=allow_local_infile,
+            port=self.port,
+            pool_size=pool_size,
+            checkout_timeout=checkout_timeout,
+            health_check_interval=health_check_interval,
+        )
+        # Replicas are given as 'host' or 'host:port'; they share the primary's credentials
+        self.replicas = [parse_address(replica, self.port) for replica in replicas]
+        self.replica_pools = [
+            get_shared_pool(
+                replica_host, user, password, database,
+                port=replica_port,
+                pool_size=pool_size,
+                checkout_timeout=checkout_timeout,
+                health_check_interval=health_check_interval,
+            )
+            for replica_host, replica_port in self.replicas
+        ]
+        self.required_version = None
+        self._version_lock = threading.Lock()
+        self._next_replica = itertools.count()
+
+    def require_version(self, version):
+        """Records a data version the reader has seen; replicas must have replicated it to serve reads."""
+        with self._version_lock:
+            if version is not None and (self.required_version is None or version > self.required_version):
+                self.required_version = version
+
+    def pool_stats(self):
+        """Returns checkout, wait and reconnect counters for the shared pool and every replica pool."""
+        stats = self.pool.stats()
+        if self.replica_pools:
+            stats['replicas'] = {
+                f"{host}:{port or 3306}": dict(
+                    pool.stats(),
+                    available=pool.unavailable_until <= time.monotonic(),
+                    replicated_version=pool.replicated_version,
+                )
+                for (host, port), pool in zip(self.replicas, self.replica_pools)
+            }
+        return stats
+
+    def _mark_unavailable(self, pool, error):
+        pool.unavailable_until = time.monotonic() + REPLICA_RETRY_SECONDS
+        logger.warning(
+            "Read replica %s:%s is unavailable, retrying in %.0f seconds: %s",
+            pool.connect_kwargs['host'], pool.connect_kwargs.get('port', 3306), REPLICA_RETRY_SECONDS, error,
+        )
+
+    def _has_caught_up(self, pool, connection):
+        """True if the replica has replicated required_version; only asks it when that is not yet known."""
+        required = self.required_version
+        if required is None:
+            return True
+        if pool.replicated_version is not None and pool.replicated_version >= required:
+            return True
+        # Buffered, so the cursor closes cleanly once the one row is read
+        cursor = connection.cursor(buffered=True)
+        try:
+            cursor.execute(REPLICA_VERSION_QUERY)
+            row = cursor.fetchone()
+        finally:
+            try:
+                cursor.close()
+            except Error as e:
+                # The version was read; a failed cleanup says nothing about the replica's health
+                logger.debug("Closing the replica version cursor failed: %s", e)
+        if row is not None and (pool.replicated_version is None or row[0] > pool.replicated_version):
+            pool.replicated_version = row[0]
+        return row is not None and row[0] >= required
+
+    def _checkout_replica(self, pool):
+        """Checks out a connection to a replica that is up to date, or returns None."""
+        try:
+            connection = pool.acquire()
+        except PoolTimeoutError:
+            return None
+        except Error as e:
+            self._mark_unavailable(pool, e)
+            return None
+
+        try:
+            if self._has_caught_up(pool, connection):
+                return connection
+            count('replica_lagging')
+            pool.release(connection)
+        except Error as e:
+            pool.release(connection, verify=True)
+            self._mark_unavailable(pool, e)
+        return None
+
+    def _checkout(self, read_only):
+        """Returns (pool, connection): a replica in round-robin order for reads, else the primary."""
+        if read_only and self.replica_pools:
+            now = time.monotonic()
+            start = next(self._next_replica)
+            for offset in range(len(self.replica_pools)):
+                pool = self.replica_pools[(start + offset) % len(self.replica_pools)]
+                if pool.unavailable_until > now:
+                    continue
+                connection = self._checkout_replica(pool)
+                if connection is not None:
+                    count('replica_reads')
+                    return pool, connection
+            count('replica_fallbacks')
+        return self.pool, self.pool.acquire()
 
     @contextmanager
-    def get_connection_and_cursor(self):
-        """Context manager to yield a connection and cursor with error handling."""
-        connection = None
+    def get_connection_and_cursor(self, dictionary=True, raw=False, buffered=None, read_only=False):
+        """Context manager to yield a pooled connection and cursor with error handling.
+
+        The default dictionary cursor suits small results; large scans can ask for a raw tuple
+        cursor (dictionary=False, raw=True) and stream it with fetchmany. Pass read_only=True for
+        queries a read replica may answer.
+        """
+        try:
+            with timed('pool_checkout'):
+                pool, connection = self._checkout(read_only)
+        except Error as e:
+            logger.exception("Database error occurred")
+            yield None, None  # Return None for both connection and cursor in case of an error
+            return
+
         cursor = None
+        failed = False
+        discard = False
+        timeout = current_statement_timeout()
         try:
-            connection = mysql.connector.connect(
-                host=self.host,
-                user=self.user,
-                password=self.password,
-                database=self.database
+            cursor = InstrumentedCursor(
+                connection.cursor(dictionary=dictionary or None, raw=raw or None, buffered=buffered)
             )
-            if connection.is_connected():
-                print("Connection Successful!")
-            else:
-                print("Failed to connect to the server")
-
-            cursor = connection.cursor(dictionary=True)
+            if timeout is not None:
+                # The server aborts SELECTs running longer than this on the connection
+                cursor.execute("SET SESSION max_execution_time = %s", (int(timeout * 1000),))
             yield connection, cursor  # Yield the resources to the caller
-        except Error as e:
-            print(f"Database error occurred: {e}")
-            yield None, None  # Return None for both connection and cursor in case of an error
+        except BaseException as e:
+            failed = True
+            if pool is not self.pool and isinstance(e, Error) and not connection.is_connected():
+                # The replica went away mid-query; the next reads try another one
+                self._mark_unavailable(pool, e)
+            raise
         finally:
+            if timeout is not None and cursor is not None:
+                try:
+                    cursor.execute("SET SESSION max_execution_time = DEFAULT")
+                except Error:
+                    # The limit must not follow the connection back into the pool
+                    discard = True
             if cursor is not None:
-                cursor.close()
-            if connection is not None:
-                connection.close()
+                try:
+                    cursor.close()
+                except Error:
+                    # The cursor may have left a result behind that would break the next borrower
+                    discard = True
+            if discard:
+                pool.discard(connection)
+            else:
+                pool.release(connection, verify=failed)
 
 
 # import mysql.connector
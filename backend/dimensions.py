@@ -0,0 +1,73 @@
+import threading
+from mysql.connector import Error
+
+# Every plan label is stored once here; revenue_fact rows reference it by its small plan_id
+CREATE_DIM_PLAN_QUERY = """
+CREATE TABLE IF NOT EXISTS dim_plan (
+    plan_id SMALLINT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    plans VARCHAR(10) NOT NULL,
+    UNIQUE INDEX idx_dim_plan_plans (plans)
+);
+"""
+
+
+class PlanCodes:
+    """In-process cache of one database's dim_plan, mapping plan labels to their plan_id.
+
+    dim_plan only grows and a plan keeps its id, so a cached id stays valid for the life of the
+    process; unknown labels are added and committed before they are cached.
+    """
+
+    def __init__(self):
+        self._codes = {}
+        self._lock = threading.Lock()
+
+    def register(self, connection, cursor, labels):
+        """Returns {label: plan_id} for the labels, adding the unknown ones to dim_plan.
+
+        Commits, so call it with no other work pending on the connection. Labels that dim_plan
+        cannot store (e.g. too long for the column) are left out of the result.
+        """
+        labels = set(labels)
+        with self._lock:
+            codes = {label: self._codes[label] for label in labels if label in self._codes}
+        missing = labels - codes.keys()
+        if not missing:
+            return codes
+
+        found = {}
+        for label in missing:
+            try:
+                # Looked up one by one so the column collation decides which stored label matches
+                cursor.execute("SELECT plan_id FROM dim_plan WHERE plans = %s", (label,))
+                row = cursor.fetchone()
+                if row is None:
+                    # Only new labels are inserted, so plan_id values are not used up by repeated imports
+                    cursor.execute(
+                        "INSERT INTO dim_plan (plans) VALUES (%s) ON DUPLICATE KEY UPDATE plan_id = plan_id",
+                        (label,),
+                    )
+                    cursor.execute("SELECT plan_id FROM dim_plan WHERE plans = %s", (label,))
+                    row = cursor.fetchone()
+            except Error:
+                continue
+            if row is not None:
+                found[label] = row['plan_id']
+        connection.commit()
+
+        with self._lock:
+            self._codes.update(found)
+        codes.update(found)
+        return codes
+
+
+# One cache per database and process, shared by every Streamlit session and loader thread
+_shared_plan_codes = {}
+_shared_plan_codes_lock = threading.Lock()
+
+
+def get_shared_plan_codes(namespace):
+    with _shared_plan_codes_lock:
+        if namespace not in _shared_plan_codes:
+            _shared_plan_codes[namespace] = PlanCodes()
+        return _shared_plan_codes[namespace]
@@ -0,0 +1,73 @@
+import hashlib
+
+READ_BLOCK_SIZE = 1 << 20
+
+
+class FileFingerprint:
+    def __init__(self, content_hash, row_count, chunk_rows, chunk_hashes):
+        self.content_hash = content_hash
+        self.row_count = row_count
+        self.chunk_rows = chunk_rows
+        self.chunk_hashes = chunk_hashes
+
+    def changed_chunks(self, previous_chunk_hashes):
+        """Returns the indexes of chunks whose hash differs from a previous import of the file."""
+        return [
+            chunk_index
+            for chunk_index, chunk_hash in enumerate(self.chunk_hashes)
+            if chunk_index >= len(previous_chunk_hashes) or previous_chunk_hashes[chunk_index] != chunk_hash
+        ]
+
+
+def _iter_lines(uploaded_file):
+    """Yields the raw lines of a binary file object block by block."""
+    remainder = b''
+    while True:
+        block = uploaded_file.read(READ_BLOCK_SIZE)
+        if not block:
+            break
+        lines = (remainder + block).split(b'\n')
+        remainder = lines.pop()
+        yield from lines
+    if remainder:
+        yield remainder
+
+
+def fingerprint_file(uploaded_file, chunk_rows):
+    """Streams an uploaded CSV once and returns its content hash, row count and per-chunk hashes.
+
+    Chunks hold chunk_rows non-blank data lines, matching the chunks pandas produces with
+    chunksize=chunk_rows, and each chunk hash also covers the header line.
+    """
+    uploaded_file.seek(0)
+    content_hash = hashlib.sha256()
+    header = None
+    chunk_hash = None
+    chunk_hashes = []
+    row_count = 0
+    rows_in_chunk = 0
+
+    for line in _iter_lines(uploaded_file):
+        content_hash.update(line + b'\n')
+        line = line.rstrip(b'\r')
+        if not line.strip():
+            continue
+        if header is None:
+            header = line
+            continue
+
+        if chunk_hash is None:
+            chunk_hash = hashlib.sha256(header + b'\n')
+        chunk_hash.update(line + b'\n')
+        row_count += 1
+        rows_in_chunk += 1
+        if rows_in_chunk == chunk_rows:
+            chunk_hashes.append(chunk_hash.hexdigest())
+            chunk_hash = None
+            rows_in_chunk = 0
+
+    if chunk_hash is not None:
+        chunk_hashes.append(chunk_hash.hexdigest())
+
+    uploaded_file.seek(0)
+    return FileFingerprint(content_hash.hexdigest(), row_count, chunk_rows, chunk_hashes)
@@ -1,43 +1,410 @@
 import pandas as pd
-import streamlit as st
+from backend.datenormalizer import DateNormalizer
+from backend.filehasher import fingerprint_file
+from backend.instrumentation import count, operation, timed
+from backend.reporting import Reporter
+
+# Rows per chunk in streaming mode; also the unit that import checkpoints are recorded in
+CHUNK_ROWS = 50000
+
 
 class FileProcessor:
-    def __init__(self, db_manager):
+    def __init__(self, db_manager, chunksize=CHUNK_ROWS, snapshot_store=None, notifier=None, staged=False):
         self.db_manager = db_manager
+        self.chunksize = chunksize
+        # Staged mode imports every file as one transaction (import_file_atomically) instead of
+        # committing chunk by chunk with checkpoints; a failed import leaves nothing behind to clean up
+        self.staged = staged
+        # Reporter that receives the per-file outcome messages and the import progress; the
+        # Streamlit page, the ingest worker and the command line each pass their own, the default logs
+        self.notifier = notifier or Reporter()
+        # Optional SnapshotStore, refreshed after every batch of uploads
+        self.snapshot_store = snapshot_store
+
+    @staticmethod
+    def clean_dataframe(df, date_normalizer=None):
+        """Parses dates into native dates and city codes into integers; drops rows with missing or invalid dates.
+
+        Pass the same DateNormalizer for every chunk of a file so its day/month order and parsed
+        dates carry over; by default each call starts a new one, deciding the order from df alone.
+        """
+        date_normalizer = date_normalizer or DateNormalizer()
+        with timed('date_parse'):
+            df['date'] = date_normalizer.normalize(df['date'])
+            df = df.dropna(subset=['date'])
+        # City codes are integers from here on; a code that is not a whole number becomes missing,
+        # so the loader rejects its row
+        city_codes = pd.to_numeric(df['city_code'], errors='coerce')
+        df['city_code'] = city_codes.where(city_codes % 1 == 0).astype('Int64')
+        return df
+
+    def plan_import(self, uploaded_file):
+        """Fingerprints an upload and decides what to import.
+
+        Returns (fingerprint, chunks): chunks is None for a brand new file, the list of changed
+        chunk indexes for a file imported before under the same name, or False to skip the file.
+        """
+        filename = uploaded_file.name
+        fingerprint = fingerprint_file(uploaded_file, self.chunksize)
+
+        # Identical content is skipped whatever the file is called
+        duplicate = self.db_manager.find_imported_file_by_hash(fingerprint.content_hash)
+        if duplicate:
+            if duplicate['filename'] == filename:
+                self.notifier.warning(f"The file '{filename}' has already been imported.")
+            else:
+                self.notifier.warning(
+                    f"The file '{filename}' has the same content as '{duplicate['filename']}', "
+                    f"which has already been imported."
+                )
+            return fingerprint, False
+
+        previous = self.db_manager.get_imported_file(filename)
+        if previous is None:
+            return fingerprint, None
+        if previous['chunk_hashes'] is not None and previous['chunk_rows'] == self.chunksize:
+            return fingerprint, fingerprint.changed_chunks(previous['chunk_hashes'])
+        # Imported before without chunk hashes (or with another chunk size): re-upsert everything
+        return fingerprint, list(range(len(fingerprint.chunk_hashes)))
 
     def process_file(self, uploaded_file):
         filename = uploaded_file.name
 
         try:
-            # Check if file is already imported
-            if self.db_manager.is_file_imported(filename):
-                st.warning(f"The file '{filename}' has already been imported.")
+            fingerprint, chunks = self.plan_import(uploaded_file)
+            if chunks is False:
+                return
+            if self.staged:
+                self.process_file_staged(uploaded_file, plan=(fingerprint, chunks))
+                return
+            if chunks is not None:
+                # Modified version of a known file: only the changed chunks are re-imported
+                self.process_file_streaming(uploaded_file, plan=(fingerprint, chunks))
                 return
 
             try:
                 # Reading and processing the file
-                df = pd.read_csv(uploaded_file,dtype={'city_code': str})
-                df['date'] = pd.to_datetime(df['date'], format='mixed', errors='coerce')
-                df = df.dropna(subset=['date'])
-                df['date'] = df['date'].dt.strftime('%Y-%m-%d')
+                with operation('process_file'):
+                    with timed('csv_parse'):
+                        df = pd.read_csv(uploaded_file,dtype={'city_code': str})
+                    count('csv_bytes', getattr(uploaded_file, 'size', 0) or 0)
+                    count('csv_rows', len(df))
+                    df = self.clean_dataframe(df)
 
                 # Inserting data into the database and marking the file as imported
-                self.db_manager.insert_data_to_revenue_table(df)
-                self.db_manager.mark_file_as_imported(filename)
+                result = self.db_manager.insert_data_to_revenue_table(df)
+                if result.failed:
+                    # Left unrecorded, so the next upload of the file imports it again
+                    self.notifier.error(f"Error importing '{filename}': {result.error}")
+                    return
+                self.db_manager.mark_file_as_imported(filename, fingerprint)
+
+                self.notifier.success(
+                    f"Data from '{filename}' imported successfully: {result.rows_inserted} rows "
+                    f"({result.rows_per_second:.0f} rows/sec)."
+                )
+                if result.rows_rejected:
+                    self.notifier.warning(
+                        f"{result.rows_rejected} rows from '{filename}' were rejected "
+                        f"(see the revenue_data_rejects table)."
+                    )
+
+            except pd.errors.ParserError:
+                self.notifier.error(
+                    f"Error parsing the file '{filename}'. Please ensure the file is a valid CSV."
+                )
+            except KeyError:
+                self.notifier.error(
+                    f"Error: The file '{filename}' is missing required columns, such as 'date'."
+                )
+            except Exception as e:
+                self.notifier.error(f"Error processing file '{filename}': {e}")
+
+        except Exception as e:
+            # Handle errors that might occur outside of file processing
+            self.notifier.error(f"Unexpected error with file '{filename}': {e}")
+
+    def _read_chunks(self, uploaded_file, start_after=-1, only_chunks=None):
+        """Yields (chunk_index, raw_chunk), skipping chunks committed by an earlier run or left unchanged."""
+        reader = pd.read_csv(uploaded_file, dtype={'city_code': str}, chunksize=self.chunksize)
+        with reader:
+            chunks = enumerate(reader)
+            while True:
+                with timed('csv_parse', operation='process_file_streaming'):
+                    chunk_index, chunk = next(chunks, (None, None))
+                if chunk is None:
+                    return
+                if chunk_index <= start_after:
+                    continue
+                if only_chunks is not None and chunk_index not in only_chunks:
+                    continue
+                count('csv_rows', len(chunk), operation='process_file_streaming')
+                yield chunk_index, chunk
+
+    def _file_date_normalizer(self, uploaded_file):
+        """Returns a DateNormalizer whose day/month order is decided from the file's whole date column.
+
+        Every chunk is then parsed in the same order, whatever the chunk size or the chunks being
+        re-imported. Raises AmbiguousDateError when the file mixes both orders.
+        """
+        date_normalizer = DateNormalizer()
+        uploaded_file.seek(0)
+        # Only the date column is read; a file without one yields chunks without it (KeyError)
+        reader = pd.read_csv(
+            uploaded_file, usecols=lambda column: column == 'date', dtype=str, chunksize=self.chunksize
+        )
+        with reader, timed('date_scan'):
+            for chunk in reader:
+                date_normalizer.scan(chunk['date'])
+        uploaded_file.seek(0)
+        date_normalizer.decide_order()
+        return date_normalizer
+
+    def _clean_chunks(self, chunks, date_normalizer):
+        """Yields (chunk_index, cleaned_chunk) for every raw chunk of one file."""
+        for chunk_index, chunk in chunks:
+            yield chunk_index, self.clean_dataframe(chunk, date_normalizer)
+
+    @staticmethod
+    def _fraction_read(uploaded_file):
+        """Approximates import progress from the read position of the uploaded file."""
+        size = getattr(uploaded_file, 'size', None)
+        if not size:
+            return None
+        try:
+            return min(uploaded_file.tell() / size, 1.0)
+        except (OSError, ValueError):
+            return None
+
+    def process_file_streaming(self, uploaded_file, progress_callback=None, plan=None):
+        """Imports a CSV chunk by chunk with bounded memory, resuming after the last committed chunk.
+
+        progress_callback is called as progress_callback(fraction, rows_imported) after every chunk;
+        fraction is None when the upload size is unknown. A file imported before under the same name
+        only has its changed chunks upserted. Returns (rows_imported, rows_rejected) once the file is
+        imported, or None if it was skipped or failed.
+        """
+        if self.staged:
+            return self.process_file_staged(uploaded_file, progress_callback=progress_callback, plan=plan)
+        filename = uploaded_file.name
+
+        try:
+            fingerprint, chunks = plan if plan is not None else self.plan_import(uploaded_file)
+            if chunks is False:
+                return
+            only_chunks = set(chunks) if chunks is not None else None
+            upsert = chunks is not None
+            if upsert and not only_chunks:
+                self.db_manager.mark_file_as_imported(filename, fingerprint)
+                self.notifier.info(f"No changed rows in '{filename}'; nothing to re-import.")
+                return
+
+            try:
+                checkpoint = self.db_manager.get_import_checkpoint(filename)
+                if checkpoint and checkpoint['chunksize'] == self.chunksize:
+                    last_chunk = checkpoint['last_chunk']
+                    rows_imported = checkpoint['rows_committed']
+                    self.notifier.info(
+                        f"Resuming '{filename}' after chunk {last_chunk + 1} ({rows_imported} rows)."
+                    )
+                else:
+                    last_chunk, rows_imported = -1, 0
+                rows_rejected = 0
 
-                st.success(f"Data from '{filename}' imported successfully.")
+                count('csv_bytes', getattr(uploaded_file, 'size', 0) or 0, operation='process_file_streaming')
+                date_normalizer = self._file_date_normalizer(uploaded_file)
+                # Read -> clean -> insert, one bounded chunk at a time
+                raw_chunks = self._read_chunks(uploaded_file, start_after=last_chunk, only_chunks=only_chunks)
+                for chunk_index, chunk in self._clean_chunks(raw_chunks, date_normalizer):
+                    # The checkpoint commits with the chunk, so a resume neither repeats nor skips it
+                    result = self.db_manager.insert_data_to_revenue_table(
+                        chunk, upsert=upsert, checkpoint=(filename, chunk_index, rows_imported, self.chunksize)
+                    )
+                    if result.failed:
+                        # The file stays unrecorded and the next attempt resumes at this chunk
+                        raise RuntimeError(f"chunk {chunk_index + 1} could not be imported: {result.error}")
+                    rows_imported += result.rows_inserted
+                    rows_rejected += result.rows_rejected
+                    if progress_callback is not None:
+                        progress_callback(self._fraction_read(uploaded_file), rows_imported)
+
+                self.db_manager.mark_file_as_imported(filename, fingerprint)
+                self.db_manager.clear_import_checkpoint(filename)
+                if progress_callback is not None:
+                    progress_callback(1.0, rows_imported)
+
+                if upsert:
+                    self.notifier.success(
+                        f"Re-imported {len(only_chunks)} changed chunk(s) of '{filename}': {rows_imported} rows."
+                    )
+                else:
+                    self.notifier.success(f"Data from '{filename}' imported successfully: {rows_imported} rows.")
+                if rows_rejected:
+                    self.notifier.warning(
+                        f"{rows_rejected} rows from '{filename}' were rejected "
+                        f"(see the revenue_data_rejects table)."
+                    )
+                return rows_imported, rows_rejected
+
+            except pd.errors.ParserError:
+                self.notifier.error(
+                    f"Error parsing the file '{filename}'. Please ensure the file is a valid CSV."
+                )
+            except KeyError:
+                self.notifier.error(
+                    f"Error: The file '{filename}' is missing required columns, such as 'date'."
+                )
+            except Exception as e:
+                self.notifier.error(f"Error processing file '{filename}': {e}")
+
+        except Exception as e:
+            # Handle errors that might occur outside of file processing
+            self.notifier.error(f"Unexpected error with file '{filename}': {e}")
+
+    def process_file_staged(self, uploaded_file, progress_callback=None, plan=None):
+        """Imports a CSV as a single transaction through a stage table; safe to retry after any failure.
+
+        Takes the same progress_callback and plan as process_file_streaming and returns
+        (rows_imported, rows_rejected), or None if the file was skipped or the import failed.
+        """
+        filename = uploaded_file.name
+
+        try:
+            fingerprint, chunks = plan if plan is not None else self.plan_import(uploaded_file)
+            if chunks is False:
+                return
+            only_chunks = set(chunks) if chunks is not None else None
+            if only_chunks is not None and not only_chunks:
+                self.db_manager.mark_file_as_imported(filename, fingerprint)
+                self.notifier.info(f"No changed rows in '{filename}'; nothing to re-import.")
+                return
+
+            try:
+                count('csv_bytes', getattr(uploaded_file, 'size', 0) or 0, operation='process_file_staged')
+                staged_rows = 0
+                read_errors = []
+                date_normalizer = self._file_date_normalizer(uploaded_file)
+
+                def staged_chunks():
+                    nonlocal staged_rows
+                    raw_chunks = self._read_chunks(uploaded_file, only_chunks=only_chunks)
+                    try:
+                        for _, chunk in self._clean_chunks(raw_chunks, date_normalizer):
+                            yield chunk
+                            staged_rows += len(chunk)
+                            if progress_callback is not None:
+                                progress_callback(self._fraction_read(uploaded_file), staged_rows)
+                    except Exception as e:
+                        # The storage backend only reports that the import failed; keep the cause
+                        read_errors.append(e)
+                        raise
+                    finally:
+                        raw_chunks.close()
+
+                result = self.db_manager.import_file_atomically(filename, staged_chunks(), fingerprint)
+                if read_errors:
+                    raise read_errors[0]
+                if result is None:
+                    self.notifier.error(f"Error importing '{filename}'; no rows were written. Please retry.")
+                    return
+                if progress_callback is not None:
+                    progress_callback(1.0, result.rows_inserted)
+
+                if only_chunks is not None:
+                    self.notifier.success(
+                        f"Re-imported {len(only_chunks)} changed chunk(s) of '{filename}': {result.rows_inserted} rows."
+                    )
+                else:
+                    self.notifier.success(
+                        f"Data from '{filename}' imported successfully: {result.rows_inserted} rows "
+                        f"({result.rows_per_second:.0f} rows/sec)."
+                    )
+                if result.rows_rejected:
+                    self.notifier.warning(
+                        f"{result.rows_rejected} rows from '{filename}' were rejected "
+                        f"(see the revenue_data_rejects table)."
+                    )
+                return result.rows_inserted, result.rows_rejected
 
             except pd.errors.ParserError:
-                st.error(f"Error parsing the file '{filename}'. Please ensure the file is a valid CSV.")
+                self.notifier.error(
+                    f"Error parsing the file '{filename}'. Please ensure the file is a valid CSV."
+                )
             except KeyError:
-                st.error(f"Error: The file '{filename}' is missing required columns, such as 'date'.")
+                self.notifier.error(
+                    f"Error: The file '{filename}' is missing required columns, such as 'date'."
+                )
             except Exception as e:
-                st.error(f"Error processing file '{filename}': {e}")
+                self.notifier.error(f"Error processing file '{filename}': {e}")
 
         except Exception as e:
             # Handle errors that might occur outside of file processing
-            st.error(f"Unexpected error with file '{filename}': {e}")
+            self.notifier.error(f"Unexpected error with file '{filename}': {e}")
+
+    def _show_ingest_status(self, status):
+        """Reports the outcome of one file from the parallel ingest scheduler."""
+        # Skipped files and re-imports, failed or not, were already reported while planning and streaming them
+        if status.status == 'imported':
+            self.notifier.success(
+                f"Data from '{status.filename}' imported successfully: {status.rows_inserted} rows "
+                f"(parse {status.parse_seconds:.2f}s, insert {status.insert_seconds:.2f}s, "
+                f"{status.rows_per_second:.0f} rows/sec)."
+            )
+            if status.rows_rejected:
+                self.notifier.warning(
+                    f"{status.rows_rejected} rows from '{status.filename}' were rejected "
+                    f"(see the revenue_data_rejects table)."
+                )
+        elif status.status == 'failed' and not status.reported:
+            self.notifier.error(f"Error processing file '{status.filename}': {status.message}")
+
+    def refresh_snapshot(self):
+        """Re-exports the Parquet snapshot if the imports changed revenue_data."""
+        if self.snapshot_store is None:
+            return
+        try:
+            self.snapshot_store.refresh(self.db_manager)
+        except Exception as e:
+            self.notifier.warning(
+                f"Could not refresh the revenue snapshot; charts will read from the database: {e}"
+            )
+
+    def process_multiple_files(self, uploaded_files, streaming=False, parallel=False):
+        try:
+            self._process_multiple_files(uploaded_files, streaming, parallel)
+        finally:
+            self.refresh_snapshot()
+
+    def _process_multiple_files(self, uploaded_files, streaming, parallel):
+        if parallel:
+            # Imported here because the scheduler module itself builds on FileProcessor
+            from backend.parallelingest import ParallelIngestScheduler
+
+            self.notifier.progress(0.0, text=f"Importing {len(uploaded_files)} files...")
+            finished = []
+
+            def on_file_done(status):
+                finished.append(status)
+                self._show_ingest_status(status)
+                self.notifier.progress(
+                    len(finished) / len(uploaded_files),
+                    text=f"Imported {len(finished)} of {len(uploaded_files)} files",
+                )
+
+            scheduler = ParallelIngestScheduler(self.db_manager, self)
+            scheduler.ingest(uploaded_files, on_file_done=on_file_done)
+            self.notifier.progress_done()
+            return
 
-    def process_multiple_files(self, uploaded_files):
         for uploaded_file in uploaded_files:
-            self.process_file(uploaded_file)
+            if not streaming:
+                self.process_file(uploaded_file)
+                continue
+
+            self.notifier.progress(0.0, text=f"Importing '{uploaded_file.name}'...")
+
+            def update_progress(fraction, rows_imported, name=uploaded_file.name):
+                self.notifier.progress(fraction, text=f"Importing '{name}': {rows_imported} rows")
+
+            self.process_file_streaming(uploaded_file, progress_callback=update_progress)
+            self.notifier.progress_done()
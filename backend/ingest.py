@@ -0,0 +1,225 @@
+import argparse
+import glob
+import json
+import logging
+import os
+import sys
+import time
+from backend.reporting import CollectingReporter, Reporter
+
+# pandas, the database drivers and pyarrow are imported where they are first needed, so the command
+# line starts (and answers --help) without loading them
+
+logger = logging.getLogger(__name__)
+
+
+class LocalFile:
+    """A file on disk opened under the name FileProcessor should record it as, like an upload."""
+
+    def __init__(self, path, name=None):
+        self.name = name or os.path.basename(path)
+        self.size = os.path.getsize(path)
+        self._file = open(path, 'rb')
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+    def __iter__(self):
+        return iter(self._file)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._file.close()
+
+
+def expand_paths(patterns, recursive=False):
+    """Resolves files, directories (their *.csv files) and glob patterns into a sorted list of paths."""
+    paths = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = glob.glob(os.path.join(pattern, '**' if recursive else '', '*.csv'), recursive=recursive)
+        elif any(character in pattern for character in '*?['):
+            matches = glob.glob(pattern, recursive=recursive)
+        else:
+            # Kept even if it does not exist, so the missing file is reported as failed
+            matches = [pattern]
+        if not matches:
+            logger.warning("No CSV files match %s", pattern)
+        paths.update(os.path.normpath(path) for path in matches if not os.path.isdir(path))
+    return sorted(paths)
+
+
+class FileResult:
+    """Outcome of loading one file: 'imported', 'skipped' (already imported) or 'failed'."""
+
+    def __init__(self, path):
+        self.path = path
+        self.status = None
+        self.rows_inserted = 0
+        self.rows_rejected = 0
+        self.bytes = 0
+        self.elapsed = 0.0
+        self.messages = []
+
+    @property
+    def rows_per_second(self):
+        return self.rows_inserted / self.elapsed if self.elapsed > 0 else 0.0
+
+    def as_dict(self):
+        return {
+            'path': self.path,
+            'status': self.status,
+            'rows_inserted': self.rows_inserted,
+            'rows_rejected': self.rows_rejected,
+            'bytes': self.bytes,
+            'seconds': round(self.elapsed, 3),
+            'rows_per_second': round(self.rows_per_second, 1),
+            'messages': self.messages,
+        }
+
+
+def ingest_files(storage, paths, reporter=None, staged=False, chunk_rows=None, on_file_done=None):
+    """Loads CSV files into a storage backend one after the other and returns a FileResult per file.
+
+    Files are read in chunks, so memory stays bounded whatever their size; with staged=True each
+    file is committed as one transaction. Messages and progress go to reporter (logged by default),
+    and on_file_done(result) is called as each file finishes.
+    """
+    from backend.fileprocessor import CHUNK_ROWS, FileProcessor
+
+    reporter = reporter or Reporter()
+    results = []
+    for path in paths:
+        result = FileResult(path)
+        file_reporter = CollectingReporter(reporter)
+        file_processor = FileProcessor(
+            storage, chunksize=chunk_rows or CHUNK_ROWS, notifier=file_reporter, staged=staged
+        )
+
+        def report_progress(fraction, rows_imported, name=os.path.basename(path)):
+            file_reporter.progress(fraction, text=f"Importing '{name}': {rows_imported} rows")
+
+        started = time.perf_counter()
+        outcome = None
+        try:
+            with LocalFile(path) as local_file:
+                result.bytes = local_file.size
+                outcome = file_processor.process_file_streaming(local_file, progress_callback=report_progress)
+        except OSError as e:
+            file_reporter.error(f"Could not open '{path}': {e}")
+        file_reporter.progress_done()
+        result.elapsed = time.perf_counter() - started
+
+        result.messages = file_reporter.messages + file_reporter.errors
+        if file_reporter.errors:
+            result.status = 'failed'
+        elif outcome is None:
+            result.status = 'skipped'
+        else:
+            result.status = 'imported'
+            result.rows_inserted, result.rows_rejected = outcome
+        results.append(result)
+        if on_file_done is not None:
+            on_file_done(result)
+    return results
+
+
+def summarize(results, elapsed):
+    """Totals and throughput of a whole run, with the per-file results."""
+    rows_inserted = sum(result.rows_inserted for result in results)
+    total_bytes = sum(result.bytes for result in results)
+    return {
+        'files': [result.as_dict() for result in results],
+        'imported': sum(result.status == 'imported' for result in results),
+        'skipped': sum(result.status == 'skipped' for result in results),
+        'failed': sum(result.status == 'failed' for result in results),
+        'rows_inserted': rows_inserted,
+        'rows_rejected': sum(result.rows_rejected for result in results),
+        'bytes': total_bytes,
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(rows_inserted / elapsed, 1) if elapsed > 0 else 0.0,
+        'megabytes_per_second': round(total_bytes / 1e6 / elapsed, 2) if elapsed > 0 else 0.0,
+    }
+
+
+def _print_result(result):
+    if result.status == 'failed':
+        print(f"failed    {result.path}: {result.messages[-1]}")
+    elif result.status == 'skipped':
+        print(f"skipped   {result.path}: {result.messages[-1] if result.messages else 'already imported'}")
+    else:
+        print(
+            f"imported  {result.path}: {result.rows_inserted} rows, {result.rows_rejected} rejected, "
+            f"{result.elapsed:.2f}s, {result.rows_per_second:,.0f} rows/sec"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m backend.ingest',
+        description="Load revenue CSV files into the revenue database without the dashboard.",
+    )
+    parser.add_argument('paths', nargs='+', help="CSV files, directories of CSV files or glob patterns")
+    parser.add_argument('--recursive', action='store_true', help="also load CSV files in subdirectories")
+    parser.add_argument(
+        '--backend', choices=['mysql', 'sqlite'], default=None,
+        help="storage backend (default: REVENUE_DB_BACKEND, or sqlite when --db-path is given)",
+    )
+    parser.add_argument('--db-path', default=None, help="SQLite database file (default: REVENUE_DB_PATH)")
+    parser.add_argument('--staged', action='store_true', help="commit each file as a single transaction")
+    parser.add_argument('--chunk-rows', type=int, default=None, help="rows read per chunk")
+    parser.add_argument('--refresh-snapshot', action='store_true', help="refresh the Parquet snapshot afterwards")
+    parser.add_argument('--json', action='store_true', help="print the summary as JSON")
+    parser.add_argument('-q', '--quiet', action='store_true', help="only report warnings and errors")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.WARNING if args.quiet else logging.INFO,
+        format="%(asctime)s %(levelname)s %(message)s",
+        stream=sys.stderr,
+    )
+    backend = args.backend or ('sqlite' if args.db_path else None)
+    if args.db_path and backend != 'sqlite':
+        parser.error("--db-path only applies to the sqlite backend")
+
+    paths = expand_paths(args.paths, recursive=args.recursive)
+    if not paths:
+        print("No CSV files to load.", file=sys.stderr)
+        return 1
+
+    from backend.storage import create_storage_backend
+
+    # The backends log their progress to stderr, so with --json stdout carries only the summary
+    started = time.perf_counter()
+    storage = create_storage_backend(backend, **({'path': args.db_path} if args.db_path else {}))
+    storage.create_tables()
+    results = ingest_files(
+        storage, paths, staged=args.staged, chunk_rows=args.chunk_rows,
+        on_file_done=None if args.json else _print_result,
+    )
+
+    if args.refresh_snapshot and any(result.status == 'imported' for result in results):
+        from backend.snapshot import create_snapshot_store
+
+        snapshot_store = create_snapshot_store()
+        if snapshot_store is None:
+            logger.warning("pyarrow is not installed; the snapshot was not refreshed")
+        else:
+            snapshot_store.refresh(storage)
+    summary = summarize(results, time.perf_counter() - started)
+
+    if args.json:
+        print(json.dumps(summary, indent=2, default=str))
+    else:
+        print(
+            f"{summary['imported']} imported, {summary['skipped']} skipped, {summary['failed']} failed: "
+            f"{summary['rows_inserted']} rows ({summary['rows_rejected']} rejected) in {summary['seconds']:.2f}s, "
+            f"{summary['rows_per_second']:,.0f} rows/sec, {summary['megabytes_per_second']:.2f} MB/sec"
+        )
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
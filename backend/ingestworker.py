@@ -0,0 +1,191 @@
+import argparse
+import glob
+import logging
+import os
+import shutil
+import socket
+import time
+import uuid
+from backend.fileprocessor import FileProcessor
+from backend.ingest import LocalFile
+from backend.reporting import CollectingReporter
+
+logger = logging.getLogger(__name__)
+
+# Dropped files are only picked up once they have not changed for this long
+WATCH_SETTLE_SECONDS = 2.0
+
+
+def get_spool_dir(spool_dir=None):
+    """Directory uploads are copied to until the worker imports them (REVENUE_SPOOL_DIR, default 'spool')."""
+    return spool_dir or os.environ.get('REVENUE_SPOOL_DIR', 'spool')
+
+
+def spool_upload(uploaded_file, spool_dir=None):
+    """Copies an upload into the spool directory and returns its path there."""
+    directory = get_spool_dir(spool_dir)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{uuid.uuid4().hex}-{os.path.basename(uploaded_file.name)}")
+    uploaded_file.seek(0)
+    # Written under a temporary name so the worker never sees a partial file
+    with open(path + '.part', 'wb') as spooled:
+        shutil.copyfileobj(uploaded_file, spooled)
+    os.replace(path + '.part', path)
+    return path
+
+
+def enqueue_uploads(storage, uploaded_files, spool_dir=None, max_attempts=3):
+    """Spools uploads and queues one ingest job per file; returns the job ids."""
+    job_ids = []
+    for uploaded_file in uploaded_files:
+        path = spool_upload(uploaded_file, spool_dir)
+        job_id = storage.enqueue_ingest_job(uploaded_file.name, path, max_attempts=max_attempts)
+        if job_id is None:
+            os.remove(path)
+        else:
+            job_ids.append(job_id)
+    return job_ids
+
+
+class IngestWorker:
+    """Imports queued uploads outside the Streamlit process.
+
+    Jobs are claimed from the ingest_jobs table, so several workers can share a queue; a job whose
+    import fails is retried after retry_delay seconds up to its max_attempts. In watch-folder mode
+    CSV files dropped into watch_dir are moved to the spool directory and queued as well.
+    """
+
+    def __init__(self, storage, spool_dir=None, watch_dir=None, poll_interval=2.0, lease_seconds=300,
+                 retry_delay=30, snapshot_store=None):
+        self.storage = storage
+        self.spool_dir = get_spool_dir(spool_dir)
+        self.watch_dir = watch_dir
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.retry_delay = retry_delay
+        self.snapshot_store = snapshot_store
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+    def scan_watch_dir(self):
+        """Queues the CSV files in the watch directory that have finished being written."""
+        if self.watch_dir is None:
+            return []
+        os.makedirs(self.spool_dir, exist_ok=True)
+        job_ids = []
+        for path in sorted(glob.glob(os.path.join(self.watch_dir, '*.csv'))):
+            try:
+                if time.time() - os.path.getmtime(path) < WATCH_SETTLE_SECONDS:
+                    continue
+                filename = os.path.basename(path)
+                spooled_path = os.path.join(self.spool_dir, f"{uuid.uuid4().hex}-{filename}")
+                shutil.move(path, spooled_path)
+            except OSError as e:
+                logger.warning("Could not pick up %s: %s", path, e)
+                continue
+            job_id = self.storage.enqueue_ingest_job(filename, spooled_path)
+            if job_id is not None:
+                logger.info("Queued %s from the watch folder as job %s", filename, job_id)
+                job_ids.append(job_id)
+        return job_ids
+
+    def process(self, job):
+        """Imports the file of one claimed job and records the outcome."""
+        job_id = job['id']
+        notifier = CollectingReporter()
+        # Staged imports commit a file all at once, so a failed attempt can simply be retried
+        file_processor = FileProcessor(self.storage, notifier=notifier, staged=True)
+        started = time.perf_counter()
+
+        def report_progress(fraction, rows_imported):
+            elapsed = time.perf_counter() - started
+            self.storage.update_ingest_job(
+                job_id,
+                progress=fraction if fraction is not None else 0.0,
+                rows_inserted=rows_imported,
+                rows_per_second=rows_imported / elapsed if elapsed > 0 else None,
+            )
+
+        logger.info("Importing %s (job %s, attempt %s)", job['filename'], job_id, job['attempts'])
+        result = None
+        try:
+            with LocalFile(job['path'], job['filename']) as spooled_file:
+                result = file_processor.process_file_streaming(spooled_file, progress_callback=report_progress)
+        except OSError as e:
+            notifier.error(f"Could not open the spooled file of '{job['filename']}': {e}")
+
+        if notifier.errors:
+            self.storage.fail_ingest_job(job_id, notifier.errors[-1], retry_delay=self.retry_delay)
+            return False
+
+        rows_inserted, rows_rejected = result or (0, 0)
+        elapsed = time.perf_counter() - started
+        self.storage.update_ingest_job(
+            job_id,
+            status='done',
+            progress=1.0,
+            rows_inserted=rows_inserted,
+            rows_rejected=rows_rejected,
+            rows_per_second=rows_inserted / elapsed if elapsed > 0 else None,
+            message=' '.join(notifier.messages)[:1024],
+        )
+        try:
+            os.remove(job['path'])
+        except OSError:
+            pass
+        return True
+
+    def refresh_snapshot(self):
+        if self.snapshot_store is None:
+            return
+        try:
+            self.snapshot_store.refresh(self.storage)
+        except Exception as e:
+            logger.warning("Could not refresh the revenue snapshot: %s", e)
+
+    def run(self, once=False):
+        """Processes jobs until interrupted; with once=True, stops when the queue is empty."""
+        logger.info("Ingest worker %s started", self.worker_id)
+        imported_since_refresh = False
+        while True:
+            self.scan_watch_dir()
+            job = self.storage.claim_ingest_job(self.worker_id, lease_seconds=self.lease_seconds)
+            if job is not None:
+                imported_since_refresh = self.process(job) or imported_since_refresh
+                continue
+
+            # The queue is drained: publish the new data to the snapshot once
+            if imported_since_refresh:
+                self.refresh_snapshot()
+                imported_since_refresh = False
+            if once:
+                return
+            time.sleep(self.poll_interval)
+
+
+if __name__ == "__main__":
+    from backend.snapshot import create_snapshot_store
+    from backend.storage import create_storage_backend
+
+    parser = argparse.ArgumentParser(description="Import queued revenue CSV uploads in the background.")
+    parser.add_argument('--watch', default=None, help="also import CSV files dropped into this directory")
+    parser.add_argument('--spool', default=None, help="spool directory (default: REVENUE_SPOOL_DIR or 'spool')")
+    parser.add_argument('--poll-interval', type=float, default=2.0, help="seconds between queue polls")
+    parser.add_argument('--retry-delay', type=float, default=30, help="seconds before a failed job is retried")
+    parser.add_argument('--once', action='store_true', help="exit when the queue is empty")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    storage = create_storage_backend()
+    storage.create_tables()
+    worker = IngestWorker(
+        storage,
+        spool_dir=args.spool,
+        watch_dir=args.watch,
+        poll_interval=args.poll_interval,
+        retry_delay=args.retry_delay,
+        snapshot_store=create_snapshot_store(),
+    )
+    try:
+        worker.run(once=args.once)
+    except KeyboardInterrupt:
+        logger.info("Ingest worker stopped")
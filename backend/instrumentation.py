@@ -0,0 +1,249 @@
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Latency samples kept per timer for the percentiles
+SAMPLES_PER_TIMER = 1024
+# Slow-request profiles kept for the diagnostics panel
+SLOW_REPORTS_KEPT = 10
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Name of the storage operation being served, used to label the query timings below it
+_operation = contextvars.ContextVar('operation', default='')
+
+
+class _Timer:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=SAMPLES_PER_TIMER)
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.samples.append(seconds)
+
+    def summary(self):
+        samples = np.array(self.samples) if self.samples else np.zeros(1)
+        summary = {
+            'count': self.count,
+            'total_seconds': self.total,
+            'mean_ms': self.total / self.count * 1000 if self.count else 0.0,
+            'max_ms': self.max * 1000,
+        }
+        for quantile in QUANTILES:
+            summary[f'p{int(quantile * 100)}_ms'] = float(np.quantile(samples, quantile)) * 1000
+        return summary
+
+
+class Metrics:
+    """Process-wide stage timings and counters, labelled by stage and operation."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._timers = {}  # (stage, operation) -> _Timer
+        self._counters = {}  # (name, operation) -> value
+        self.slow_reports = deque(maxlen=SLOW_REPORTS_KEPT)
+
+    def observe(self, stage, seconds, operation=None):
+        key = (stage, operation if operation is not None else _operation.get())
+        with self._lock:
+            timer = self._timers.get(key)
+            if timer is None:
+                timer = self._timers[key] = _Timer()
+            timer.observe(seconds)
+
+    def count(self, name, amount=1, operation=None):
+        key = (name, operation if operation is not None else _operation.get())
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def reset(self):
+        with self._lock:
+            self._timers.clear()
+            self._counters.clear()
+            self.slow_reports.clear()
+
+    def snapshot(self):
+        """Returns {'timers': [...], 'counters': [...]} with one entry per stage/operation pair."""
+        with self._lock:
+            timers = [
+                dict(stage=stage, operation=operation, **timer.summary())
+                for (stage, operation), timer in sorted(self._timers.items())
+            ]
+            counters = [
+                {'name': name, 'operation': operation, 'value': value}
+                for (name, operation), value in sorted(self._counters.items())
+            ]
+        return {'timers': timers, 'counters': counters}
+
+    def export_json(self):
+        snapshot = self.snapshot()
+        snapshot['slow_requests'] = [
+            {key: value for key, value in report.items() if key != 'profile'} for report in self.slow_reports
+        ]
+        return json.dumps(snapshot, indent=2, default=str)
+
+    def export_prometheus(self):
+        """Renders the metrics in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        lines = [
+            '# HELP revenue_stage_seconds Time spent per pipeline stage.',
+            '# TYPE revenue_stage_seconds summary',
+        ]
+        for timer in snapshot['timers']:
+            labels = f'stage="{timer["stage"]}",operation="{timer["operation"]}"'
+            for quantile in QUANTILES:
+                value = timer[f'p{int(quantile * 100)}_ms'] / 1000
+                lines.append(f'revenue_stage_seconds{{{labels},quantile="{quantile}"}} {value:.6f}')
+            lines.append(f'revenue_stage_seconds_sum{{{labels}}} {timer["total_seconds"]:.6f}')
+            lines.append(f'revenue_stage_seconds_count{{{labels}}} {timer["count"]}')
+        for name in sorted({counter['name'] for counter in snapshot['counters']}):
+            lines.append(f'# TYPE revenue_{name}_total counter')
+            for counter in snapshot['counters']:
+                if counter['name'] == name:
+                    lines.append(
+                        f'revenue_{name}_total{{operation="{counter["operation"]}"}} {counter["value"]}'
+                    )
+        return '\n'.join(lines) + '\n'
+
+
+_metrics = Metrics()
+
+
+def get_metrics():
+    return _metrics
+
+
+@contextmanager
+def timed(stage, operation=None):
+    """Records how long the block takes under the given stage name."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _metrics.observe(stage, time.perf_counter() - started, operation)
+
+
+def count(name, amount=1, operation=None):
+    """Adds to a counter such as rows_fetched or csv_bytes."""
+    _metrics.count(name, amount, operation)
+
+
+@contextmanager
+def operation(name):
+    """Labels the query timings recorded inside the block with a storage operation name."""
+    token = _operation.set(name)
+    try:
+        yield
+    finally:
+        _operation.reset(token)
+
+
+def instrumented_operation(method):
+    """Times a storage method and labels the queries it runs with the method name."""
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        with operation(method.__name__), timed('operation'):
+            return method(*args, **kwargs)
+
+    return wrapper
+
+
+class InstrumentedCursor:
+    """Wraps a DB-API cursor to time execute and fetch calls and count the rows fetched."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def execute(self, *args, **kwargs):
+        with timed('query_execute'):
+            return self._cursor.execute(*args, **kwargs)
+
+    def executemany(self, query, rows, *args, **kwargs):
+        with timed('query_executemany'):
+            result = self._cursor.executemany(query, rows, *args, **kwargs)
+        count('rows_written', len(rows))
+        return result
+
+    def _fetch(self, method, *args):
+        with timed('query_fetch'):
+            rows = getattr(self._cursor, method)(*args)
+        if rows is not None:
+            count('rows_fetched', 1 if method == 'fetchone' else len(rows))
+        return rows
+
+    def fetchone(self):
+        return self._fetch('fetchone')
+
+    def fetchmany(self, *args):
+        return self._fetch('fetchmany', *args)
+
+    def fetchall(self):
+        return self._fetch('fetchall')
+
+
+def _profiler_class():
+    """Returns pyinstrument's sampling Profiler, or None when it is not installed."""
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        return None
+    return Profiler
+
+
+def slow_request_threshold():
+    """Seconds after which a request counts as slow, from REVENUE_SLOW_REQUEST_MS (unset disables it)."""
+    value = os.environ.get('REVENUE_SLOW_REQUEST_MS')
+    return float(value) / 1000 if value else None
+
+
+@contextmanager
+def request(name, threshold=None):
+    """Times a whole request (e.g. a page load).
+
+    With a slow-request threshold set, the request runs under pyinstrument's sampling profiler when
+    it is installed, and the profile of every request slower than the threshold is kept in
+    Metrics.slow_reports and logged.
+    """
+    threshold = threshold if threshold is not None else slow_request_threshold()
+    profiler_class = _profiler_class() if threshold is not None else None
+    profiler = profiler_class() if profiler_class is not None else None
+    if profiler is not None:
+        profiler.start()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        if profiler is not None:
+            profiler.stop()
+        _metrics.observe('request', elapsed, name)
+        if threshold is not None and elapsed > threshold:
+            profile = profiler.output_text(unicode=True) if profiler is not None else None
+            _metrics.slow_reports.append({
+                'request': name,
+                'seconds': elapsed,
+                'at': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'profile': profile,
+            })
+            logger.warning("Slow request %s took %.2fs", name, elapsed)
+            if profile:
+                logger.debug("Profile of slow request %s:\n%s", name, profile)
@@ -0,0 +1,175 @@
+import io
+import multiprocessing
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+import pandas as pd
+from backend.fileprocessor import FileProcessor
+from backend.instrumentation import count, get_metrics
+
+# CSV parsing runs in process pools kept per process and worker count, shared by every Streamlit
+# session; a pool is never shut down while another session may still be submitting to it
+_parse_executors = {}
+_parse_executors_lock = threading.Lock()
+
+
+def get_parse_executor(max_workers):
+    """Returns the shared process pool of max_workers used for CSV parsing, creating it on first use."""
+    with _parse_executors_lock:
+        executor = _parse_executors.get(max_workers)
+        if executor is None:
+            # spawn avoids forking the threads of the Streamlit server
+            executor = ProcessPoolExecutor(
+                max_workers=max_workers, mp_context=multiprocessing.get_context('spawn')
+            )
+            _parse_executors[max_workers] = executor
+        return executor
+
+
+def parse_revenue_csv(data):
+    """Parses and cleans one CSV upload in a worker process; returns (DataFrame, parse_seconds)."""
+    started = time.perf_counter()
+    df = pd.read_csv(io.BytesIO(data), dtype={'city_code': str})
+    df = FileProcessor.clean_dataframe(df)
+    return df, time.perf_counter() - started
+
+
+class FileIngestStatus:
+    def __init__(self, filename, status, message='', rows_inserted=0, rows_rejected=0,
+                 parse_seconds=0.0, insert_seconds=0.0, reported=False):
+        self.filename = filename
+        self.status = status  # 'imported', 'reimported', 'skipped' or 'failed'
+        self.message = message
+        self.reported = reported  # True once the FileProcessor notifier has shown the outcome
+        self.rows_inserted = rows_inserted
+        self.rows_rejected = rows_rejected
+        self.parse_seconds = parse_seconds
+        self.insert_seconds = insert_seconds
+
+    @property
+    def rows_per_second(self):
+        elapsed = self.parse_seconds + self.insert_seconds
+        return self.rows_inserted / elapsed if elapsed > 0 else 0.0
+
+
+class ParallelIngestScheduler:
+    def __init__(self, db_manager, file_processor, max_parse_workers=2, max_insert_workers=3):
+        self.db_manager = db_manager
+        self.file_processor = file_processor
+        self.max_parse_workers = max_parse_workers
+        # Keep this at or below the connection pool size so inserts do not queue for connections
+        self.max_insert_workers = max_insert_workers
+
+    @staticmethod
+    def _read_upload(uploaded_file):
+        uploaded_file.seek(0)
+        if hasattr(uploaded_file, 'getvalue'):
+            return uploaded_file.getvalue()
+        return uploaded_file.read()
+
+    def _insert(self, filename, fingerprint, df, parse_seconds):
+        """Runs on an insert thread: loads the parsed file and records it as imported if the load succeeded."""
+        started = time.perf_counter()
+        result = self.db_manager.insert_data_to_revenue_table(df)
+        if result.failed:
+            # Left unrecorded, so the next upload of the file imports it again
+            return FileIngestStatus(
+                filename,
+                'failed',
+                f"Import failed: {result.error}",
+                parse_seconds=parse_seconds,
+                insert_seconds=time.perf_counter() - started,
+            )
+        self.db_manager.mark_file_as_imported(filename, fingerprint)
+        return FileIngestStatus(
+            filename,
+            'imported',
+            rows_inserted=result.rows_inserted,
+            rows_rejected=result.rows_rejected,
+            parse_seconds=parse_seconds,
+            insert_seconds=time.perf_counter() - started,
+        )
+
+    def ingest(self, uploaded_files, on_file_done=None):
+        """Parses uploads in a process pool and inserts them from a thread pool.
+
+        on_file_done(status) is called on the calling thread as soon as each file finishes, so it
+        is safe to update Streamlit elements from it. Returns the FileIngestStatus of every file.
+        """
+        statuses = []
+
+        def finish(status):
+            statuses.append(status)
+            if on_file_done is not None:
+                on_file_done(status)
+
+        # Deduplication and change detection are cheap and need the database, so they stay here
+        new_files, modified_files = [], []
+        for uploaded_file in uploaded_files:
+            fingerprint, chunks = self.file_processor.plan_import(uploaded_file)
+            if chunks is False:
+                finish(FileIngestStatus(uploaded_file.name, 'skipped', 'Already imported.'))
+            elif chunks is None:
+                new_files.append((uploaded_file, fingerprint))
+            else:
+                modified_files.append((uploaded_file, fingerprint, chunks))
+
+        parse_executor = get_parse_executor(self.max_parse_workers)
+        with ThreadPoolExecutor(max_workers=self.max_insert_workers) as insert_executor:
+            pending = {}
+            waiting = list(reversed(new_files))
+            # Bound the parsed DataFrames held in memory to what the insert threads can take on
+            max_in_flight = self.max_parse_workers + self.max_insert_workers
+
+            while waiting or pending:
+                while waiting and len(pending) < max_in_flight:
+                    uploaded_file, fingerprint = waiting.pop()
+                    future = parse_executor.submit(parse_revenue_csv, self._read_upload(uploaded_file))
+                    pending[future] = ('parse', uploaded_file.name, fingerprint)
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, filename, fingerprint = pending.pop(future)
+                    try:
+                        if stage == 'parse':
+                            df, parse_seconds = future.result()
+                            # Parsing ran in another process, so its timing is recorded here
+                            get_metrics().observe('csv_parse', parse_seconds, operation='parallel_ingest')
+                            count('csv_rows', len(df), operation='parallel_ingest')
+                            insert_future = insert_executor.submit(
+                                self._insert, filename, fingerprint, df, parse_seconds
+                            )
+                            pending[insert_future] = ('insert', filename, fingerprint)
+                        else:
+                            finish(future.result())
+                    except pd.errors.ParserError:
+                        finish(FileIngestStatus(filename, 'failed', 'Not a valid CSV file.'))
+                    except KeyError as e:
+                        finish(FileIngestStatus(filename, 'failed', f"Missing required column {e}."))
+                    except Exception as e:
+                        finish(FileIngestStatus(filename, 'failed', str(e)))
+
+        # Changed re-uploads only touch a few chunks; they go through the incremental streaming path
+        for uploaded_file, fingerprint, chunks in modified_files:
+            started = time.perf_counter()
+            imported = self.file_processor.process_file_streaming(uploaded_file, plan=(fingerprint, chunks))
+            if imported is None:
+                finish(FileIngestStatus(
+                    uploaded_file.name,
+                    'failed',
+                    "Re-import failed.",
+                    insert_seconds=time.perf_counter() - started,
+                    reported=True,
+                ))
+                continue
+            rows_inserted, rows_rejected = imported
+            finish(FileIngestStatus(
+                uploaded_file.name,
+                'reimported',
+                f"Re-imported {len(chunks)} changed chunk(s).",
+                rows_inserted=rows_inserted,
+                rows_rejected=rows_rejected,
+                insert_seconds=time.perf_counter() - started,
+            ))
+
+        return statuses
@@ -0,0 +1,131 @@
+import functools
+import threading
+import time
+from collections import OrderedDict
+import pandas as pd
+from backend.instrumentation import count, operation, timed
+
+
+class QueryCache:
+    """LRU cache of read results, keyed by the data version they were read at.
+
+    By default the data version is re-read on every cached read (a one-row primary key lookup), so
+    writes made by other processes, such as the ingest worker or the command-line loader, are seen
+    at once. A positive version_poll_interval saves those lookups but serves results up to that
+    many seconds stale after another process writes.
+    """
+
+    def __init__(self, max_entries=256, ttl=300.0, version_poll_interval=0.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # How long a data version read from the database is trusted before it is read again
+        self.version_poll_interval = version_poll_interval
+        self._entries = OrderedDict()  # key -> (stored_at, value), least recently used first
+        self._versions = {}  # namespace -> (version, polled_at)
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0}
+
+    def get(self, key):
+        """Returns (True, value) for a fresh entry, otherwise (False, None)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return False, None
+            stored_at, value = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                self._stats['expirations'] += 1
+                self._stats['misses'] += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return True, value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def known_version(self, namespace):
+        """Returns (version, needs_poll) for a namespace."""
+        with self._lock:
+            version, polled_at = self._versions.get(namespace, (None, 0.0))
+        needs_poll = (
+            version is None
+            or self.version_poll_interval <= 0
+            or time.monotonic() - polled_at > self.version_poll_interval
+        )
+        return version, needs_poll
+
+    def set_version(self, namespace, version):
+        with self._lock:
+            self._versions[namespace] = (version, time.monotonic())
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        return stats
+
+
+# One cache per process, shared by every Streamlit session
+_shared_cache = QueryCache()
+
+
+def get_shared_cache():
+    return _shared_cache
+
+
+def _is_cacheable(value):
+    """Only real answers are cached; error strings and empty frames from failed queries are not."""
+    if isinstance(value, pd.DataFrame):
+        return not value.empty
+    if isinstance(value, int):
+        return True
+    return isinstance(value, (dict, list)) or value == "No records found."
+
+
+def _copy(value):
+    # Callers modify returned frames in place (e.g. casting city_code), so hand out copies
+    if isinstance(value, pd.DataFrame):
+        return value.copy()
+    if isinstance(value, dict):
+        return dict(value)
+    if isinstance(value, list):
+        return list(value)
+    return value
+
+
+def cached_query(method):
+    """Caches a DatabaseManager read method, keyed by its arguments and the current data version."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with operation(method.__name__), timed('operation'):
+            version = self.data_version()
+            if version is None:
+                return method(self, *args, **kwargs)
+
+            key = (self.cache_namespace, method.__name__, args, tuple(sorted(kwargs.items())), version)
+            try:
+                hash(key)
+            except TypeError:
+                return method(self, *args, **kwargs)
+            hit, value = self.query_cache.get(key)
+            count('cache_hits' if hit else 'cache_misses')
+            if hit:
+                return _copy(value)
+
+            value = method(self, *args, **kwargs)
+            if _is_cacheable(value):
+                self.query_cache.set(key, _copy(value))
+            return value
+
+    return wrapper
@@ -0,0 +1,60 @@
+import logging
+
+logger = logging.getLogger('backend.ingest')
+
+
+class Reporter:
+    """Receives the messages and progress of an ingest; FileProcessor reports through it, not a UI.
+
+    This default logs the messages and ignores progress. The Streamlit page, the ingest worker and
+    the command line each pass their own subclass.
+    """
+
+    def info(self, message):
+        logger.info(message)
+
+    def success(self, message):
+        logger.info(message)
+
+    def warning(self, message):
+        logger.warning(message)
+
+    def error(self, message):
+        logger.error(message)
+
+    def progress(self, fraction, text=None):
+        """Reports how far the current step is, as a fraction between 0 and 1."""
+
+    def progress_done(self):
+        """Called once the step whose progress was reported has finished."""
+
+
+class CollectingReporter(Reporter):
+    """Keeps the messages reported for one file and passes everything on to another reporter."""
+
+    def __init__(self, reporter=None):
+        self.reporter = reporter or Reporter()
+        self.messages = []
+        self.errors = []
+
+    def info(self, message):
+        self.messages.append(message)
+        self.reporter.info(message)
+
+    def success(self, message):
+        self.messages.append(message)
+        self.reporter.success(message)
+
+    def warning(self, message):
+        self.messages.append(message)
+        self.reporter.warning(message)
+
+    def error(self, message):
+        self.errors.append(message)
+        self.reporter.error(message)
+
+    def progress(self, fraction, text=None):
+        self.reporter.progress(fraction, text=text)
+
+    def progress_done(self):
+        self.reporter.progress_done()
@@ -0,0 +1,419 @@
+import argparse
+import math
+import struct
+from collections import defaultdict
+
+ROLLUP_TABLES = {
+    # Q2: revenue per city per day
+    'revenue_rollup_city_date': """
+    CREATE TABLE IF NOT EXISTS revenue_rollup_city_date (
+        city_code INT NOT NULL,
+        date DATE NOT NULL,
+        total_revenue DOUBLE NOT NULL,
+        PRIMARY KEY (city_code, date),
+        INDEX idx_rollup_city_date_revenue (total_revenue)
+    );
+    """,
+    # Q1 and Q3: revenue per plan
+    'revenue_rollup_plan': """
+    CREATE TABLE IF NOT EXISTS revenue_rollup_plan (
+        plans VARCHAR(10) NOT NULL PRIMARY KEY,
+        total_revenue DOUBLE NOT NULL
+    );
+    """,
+    # Revenue by city chart
+    'revenue_rollup_city': """
+    CREATE TABLE IF NOT EXISTS revenue_rollup_city (
+        city_code INT NOT NULL PRIMARY KEY,
+        total_revenue DOUBLE NOT NULL
+    );
+    """,
+    # Monthly revenue trend
+    'revenue_rollup_month': """
+    CREATE TABLE IF NOT EXISTS revenue_rollup_month (
+        month DATE NOT NULL PRIMARY KEY,
+        total_revenue DOUBLE NOT NULL
+    );
+    """,
+    # Q4: cities with non-zero revenue for a plan
+    'revenue_rollup_plan_city': """
+    CREATE TABLE IF NOT EXISTS revenue_rollup_plan_city (
+        plans VARCHAR(10) NOT NULL,
+        city_code INT NOT NULL,
+        total_revenue DOUBLE NOT NULL,
+        nonzero_rows INT NOT NULL,
+        PRIMARY KEY (plans, city_code)
+    );
+    """,
+    # Q5: the rows ranked first within each plan (ties included)
+    'revenue_rollup_plan_max': """
+    CREATE TABLE IF NOT EXISTS revenue_rollup_plan_max (
+        plans VARCHAR(10) NOT NULL,
+        date DATE NOT NULL,
+        city_code INT NOT NULL,
+        plan_revenue_crores FLOAT NOT NULL,
+        PRIMARY KEY (plans, date, city_code)
+    );
+    """,
+}
+
+REBUILD_QUERIES = [
+    """
+    INSERT INTO revenue_rollup_city_date (city_code, date, total_revenue)
+    SELECT city_code, date, SUM(plan_revenue_crores) FROM revenue_data GROUP BY city_code, date
+    """,
+    """
+    INSERT INTO revenue_rollup_plan (plans, total_revenue)
+    SELECT plans, SUM(plan_revenue_crores) FROM revenue_data GROUP BY plans
+    """,
+    """
+    INSERT INTO revenue_rollup_city (city_code, total_revenue)
+    SELECT city_code, SUM(plan_revenue_crores) FROM revenue_data GROUP BY city_code
+    """,
+    """
+    INSERT INTO revenue_rollup_month (month, total_revenue)
+    SELECT DATE_FORMAT(date, '%Y-%m-01'), SUM(plan_revenue_crores)
+    FROM revenue_data
+    GROUP BY DATE_FORMAT(date, '%Y-%m-01')
+    """,
+    """
+    INSERT INTO revenue_rollup_plan_city (plans, city_code, total_revenue, nonzero_rows)
+    SELECT plans, city_code, SUM(plan_revenue_crores), SUM(plan_revenue_crores <> 0)
+    FROM revenue_data
+    GROUP BY plans, city_code
+    """,
+    """
+    INSERT INTO revenue_rollup_plan_max (plans, date, city_code, plan_revenue_crores)
+    SELECT r.plans, r.date, r.city_code, r.plan_revenue_crores
+    FROM revenue_data r
+    JOIN (
+        SELECT plans, MAX(plan_revenue_crores) AS max_revenue FROM revenue_data GROUP BY plans
+    ) m ON r.plans = m.plans AND r.plan_revenue_crores = m.max_revenue
+    """,
+]
+
+# Rollups a staged file updates with one grouped statement each: (table, key columns, staged key expression)
+STAGE_ROLLUPS = [
+    ('revenue_rollup_city_date', 'city_code, date', 's.city_code, s.date'),
+    ('revenue_rollup_plan', 'plans', 's.plans'),
+    ('revenue_rollup_city', 'city_code', 's.city_code'),
+    ('revenue_rollup_month', 'month', "DATE_FORMAT(s.date, '%Y-%m-01')"),
+]
+
+
+def _as_float32(value):
+    """Rounds a revenue value the way the FLOAT column of revenue_data stores it."""
+    return struct.unpack('f', struct.pack('f', float(value)))[0]
+
+
+def normalize_key(row):
+    """Returns the (date, city_code, plans) key of a revenue row in a comparable form."""
+    return str(row[0])[:10], int(row[1]), str(row[2])
+
+
+class RollupManager:
+    def create_tables(self, cursor):
+        """Creates the rollup tables if they do not exist."""
+        for create_query in ROLLUP_TABLES.values():
+            cursor.execute(create_query)
+
+    def needs_backfill(self, cursor):
+        """True when revenue_data has rows but the rollups have never been built."""
+        cursor.execute(
+            """
+            SELECT
+                EXISTS(SELECT 1 FROM revenue_data) AS has_data,
+                EXISTS(SELECT 1 FROM revenue_rollup_plan) AS has_rollups
+            """
+        )
+        row = cursor.fetchone()
+        return bool(row['has_data']) and not row['has_rollups']
+
+    def rebuild(self, connection, cursor):
+        """Recomputes every rollup table from revenue_data, e.g. after a backfill."""
+        for table in ROLLUP_TABLES:
+            cursor.execute(f"DELETE FROM {table}")
+        for rebuild_query in REBUILD_QUERIES:
+            cursor.execute(rebuild_query)
+        connection.commit()
+
+    def lock_existing(self, cursor, rows, plan_ids=None):
+        """Reads and locks the stored revenue of every key in a batch; returns {key: revenue}.
+
+        With plan_ids ({plan label: plan_id}) the keys are read from revenue_fact itself, so only
+        fact rows are locked and not the dim_plan rows behind the revenue_data view.
+        """
+        keys = set()
+        for row in rows:
+            try:
+                keys.add(normalize_key(row))
+            except (TypeError, ValueError):
+                pass
+        if not keys:
+            return {}
+
+        placeholders = ', '.join(['(%s, %s, %s)'] * len(keys))
+        if plan_ids is None:
+            query = f"""
+            SELECT date, city_code, plans, plan_revenue_crores
+            FROM revenue_data
+            WHERE (date, city_code, plans) IN ({placeholders})
+            FOR UPDATE
+            """
+            cursor.execute(query, [value for key in keys for value in key])
+            return {
+                normalize_key((row['date'], row['city_code'], row['plans'])): row['plan_revenue_crores']
+                for row in cursor.fetchall()
+            }
+
+        ids = {str(label): plan_id for label, plan_id in plan_ids.items()}
+        labels = {plan_id: label for label, plan_id in ids.items()}
+        query = f"""
+        SELECT date, city_code, plan_id, plan_revenue_crores
+        FROM revenue_fact
+        WHERE (date, city_code, plan_id) IN ({placeholders})
+        FOR UPDATE
+        """
+        cursor.execute(query, [value for date, city_code, plans in keys for value in (date, city_code, ids[plans])])
+        return {
+            normalize_key((row['date'], row['city_code'], labels[row['plan_id']])): row['plan_revenue_crores']
+            for row in cursor.fetchall()
+        }
+
+    @staticmethod
+    def compute_changes(rows, existing, upsert):
+        """Works out which rows will be written and how each key's revenue changes.
+
+        Returns (accepted_rows, rejected, changes) where rejected is a list of (row, error) and
+        changes maps each key to (old_revenue or None, new_revenue). Without upsert the first row
+        for a key wins and later ones are rejected, matching a plain INSERT; with upsert the last
+        row wins.
+        """
+        accepted, rejected = [], []
+        state = {}
+        for row in rows:
+            try:
+                key = normalize_key(row)
+                revenue = _as_float32(row[3])
+                if not math.isfinite(revenue):
+                    # The FLOAT column rejects it, so it must not reach the rollups either
+                    raise ValueError(f"revenue {row[3]} is out of range")
+            except (TypeError, ValueError, OverflowError) as e:
+                rejected.append((row, f"Invalid value: {e}"))
+                continue
+
+            if not upsert and (key in existing or key in state):
+                rejected.append((row, f"Duplicate entry for key {key}"))
+                continue
+            state[key] = revenue
+            accepted.append(row)
+
+        changes = {}
+        for key, revenue in state.items():
+            old_revenue = existing.get(key)
+            old_revenue = _as_float32(old_revenue) if old_revenue is not None else None
+            if old_revenue != revenue:
+                changes[key] = (old_revenue, revenue)
+        return accepted, rejected, changes
+
+    def apply_changes(self, cursor, changes):
+        """Applies the revenue changes of one batch to every rollup table."""
+        if not changes:
+            return
+
+        city_date = defaultdict(float)
+        plan = defaultdict(float)
+        city = defaultdict(float)
+        month = defaultdict(float)
+        plan_city = defaultdict(lambda: [0.0, 0])
+        for (date, city_code, plans), (old_revenue, new_revenue) in changes.items():
+            delta = new_revenue - (old_revenue or 0.0)
+            city_date[(city_code, date)] += delta
+            plan[plans] += delta
+            city[city_code] += delta
+            month[date[:7] + '-01'] += delta
+            plan_city[(plans, city_code)][0] += delta
+            plan_city[(plans, city_code)][1] += (new_revenue != 0) - (old_revenue is not None and old_revenue != 0)
+
+        cursor.executemany(
+            """
+            INSERT INTO revenue_rollup_city_date (city_code, date, total_revenue) VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE total_revenue = total_revenue + VALUES(total_revenue)
+            """,
+            [(city_code, date, delta) for (city_code, date), delta in city_date.items()],
+        )
+        cursor.executemany(
+            """
+            INSERT INTO revenue_rollup_plan (plans, total_revenue) VALUES (%s, %s)
+            ON DUPLICATE KEY UPDATE total_revenue = total_revenue + VALUES(total_revenue)
+            """,
+            list(plan.items()),
+        )
+        cursor.executemany(
+            """
+            INSERT INTO revenue_rollup_city (city_code, total_revenue) VALUES (%s, %s)
+            ON DUPLICATE KEY UPDATE total_revenue = total_revenue + VALUES(total_revenue)
+            """,
+            list(city.items()),
+        )
+        cursor.executemany(
+            """
+            INSERT INTO revenue_rollup_month (month, total_revenue) VALUES (%s, %s)
+            ON DUPLICATE KEY UPDATE total_revenue = total_revenue + VALUES(total_revenue)
+            """,
+            list(month.items()),
+        )
+        cursor.executemany(
+            """
+            INSERT INTO revenue_rollup_plan_city (plans, city_code, total_revenue, nonzero_rows)
+            VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                total_revenue = total_revenue + VALUES(total_revenue),
+                nonzero_rows = nonzero_rows + VALUES(nonzero_rows)
+            """,
+            [(plans, city_code, delta, nonzero) for (plans, city_code), (delta, nonzero) in plan_city.items()],
+        )
+        self._apply_plan_max(cursor, changes)
+
+    def apply_stage(self, cursor, stage_table):
+        """Adds the revenue changes of a staged file to the rollups in set-based statements.
+
+        Runs before the stage is merged into revenue_data: each staged row contributes its new
+        revenue minus the revenue currently stored for its key. Call refresh_plan_max after the merge.
+        """
+        source = f"""
+        FROM {stage_table} s
+        LEFT JOIN revenue_data r ON r.date = s.date AND r.city_code = s.city_code AND r.plans = s.plans
+        """
+        delta = "SUM(s.plan_revenue_crores - COALESCE(r.plan_revenue_crores, 0))"
+        for table, columns, group_expression in STAGE_ROLLUPS:
+            cursor.execute(
+                f"""
+                INSERT INTO {table} ({columns}, total_revenue)
+                SELECT {group_expression}, {delta} {source}
+                GROUP BY {group_expression}
+                ON DUPLICATE KEY UPDATE total_revenue = total_revenue + VALUES(total_revenue)
+                """
+            )
+        cursor.execute(
+            f"""
+            INSERT INTO revenue_rollup_plan_city (plans, city_code, total_revenue, nonzero_rows)
+            SELECT s.plans, s.city_code, {delta},
+                   SUM(s.plan_revenue_crores <> 0) - SUM(COALESCE(r.plan_revenue_crores <> 0, 0))
+            {source}
+            GROUP BY s.plans, s.city_code
+            ON DUPLICATE KEY UPDATE
+                total_revenue = total_revenue + VALUES(total_revenue),
+                nonzero_rows = nonzero_rows + VALUES(nonzero_rows)
+            """
+        )
+
+    @staticmethod
+    def refresh_plan_max(cursor, plans):
+        """Recomputes the top-ranked rows of the given plans from revenue_data."""
+        if not plans:
+            return
+        placeholders = ', '.join(['%s'] * len(plans))
+        cursor.execute(f"DELETE FROM revenue_rollup_plan_max WHERE plans IN ({placeholders})", list(plans))
+        cursor.execute(
+            f"""
+            INSERT INTO revenue_rollup_plan_max (plans, date, city_code, plan_revenue_crores)
+            SELECT r.plans, r.date, r.city_code, r.plan_revenue_crores
+            FROM revenue_data r
+            JOIN (
+                SELECT plans, MAX(plan_revenue_crores) AS max_revenue
+                FROM revenue_data
+                WHERE plans IN ({placeholders})
+                GROUP BY plans
+            ) m ON r.plans = m.plans AND r.plan_revenue_crores = m.max_revenue
+            """,
+            list(plans),
+        )
+
+    def _apply_plan_max(self, cursor, changes):
+        """Keeps the per-plan top-ranked rows up to date for the changed keys."""
+        changes_by_plan = defaultdict(list)
+        for key, (old_revenue, new_revenue) in changes.items():
+            changes_by_plan[key[2]].append((key, old_revenue, new_revenue))
+
+        placeholders = ', '.join(['%s'] * len(changes_by_plan))
+        cursor.execute(
+            f"""
+            SELECT plans, MAX(plan_revenue_crores) AS max_revenue
+            FROM revenue_rollup_plan_max
+            WHERE plans IN ({placeholders})
+            GROUP BY plans
+            """,
+            list(changes_by_plan),
+        )
+        current_max = {row['plans']: _as_float32(row['max_revenue']) for row in cursor.fetchall()}
+
+        for plans, plan_changes in changes_by_plan.items():
+            plan_max = current_max.get(plans)
+            batch_max = max(new_revenue for _, _, new_revenue in plan_changes)
+
+            # Rows that held the maximum and were lowered by an upsert drop out of the ranking
+            demoted = [
+                key for key, old_revenue, new_revenue in plan_changes
+                if old_revenue is not None and old_revenue == plan_max and new_revenue < old_revenue
+            ]
+            for date, city_code, _ in demoted:
+                cursor.execute(
+                    "DELETE FROM revenue_rollup_plan_max WHERE plans = %s AND date = %s AND city_code = %s",
+                    (plans, date, city_code),
+                )
+
+            if plan_max is None or batch_max > plan_max:
+                cursor.execute("DELETE FROM revenue_rollup_plan_max WHERE plans = %s", (plans,))
+            elif batch_max < plan_max:
+                if demoted and not self._plan_has_max_rows(cursor, plans):
+                    self._recompute_plan_max(cursor, plans)
+                continue
+
+            cursor.executemany(
+                """
+                INSERT INTO revenue_rollup_plan_max (plans, date, city_code, plan_revenue_crores)
+                VALUES (%s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE plan_revenue_crores = VALUES(plan_revenue_crores)
+                """,
+                [
+                    (plans, date, city_code, new_revenue)
+                    for (date, city_code, _), _, new_revenue in plan_changes
+                    if new_revenue == batch_max
+                ],
+            )
+
+    @staticmethod
+    def _plan_has_max_rows(cursor, plans):
+        cursor.execute("SELECT EXISTS(SELECT 1 FROM revenue_rollup_plan_max WHERE plans = %s) AS has_rows", (plans,))
+        return bool(cursor.fetchone()['has_rows'])
+
+    @staticmethod
+    def _recompute_plan_max(cursor, plans):
+        """Rebuilds the top-ranked rows of one plan from revenue_data."""
+        cursor.execute(
+            """
+            INSERT INTO revenue_rollup_plan_max (plans, date, city_code, plan_revenue_crores)
+            SELECT plans, date, city_code, plan_revenue_crores
+            FROM revenue_data
+            WHERE plans = %s
+              AND plan_revenue_crores = (SELECT MAX(plan_revenue_crores) FROM revenue_data WHERE plans = %s)
+            """,
+            (plans, plans),
+        )
+
+
+if __name__ == "__main__":
+    from backend.databasemanager import DatabaseManager
+
+    parser = argparse.ArgumentParser(description="Maintain the revenue rollup tables.")
+    parser.add_argument('command', choices=['rebuild'], help="rebuild: recompute every rollup from revenue_data")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--user', default='root')
+    parser.add_argument('--password', default='root')
+    parser.add_argument('--database', default='revenue_db')
+    args = parser.parse_args()
+
+    db_manager = DatabaseManager(args.host, args.user, args.password, args.database)
+    db_manager.create_tables()
+    db_manager.rebuild_rollups()
@@ -0,0 +1,287 @@
+import argparse
+import datetime
+import logging
+from mysql.connector import Error, errorcode
+from backend.dimensions import CREATE_DIM_PLAN_QUERY
+
+logger = logging.getLogger(__name__)
+
+# Applied in order to existing deployments; a version is never changed once released
+MIGRATIONS = [
+    (
+        1,
+        "Index revenue_data for per-plan filters and per-plan maxima",
+        ["CREATE INDEX idx_revenue_data_plans_revenue ON revenue_data (plans, plan_revenue_crores)"],
+    ),
+    (
+        2,
+        "Index revenue_data for per-city filters in date order",
+        ["CREATE INDEX idx_revenue_data_city_date ON revenue_data (city_code, date)"],
+    ),
+    (
+        3,
+        "Store revenue rows in revenue_fact keyed by dim_plan; revenue_data becomes a view",
+        [
+            CREATE_DIM_PLAN_QUERY,
+            "INSERT IGNORE INTO dim_plan (plans) SELECT DISTINCT plans FROM revenue_data ORDER BY plans",
+            """
+            CREATE TABLE IF NOT EXISTS revenue_fact (
+                date DATE NOT NULL,
+                city_code INT NOT NULL,
+                plan_id SMALLINT UNSIGNED NOT NULL,
+                plan_revenue_crores FLOAT NOT NULL,
+                PRIMARY KEY (date, city_code, plan_id),
+                INDEX idx_revenue_fact_plan_revenue (plan_id, plan_revenue_crores),
+                INDEX idx_revenue_fact_city_date (city_code, date)
+            )
+            """,
+            """
+            INSERT IGNORE INTO revenue_fact (date, city_code, plan_id, plan_revenue_crores)
+            SELECT r.date, r.city_code, d.plan_id, r.plan_revenue_crores
+            FROM revenue_data r
+            JOIN dim_plan d ON d.plans = r.plans
+            """,
+            "DROP TABLE IF EXISTS revenue_data",
+            # Readers keep querying revenue_data; the plan labels are joined back in here
+            """
+            CREATE OR REPLACE VIEW revenue_data AS
+            SELECT revenue_fact.date, revenue_fact.city_code, dim_plan.plans, revenue_fact.plan_revenue_crores
+            FROM revenue_fact
+            JOIN dim_plan ON dim_plan.plan_id = revenue_fact.plan_id
+            """,
+        ],
+    ),
+]
+
+# Table that holds the revenue rows once migration 3 has run; it is the one indexed and partitioned
+FACT_TABLE = 'revenue_fact'
+
+# EXPLAIN access types that look rows up through an index; ALL and index read every row
+INDEX_LOOKUP_TYPES = {
+    'system', 'const', 'eq_ref', 'ref', 'ref_or_null', 'range', 'index_merge', 'unique_subquery', 'index_subquery',
+}
+
+# Queries on revenue_data itself (rollup maintenance and the filtered fallbacks) that must use an index
+# of the fact table behind it
+ANALYTIC_QUERIES = [
+    (
+        'plan_max_revenue',
+        "SELECT MAX(plan_revenue_crores) FROM revenue_data WHERE plans = %s",
+        ('p3',),
+    ),
+    (
+        'plan_top_rows',
+        """
+        SELECT plans, date, city_code, plan_revenue_crores
+        FROM revenue_data
+        WHERE plans = %s
+          AND plan_revenue_crores = (SELECT MAX(plan_revenue_crores) FROM revenue_data WHERE plans = %s)
+        """,
+        ('p3', 'p3'),
+    ),
+    (
+        'plan_city_count',
+        "SELECT COUNT(DISTINCT city_code) FROM revenue_data WHERE plans = %s AND plan_revenue_crores <> 0",
+        ('p3',),
+    ),
+    (
+        'revenue_by_date_for_plan',
+        "SELECT date, SUM(plan_revenue_crores) FROM revenue_data WHERE plans = %s GROUP BY date",
+        ('p3',),
+    ),
+    (
+        'revenue_by_date_for_city',
+        "SELECT date, SUM(plan_revenue_crores) FROM revenue_data WHERE city_code = %s GROUP BY date",
+        (1,),
+    ),
+    # The Database Records page query, which reads revenue_fact directly in key order
+    (
+        'records_for_city',
+        """
+        SELECT revenue_fact.date, revenue_fact.city_code, dim_plan.plans, revenue_fact.plan_revenue_crores
+        FROM revenue_fact
+        STRAIGHT_JOIN dim_plan ON dim_plan.plan_id = revenue_fact.plan_id
+        WHERE revenue_fact.city_code = %s
+        ORDER BY revenue_fact.date, revenue_fact.city_code, revenue_fact.plan_id
+        LIMIT 100
+        """,
+        (1,),
+    ),
+]
+
+# Queries that must read rows in index order; a filesort would sort every matching row for each page
+KEY_ORDER_QUERIES = {'records_for_city'}
+
+# Named lock that keeps two app processes from migrating the same database at once
+MIGRATION_LOCK = 'revenue_schema_migrations'
+
+
+def _month_start(value, months_ahead=0):
+    month_index = value.year * 12 + value.month - 1 + months_ahead
+    return datetime.date(month_index // 12, month_index % 12 + 1, 1)
+
+
+class SchemaManager:
+    """Versioned migrations, monthly partitioning and the index check for revenue_data and revenue_fact."""
+
+    def __init__(self, partition_by_month=False, months_ahead=3):
+        self.partition_by_month = partition_by_month
+        self.months_ahead = months_ahead
+
+    def create_tables(self, cursor):
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INT NOT NULL PRIMARY KEY,
+                description VARCHAR(255) NOT NULL,
+                applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+            );
+            """
+        )
+
+    def applied_versions(self, cursor):
+        cursor.execute("SELECT version FROM schema_migrations")
+        return {row['version'] for row in cursor.fetchall()}
+
+    def migrate(self, connection, cursor):
+        """Applies the pending migrations, then the monthly partitioning when it is enabled."""
+        self.create_tables(cursor)
+        cursor.execute("SELECT GET_LOCK(%s, 30) AS locked", (MIGRATION_LOCK,))
+        if not cursor.fetchone()['locked']:
+            logger.warning("Timed out waiting for another process to finish the schema migrations.")
+            return
+        try:
+            applied = self.applied_versions(cursor)
+            for version, description, statements in MIGRATIONS:
+                if version in applied:
+                    continue
+                logger.info("Applying schema migration %s: %s", version, description)
+                for statement in statements:
+                    try:
+                        cursor.execute(statement)
+                    except Error as e:
+                        # Indexes added by hand before the migration existed are kept as they are
+                        if e.errno != errorcode.ER_DUP_KEYNAME:
+                            raise
+                cursor.execute(
+                    "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                    (version, description),
+                )
+                connection.commit()
+            if self.partition_by_month:
+                self.ensure_month_partitions(connection, cursor)
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s) AS released", (MIGRATION_LOCK,))
+            cursor.fetchone()
+
+    def month_partitions(self, cursor):
+        """Returns the names of revenue_fact's partitions, in order; empty when it is not partitioned."""
+        cursor.execute(
+            """
+            SELECT partition_name AS partition_name
+            FROM information_schema.partitions
+            WHERE table_schema = DATABASE() AND table_name = %s AND partition_name IS NOT NULL
+            ORDER BY partition_ordinal_position
+            """,
+            (FACT_TABLE,),
+        )
+        return [row['partition_name'] for row in cursor.fetchall()]
+
+    @staticmethod
+    def _partition_definitions(months):
+        return [
+            f"PARTITION p{month:%Y%m} VALUES LESS THAN ('{_month_start(month, 1):%Y-%m-%d}')" for month in months
+        ]
+
+    def ensure_month_partitions(self, connection, cursor):
+        """Range-partitions revenue_fact by month and keeps partitions ready for the coming months.
+
+        Each month gets a partition named pYYYYMM; rows beyond the last one land in pmax until the
+        next run splits it. Date-filtered queries then only read the months they ask for.
+        """
+        last_month = _month_start(datetime.date.today(), self.months_ahead)
+        partitions = self.month_partitions(cursor)
+
+        if not partitions:
+            cursor.execute(f"SELECT MIN(date) AS first_date FROM {FACT_TABLE}")
+            first_date = cursor.fetchone()['first_date'] or datetime.date.today()
+            months = self._months_between(_month_start(first_date), last_month)
+            definitions = self._partition_definitions(months) + ["PARTITION pmax VALUES LESS THAN (MAXVALUE)"]
+            logger.info("Partitioning %s into %s monthly partitions", FACT_TABLE, len(months))
+            cursor.execute(f"ALTER TABLE {FACT_TABLE} PARTITION BY RANGE COLUMNS(date) ({', '.join(definitions)})")
+            connection.commit()
+            return
+
+        month_names = [name for name in partitions if name != 'pmax']
+        if not month_names:
+            return
+        newest = datetime.datetime.strptime(month_names[-1], 'p%Y%m').date()
+        months = self._months_between(_month_start(newest, 1), last_month)
+        if not months:
+            return
+        definitions = self._partition_definitions(months) + ["PARTITION pmax VALUES LESS THAN (MAXVALUE)"]
+        logger.info("Adding %s monthly partitions to %s", len(months), FACT_TABLE)
+        cursor.execute(f"ALTER TABLE {FACT_TABLE} REORGANIZE PARTITION pmax INTO ({', '.join(definitions)})")
+        connection.commit()
+
+    @staticmethod
+    def _months_between(first, last):
+        months = []
+        month = first
+        while month <= last:
+            months.append(month)
+            month = _month_start(month, 1)
+        return months
+
+    def explain_analytic_queries(self, cursor):
+        """Runs EXPLAIN on every analytic query and reports whether each one reads revenue_fact by index.
+
+        Returns one dict per query with the plan rows and uses_index; any read of revenue_fact
+        other than an index lookup fails the check, including a full index scan (type index), and
+        so does a filesort in a KEY_ORDER_QUERIES query.
+        """
+        report = []
+        for name, query, params in ANALYTIC_QUERIES:
+            cursor.execute(f"EXPLAIN {query}", params)
+            plan = [
+                {key.lower(): value for key, value in row.items()}
+                for row in cursor.fetchall()
+            ]
+            scans = [row for row in plan if row.get('table') == FACT_TABLE]
+            uses_index = all(row.get('type') in INDEX_LOOKUP_TYPES for row in scans)
+            if name in KEY_ORDER_QUERIES:
+                uses_index = uses_index and not any('Using filesort' in (row.get('extra') or '') for row in plan)
+            report.append({'name': name, 'uses_index': uses_index, 'plan': plan})
+        return report
+
+
+if __name__ == "__main__":
+    from backend.databasemanager import DatabaseManager
+
+    parser = argparse.ArgumentParser(description="Manage the revenue_data schema.")
+    parser.add_argument(
+        'command',
+        choices=['migrate', 'partition', 'check'],
+        help="migrate: apply pending migrations; partition: partition revenue_fact by month; "
+             "check: EXPLAIN the analytic queries and fail if one scans revenue_fact",
+    )
+    parser.add_argument('--months-ahead', type=int, default=3, help="empty monthly partitions to keep ahead")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--user', default='root')
+    parser.add_argument('--password', default='root')
+    parser.add_argument('--database', default='revenue_db')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    db_manager = DatabaseManager(
+        args.host, args.user, args.password, args.database,
+        partition_by_month=args.command == 'partition',
+        months_ahead=args.months_ahead,
+    )
+    db_manager.create_tables()
+    if args.command == 'check':
+        report = db_manager.explain_analytic_queries()
+        for entry in report:
+            keys = ', '.join(str(row.get('key')) for row in entry['plan'])
+            print(f"{'ok  ' if entry['uses_index'] else 'SCAN'} {entry['name']}: key {keys}")
+        raise SystemExit(0 if report and all(entry['uses_index'] for entry in report) else 1)
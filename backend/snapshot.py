@@ -0,0 +1,281 @@
+import argparse
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.fs as pafs
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional; without it the dashboard reads from the database
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = 'current.json'
+PARTITION_COLUMNS = ['month', 'plans']
+DATA_COLUMNS = ['date', 'city_code', 'plans', 'plan_revenue_crores']
+
+# Refreshes within one process are serialized; separate processes write separate directories
+_refresh_lock = threading.Lock()
+# Unreferenced snapshot directories are kept this long, for readers still scanning them and for
+# refreshes in other processes that have not published theirs yet
+SNAPSHOT_RETENTION_SECONDS = 3600
+
+
+def pyarrow_available():
+    return pa is not None
+
+
+def _snapshot_schema():
+    return pa.schema([
+        ('date', pa.date32()),
+        ('city_code', pa.int32()),
+        ('plan_revenue_crores', pa.float32()),
+        ('month', pa.string()),
+        ('plans', pa.string()),
+    ])
+
+
+class SnapshotStore:
+    """Parquet copy of revenue_data, partitioned by month and plan, for dashboard reads.
+
+    Each refresh writes a new snapshot directory and then switches current.json to it, so readers
+    never see a half-written snapshot. The manifest records the storage data_version the snapshot
+    was taken at; is_current() compares it with the live version. Directories the manifest no
+    longer names are removed once they are older than retention_seconds.
+    """
+
+    def __init__(self, root='snapshots', batch_size=500000, retention_seconds=SNAPSHOT_RETENTION_SECONDS):
+        if pa is None:
+            raise ImportError("SnapshotStore requires pyarrow; install it with 'pip install pyarrow'.")
+        self.root = root
+        self.batch_size = batch_size
+        self.retention_seconds = retention_seconds
+        self._dataset = None  # (directory, pyarrow dataset) of the last snapshot opened
+
+    def manifest(self):
+        """Returns the manifest of the current snapshot, or None if there is none."""
+        try:
+            with open(os.path.join(self.root, MANIFEST_FILE)) as manifest_file:
+                return json.load(manifest_file)
+        except (OSError, ValueError):
+            return None
+
+    def is_current(self, storage):
+        """True if the snapshot reflects the storage's current data version."""
+        manifest = self.manifest()
+        if manifest is None:
+            return False
+        version = storage.data_version()
+        return version is not None and manifest['source_version'] == version
+
+    @staticmethod
+    def _to_table(df):
+        """Converts a columnar revenue_data frame into an Arrow table with the partition columns added."""
+        dates = df['date'].to_numpy(dtype='datetime64[D]')
+        table_frame = pd.DataFrame({
+            'date': dates,
+            'city_code': np.asarray(df['city_code'], dtype=np.int32),
+            'plan_revenue_crores': np.asarray(df['plan_revenue_crores'], dtype=np.float32),
+            'month': dates.astype('datetime64[M]').astype(str),
+            'plans': np.asarray(df['plans'], dtype=object),
+        })
+        # Sorted rows give tight row-group statistics for date and city_code predicates
+        table_frame = table_frame.sort_values(['month', 'plans', 'date', 'city_code'], kind='stable')
+        return pa.Table.from_pandas(table_frame, schema=_snapshot_schema(), preserve_index=False)
+
+    def refresh(self, storage, force=False):
+        """Exports revenue_data from the storage backend if it changed since the last snapshot.
+
+        Returns True if a new snapshot was written.
+        """
+        with _refresh_lock:
+            version = storage.data_version()
+            manifest = self.manifest()
+            if not force and version is not None and manifest and manifest['source_version'] == version:
+                return False
+
+            started = time.perf_counter()
+            df = storage.fetch_records_columnar(batch_size=self.batch_size)
+            if df.empty and storage.count_records() != 0:
+                # An empty frame is also what a failed fetch returns; keep the old snapshot then
+                raise RuntimeError("could not export revenue_data for the snapshot")
+
+            directory = f"snapshot-{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+            path = os.path.join(self.root, directory)
+            os.makedirs(path)
+            if not df.empty:
+                pq.write_to_dataset(
+                    self._to_table(df),
+                    root_path=path,
+                    partition_cols=PARTITION_COLUMNS,
+                    basename_template='part-{i}.parquet',
+                )
+
+            manifest_path = os.path.join(self.root, MANIFEST_FILE)
+            with open(manifest_path + '.tmp', 'w') as manifest_file:
+                json.dump({
+                    'directory': directory,
+                    'source_version': version,
+                    'rows': len(df),
+                    'created_at': time.time(),
+                }, manifest_file)
+            previous = self.manifest()
+            os.replace(manifest_path + '.tmp', manifest_path)
+            if previous and previous['directory'] != directory:
+                # The retention period of the replaced snapshot starts now, not when it was written
+                try:
+                    os.utime(os.path.join(self.root, previous['directory']))
+                except OSError:
+                    pass
+
+            self._remove_old_snapshots()
+
+            logger.info("Wrote revenue snapshot of %s rows in %.2fs.", len(df), time.perf_counter() - started)
+            return True
+
+    def _remove_old_snapshots(self):
+        """Deletes snapshot directories the manifest does not name that are older than retention_seconds.
+
+        Another process may be writing or have just published a newer directory, so only the age of
+        a directory decides, never which refresh wrote it.
+        """
+        manifest = self.manifest()
+        current = manifest['directory'] if manifest else None
+        cutoff = time.time() - self.retention_seconds
+        for entry in os.listdir(self.root):
+            if not entry.startswith('snapshot-') or entry == current:
+                continue
+            path = os.path.join(self.root, entry)
+            try:
+                if os.path.getmtime(path) >= cutoff:
+                    continue
+            except OSError:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+
+    def _open(self):
+        """Returns the pyarrow dataset of the current snapshot, or None if there is none."""
+        manifest = self.manifest()
+        if manifest is None:
+            return None
+        directory = manifest['directory']
+        if self._dataset is None or self._dataset[0] != directory:
+            schema = _snapshot_schema()
+            dataset = ds.dataset(
+                os.path.join(self.root, directory),
+                schema=schema,
+                format='parquet',
+                partitioning=ds.partitioning(pa.schema([schema.field(name) for name in PARTITION_COLUMNS]),
+                                             flavor='hive'),
+                filesystem=pafs.LocalFileSystem(use_mmap=True),
+            )
+            self._dataset = (directory, dataset)
+        return self._dataset[1]
+
+    @staticmethod
+    def _filter(start_date=None, end_date=None, city_code=None, plans=None):
+        """Builds the dataset filter; month and plan conditions prune whole partitions."""
+        conditions = []
+        if start_date is not None:
+            start = pd.Timestamp(start_date)
+            conditions.append(ds.field('month') >= start.strftime('%Y-%m'))
+            conditions.append(ds.field('date') >= pa.scalar(start.date(), pa.date32()))
+        if end_date is not None:
+            end = pd.Timestamp(end_date)
+            conditions.append(ds.field('month') <= end.strftime('%Y-%m'))
+            conditions.append(ds.field('date') <= pa.scalar(end.date(), pa.date32()))
+        if city_code is not None:
+            conditions.append(ds.field('city_code') == int(city_code))
+        if plans is not None:
+            conditions.append(ds.field('plans') == plans)
+        if not conditions:
+            return None
+        expression = conditions[0]
+        for condition in conditions[1:]:
+            expression = expression & condition
+        return expression
+
+    def _scan(self, columns, **filters):
+        dataset = self._open()
+        if dataset is None:
+            return None
+        return dataset.to_table(columns=columns, filter=self._filter(**filters))
+
+    def read(self, columns=None, start_date=None, end_date=None, city_code=None, plans=None):
+        """Reads only the requested columns of the matching partitions as a compact DataFrame."""
+        table = self._scan(list(columns or DATA_COLUMNS), start_date=start_date, end_date=end_date,
+                           city_code=city_code, plans=plans)
+        if table is None:
+            return pd.DataFrame(columns=list(columns or DATA_COLUMNS))
+        return table.to_pandas(date_as_object=False, strings_to_categorical=True)
+
+    def _aggregate_revenue(self, group_by, start_date=None, end_date=None, city_code=None, plans=None):
+        """Sums revenue per group_by ('date', 'month', 'city_code' or 'plans'), like the storage backends."""
+        output_column = 'date' if group_by == 'month' else group_by
+        table = self._scan([group_by, 'plan_revenue_crores'], start_date=start_date, end_date=end_date,
+                           city_code=city_code, plans=plans)
+        if table is None or table.num_rows == 0:
+            return pd.DataFrame(columns=[output_column, 'plan_revenue_crores'])
+
+        # Sum in double precision like the databases do, not in the stored float32
+        table = table.set_column(1, 'plan_revenue_crores', pc.cast(table['plan_revenue_crores'], pa.float64()))
+        grouped = table.group_by(group_by).aggregate([('plan_revenue_crores', 'sum')]).sort_by(group_by)
+        df = grouped.to_pandas().rename(columns={'plan_revenue_crores_sum': 'plan_revenue_crores'})
+        if group_by == 'month':
+            df[group_by] = pd.to_datetime(df[group_by] + '-01')
+        return df.rename(columns={group_by: output_column})[[output_column, 'plan_revenue_crores']]
+
+    def get_revenue_by_date(self, bucket='day', start_date=None, end_date=None, city_code=None, plans=None):
+        """Returns total revenue per day, or per month with bucket='month', as a DataFrame."""
+        group_by = 'month' if bucket == 'month' else 'date'
+        return self._aggregate_revenue(group_by, start_date, end_date, city_code, plans)
+
+    def get_revenue_by_city(self, start_date=None, end_date=None, city_code=None, plans=None):
+        """Returns total revenue per city_code as a DataFrame."""
+        return self._aggregate_revenue('city_code', start_date, end_date, city_code, plans)
+
+    def get_revenue_by_plan(self, start_date=None, end_date=None, city_code=None, plans=None):
+        """Returns total revenue per plan as a DataFrame."""
+        return self._aggregate_revenue('plans', start_date, end_date, city_code, plans)
+
+    def get_total_revenue(self):
+        """Returns the total revenue across all plans and cities."""
+        table = self._scan(['plan_revenue_crores'])
+        if table is None or table.num_rows == 0:
+            return "No records found."
+        total = pc.sum(pc.cast(table['plan_revenue_crores'], pa.float64())).as_py()
+        return {'total_revenue': round(total, 2)}
+
+
+def create_snapshot_store(root=None):
+    """Returns a SnapshotStore under REVENUE_SNAPSHOT_DIR (default 'snapshots'), or None without pyarrow."""
+    if pa is None:
+        return None
+    return SnapshotStore(root or os.environ.get('REVENUE_SNAPSHOT_DIR', 'snapshots'))
+
+
+if __name__ == "__main__":
+    from backend.storage import create_storage_backend
+
+    parser = argparse.ArgumentParser(description="Maintain the Parquet snapshot of revenue_data.")
+    parser.add_argument('command', choices=['refresh'], help="refresh: export revenue_data if it changed")
+    parser.add_argument('--root', default=None, help="snapshot directory (default: REVENUE_SNAPSHOT_DIR)")
+    parser.add_argument('--force', action='store_true', help="export even if the data version is unchanged")
+    args = parser.parse_args()
+
+    snapshot_store = create_snapshot_store(args.root)
+    if snapshot_store is None:
+        raise SystemExit("pyarrow is not installed.")
+    storage = create_storage_backend()
+    storage.create_tables()
+    snapshot_store.refresh(storage, force=args.force)
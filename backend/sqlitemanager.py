@@ -0,0 +1,728 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+import pandas as pd
+from backend.bulkloader import BulkLoader, BulkLoadResult, REVENUE_COLUMNS
+from backend.columnarfetch import ColumnarFetcher
+from backend.instrumentation import InstrumentedCursor, count, instrumented_operation
+from backend.storage import INGEST_JOB_FIELDS, StorageBackend, current_statement_timeout
+
+logger = logging.getLogger(__name__)
+
+CREATE_TABLE_QUERIES = [
+    """
+    CREATE TABLE IF NOT EXISTS imported_files (
+        filename TEXT NOT NULL PRIMARY KEY,
+        content_hash TEXT NULL,
+        row_count INTEGER NULL,
+        chunk_rows INTEGER NULL,
+        chunk_hashes TEXT NULL,
+        imported_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_imported_files_content_hash ON imported_files (content_hash)",
+    # SQLite would store unparseable numbers as text; the checks reject them like MySQL does
+    """
+    CREATE TABLE IF NOT EXISTS revenue_data (
+        date TEXT NOT NULL,
+        city_code INTEGER NOT NULL CHECK (typeof(city_code) = 'integer'),
+        plans TEXT NOT NULL,
+        plan_revenue_crores REAL NOT NULL CHECK (typeof(plan_revenue_crores) = 'real'),
+        PRIMARY KEY (date, city_code, plans)
+    ) WITHOUT ROWID
+    """,
+    # The same secondary indexes the MySQL schema migrations add (see schema.py)
+    "CREATE INDEX IF NOT EXISTS idx_revenue_data_plans_revenue ON revenue_data (plans, plan_revenue_crores)",
+    "CREATE INDEX IF NOT EXISTS idx_revenue_data_city_date ON revenue_data (city_code, date)",
+    """
+    CREATE TABLE IF NOT EXISTS revenue_data_rejects (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        date TEXT,
+        city_code TEXT,
+        plans TEXT,
+        plan_revenue_crores REAL,
+        error TEXT NOT NULL,
+        rejected_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS ingest_jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        filename TEXT NOT NULL,
+        path TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'queued',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        max_attempts INTEGER NOT NULL DEFAULT 3,
+        progress REAL NOT NULL DEFAULT 0,
+        rows_inserted INTEGER NOT NULL DEFAULT 0,
+        rows_rejected INTEGER NOT NULL DEFAULT 0,
+        rows_per_second REAL NULL,
+        message TEXT NULL,
+        worker TEXT NULL,
+        created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        started_at TEXT NULL,
+        finished_at TEXT NULL,
+        heartbeat_at TEXT NULL,
+        next_attempt_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_ingest_jobs_status ON ingest_jobs (status, next_attempt_at)",
+    """
+    CREATE TABLE IF NOT EXISTS data_version (
+        id INTEGER NOT NULL PRIMARY KEY,
+        version INTEGER NOT NULL
+    )
+    """,
+    "INSERT OR IGNORE INTO data_version (id, version) VALUES (1, 0)",
+    """
+    CREATE TABLE IF NOT EXISTS import_checkpoints (
+        filename TEXT NOT NULL PRIMARY KEY,
+        last_chunk INTEGER NOT NULL,
+        rows_committed INTEGER NOT NULL,
+        chunksize INTEGER NOT NULL,
+        updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+]
+
+# Temporary table a file is staged in before the merge; same checks as revenue_data
+STAGE_TABLE_QUERY = """
+CREATE TEMP TABLE {table} (
+    date TEXT NOT NULL,
+    city_code INTEGER NOT NULL CHECK (typeof(city_code) = 'integer'),
+    plans TEXT NOT NULL,
+    plan_revenue_crores REAL NOT NULL CHECK (typeof(plan_revenue_crores) = 'real'),
+    PRIMARY KEY (date, city_code, plans)
+) WITHOUT ROWID
+"""
+
+# SQLite virtual machine instructions between statement timeout checks
+PROGRESS_STEPS = 10000
+
+# Jobs that are due, or whose worker stopped heartbeating; the parameter is the negative lease
+RUNNABLE_JOB_CONDITION = """
+    (status = 'queued' AND next_attempt_at <= datetime('now'))
+    OR (status = 'running' AND heartbeat_at < datetime('now', ?))
+"""
+
+
+class SQLiteManager(StorageBackend):
+    """Embedded, in-process storage backend for tests and single-node deployments."""
+
+    def __init__(self, path='revenue.db', batch_size=5000):
+        self.path = path
+        self.batch_size = batch_size
+        # Identifies this database in process-wide caches; every in-memory database is distinct
+        self.cache_namespace = ('sqlite', path if path != ':memory:' else id(self))
+        # One connection shared by all threads; the lock serializes access to it
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        self._lock = threading.RLock()
+        if path != ':memory:':
+            self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+
+    @contextmanager
+    def _cursor(self):
+        """Yields a cursor inside a transaction that is committed on success and rolled back on error."""
+        with self._lock:
+            timeout = current_statement_timeout()
+            if timeout is not None:
+                # sqlite3 has no statement timeout; the progress handler interrupts queries past the deadline
+                deadline = time.monotonic() + timeout
+                self._connection.set_progress_handler(lambda: time.monotonic() > deadline, PROGRESS_STEPS)
+            cursor = InstrumentedCursor(self._connection.cursor())
+            try:
+                yield cursor
+                self._connection.commit()
+            except Exception:
+                self._connection.rollback()
+                raise
+            finally:
+                cursor.close()
+                if timeout is not None:
+                    self._connection.set_progress_handler(None, 0)
+
+    @staticmethod
+    def _row(row):
+        return dict(row) if row is not None else None
+
+    def create_tables(self):
+        """Creates necessary tables in the database."""
+        try:
+            with self._cursor() as cursor:
+                for create_query in CREATE_TABLE_QUERIES:
+                    cursor.execute(create_query)
+        except Exception as e:
+            logger.exception("Error while creating tables")
+
+    def data_version(self):
+        """Returns the current data version, or None if it cannot be read."""
+        try:
+            with self._cursor() as cursor:
+                cursor.execute("SELECT version FROM data_version WHERE id = 1")
+                row = cursor.fetchone()
+                return row['version'] if row else None
+        except Exception as e:
+            logger.exception("Error while reading data version")
+            return None
+
+    @staticmethod
+    def _bump_data_version(cursor):
+        # Runs inside the writing transaction, so the new version commits together with the data
+        cursor.execute("UPDATE data_version SET version = version + 1 WHERE id = 1")
+
+    def is_file_imported(self, filename):
+        """Checks if a file has already been imported."""
+        try:
+            with self._cursor() as cursor:
+                cursor.execute("SELECT 1 FROM imported_files WHERE filename = ?", (filename,))
+                return cursor.fetchone() is not None
+        except Exception as e:
+            logger.exception("Error while checking if file is imported")
+            return False
+
+    def find_imported_file_by_hash(self, content_hash):
+        """Returns the imported_files record with this content hash, or None."""
+        try:
+            with self._cursor() as cursor:
+                cursor.execute(
+                    "SELECT filename, row_count FROM imported_files WHERE content_hash = ? LIMIT 1", (content_hash,)
+                )
+                return self._row(cursor.fetchone())
+        except Exception as e:
+            logger.exception("Error while checking file hash")
+            return None
+
+    def get_imported_file(self, filename):
+        """Returns the imported_files record for a filename with its chunk hashes decoded, or None."""
+        try:
+            with self._cursor() as cursor:
+                cursor.execute(
+                    """
+                    SELECT filename, content_hash, row_count, chunk_rows, chunk_hashes
+                    FROM imported_files
+                    WHERE filename = ?
+                    """,
+                    (filename,),
+                )
+                row = self._row(cursor.fetchone())
+                if row:
+                    row['chunk_hashes'] = json.loads(row['chunk_hashes']) if row['chunk_hashes'] else None
+                return row
+        except Exception as e:
+            logger.exception("Error while reading imported file")
+            return None
+
+    @instrumented_operation
+    def mark_file_as_imported(self, filename, fingerprint=None):
+        """Marks a file as imported in the database, recording its content fingerprint when given."""
+        try:
+            with self._cursor() as cursor:
+                self._record_imported_file(cursor, filename, fingerprint)
+                self._bump_data_version(cursor)
+        except Exception as e:
+            logger.exception("Error while marking file as imported")
+
+    @staticmethod
+    def _record_imported_file(cursor, filename, fingerprint=None):
+        if fingerprint is None:
+            cursor.execute("INSERT INTO imported_files (filename) VALUES (?)", (filename,))
+            return
+        cursor.execute(
+            """
+            INSERT INTO imported_files (filename, content_hash, row_count, chunk_rows, chunk_hashes)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (filename) DO UPDATE SET
+                content_hash = excluded.content_hash,
+                row_count = excluded.row_count,
+                chunk_rows = excluded.chunk_rows,
+                chunk_hashes = excluded.chunk_hashes,
+                imported_at = CURRENT_TIMESTAMP
+            """,
+            (
+                filename,
+                fingerprint.content_hash,
+                fingerprint.row_count,
+                fingerprint.chunk_rows,
+                json.dumps(fingerprint.chunk_hashes),
+            ),
+        )
+
+    def get_import_checkpoint(self, filename):
+        """Returns the last committed chunk of an interrupted streaming import, or None."""
+        try:
+            with self._cursor() as cursor:
+                cursor.execute(
+                    "SELECT last_chunk, rows_committed, chunksize FROM import_checkpoints WHERE filename = ?",
+                    (filename,),
+                )
+                return self._row(cursor.fetchone())
+        except Exception as e:
+            logger.exception("Error while reading import checkpoint")
+            return None
+
+    def save_import_checkpoint(self, filename, last_chunk, rows_committed, chunksize):
+        """Records the last chunk of a streaming import that has been committed."""
+        try:
+            with self._cursor() as cursor:
+                self._save_import_checkpoint(cursor, filename, last_chunk, rows_committed, chunksize)
+        except Exception as e:
+            logger.exception("Error while saving import checkpoint")
+
+    @staticmethod
+    def _save_import_checkpoint(cursor, filename, last_chunk, rows_committed, chunksize):
+        cursor.execute(
+            """
+            INSERT INTO import_checkpoints (filename, last_chunk, rows_committed, chunksize)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (filename) DO UPDATE SET
+                last_chunk = excluded.last_chunk,
+                rows_committed = excluded.rows_committed,
+                chunksize = excluded.chunksize,
+                updated_at = CURRENT_TIMESTAMP
+            """,
+            (filename, last_chunk, rows_committed, chunksize),
+        )
+
+    def clear_import_checkpoint(self, filename):
+        """Removes the checkpoint of a streaming import once the file is fully imported."""
+        try:
+            with self._cursor() as cursor:
+                cursor.execute("DELETE FROM import_checkpoints WHERE filename = ?", (filename,))
+        except Exception as e:
+            logger.exception("Error while clearing import checkpoint")
+
+    def enqueue_ingest_job(self, filename, path, max_attempts=3):
+        """Queues a spooled upload for the ingest worker and returns the job id, or None on error."""
+        try:
+            with self._cursor() as cursor:
+                cursor.execute(
+                    "INSERT INTO ingest_jobs (filename, path, max_attempts) VALUES (?, ?, ?)",
+                    (filename, path, max_attempts),
+                )
+                return cursor.lastrowid
+        except Exception as e:
+            logger.exception("Error while enqueuing ingest job")
+            return None
+
+    def claim_ingest_job(self, worker, lease_seconds=300):
+        """Claims the oldest runnable job for a worker and returns it, or None if there is none.
+
+        The UPDATE re-checks that the job is still runnable, so only one of several workers racing
+        for the same job gets it.
+        """
+        try:
+            with self._cursor() as cursor:
+                while True:
+                    lease = f'-{int(lease_seconds)} seconds'
+                    cursor.execute(
+                        f"SELECT id FROM ingest_jobs WHERE {RUNNABLE_JOB_CONDITION} ORDER BY id LIMIT 1", (lease,)
+                    )
+                    row = cursor.fetchone()
+                    if row is None:
+                        return None
+                    cursor.execute(
+                        f"""
+                        UPDATE ingest_jobs
+                        SET status = 'running', attempts = attempts + 1, worker = ?, progress = 0,
+                            started_at = datetime('now'), heartbeat_at = datetime('now'), finished_at = NULL
+                        WHERE id = ? AND ({RUNNABLE_JOB_CONDITION})
+                        """,
+                        (worker, row['id'], lease),
+                    )
+                    if cursor.rowcount == 1:
+                        cursor.execute("SELECT * FROM ingest_jobs WHERE id = ?", (row['id'],))
+                        return self._row(cursor.fetchone())
+        except Exception as e:
+            logger.exception("Error while claiming ingest job")
+            return None
+
+    def update_ingest_job(self, job_id, **fields):
+        """Records progress or the outcome of a job and renews its heartbeat."""
+        columns = [column for column in INGEST_JOB_FIELDS if column in fields]
+        assignments = [f"{column} = ?" for column in columns] + ["heartbeat_at = datetime('now')"]
+        if fields.get('status') in ('done', 'failed'):
+            assignments.append("finished_at = datetime('now')")
+        try:
+            with self._cursor() as cursor:
+                cursor.execute(
+                    f"UPDATE ingest_jobs SET {', '.join(assignments)} WHERE id = ?",
+                    [fields[column] for column in columns] + [job_id],
+                )
+        except Exception as e:
+            logger.exception("Error while updating ingest job")
+
+    def fail_ingest_job(self, job_id, message, retry_delay=30):
+        """Requeues a failed job after retry_delay seconds, or marks it failed after its last attempt."""
+        try:
+            with self._cursor() as cursor:
+                cursor.execute(
+                    """
+                    UPDATE ingest_jobs
+                    SET status = CASE WHEN attempts < max_attempts THEN 'queued' ELSE 'failed' END,
+                        next_attempt_at = datetime('now', ?),
+                        finished_at = CASE WHEN attempts < max_attempts THEN NULL ELSE datetime('now') END,
+                        message = ?
+                    WHERE id = ?
+                    """,
+                    (f'+{int(retry_delay)} seconds', message, job_id),
+                )
+        except Exception as e:
+            logger.exception("Error while failing ingest job")
+
+    def list_ingest_jobs(self, limit=20):
+        """Returns the most recent ingest jobs, newest first."""
+        try:
+            with self._cursor() as cursor:
+                cursor.execute("SELECT * FROM ingest_jobs ORDER BY id DESC LIMIT ?", (limit,))
+                return [self._row(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.exception("Error while listing ingest jobs")
+            return []
+
+    @instrumented_operation
+    def insert_data_to_revenue_table(self, df, batch_size=None, use_load_data=None, upsert=False, checkpoint=None):
+        """Bulk inserts a DataFrame into the revenue_data table and returns a BulkLoadResult.
+
+        The whole DataFrame is one transaction; a checkpoint=(filename, last_chunk,
+        rows_committed_before, chunksize) is saved in it. use_load_data is accepted for interface
+        compatibility and ignored.
+        """
+        result = BulkLoadResult()
+        started = time.perf_counter()
+        try:
+            with self._cursor() as cursor:
+                self._write_dataframe(cursor, df, result, batch_size=batch_size, upsert=upsert)
+                if result.rows_inserted:
+                    self._bump_data_version(cursor)
+                self._store_rejects(cursor, result.rejected)
+                if checkpoint is not None:
+                    filename, last_chunk, rows_committed_before, chunksize = checkpoint
+                    self._save_import_checkpoint(
+                        cursor, filename, last_chunk, rows_committed_before + result.rows_inserted, chunksize
+                    )
+        except Exception as e:
+            logger.exception("Error while inserting data into revenue table")
+            # The transaction was rolled back, so nothing of the DataFrame was written
+            result = BulkLoadResult()
+            result.error = str(e)
+
+        result.elapsed = time.perf_counter() - started
+        count('rows_inserted', result.rows_inserted)
+        count('rows_rejected', result.rows_rejected)
+        logger.info(
+            "Inserted %s rows (%.0f rows/sec), %s rejected.",
+            result.rows_inserted, result.rows_per_second, result.rows_rejected,
+        )
+        return result
+
+    def _write_dataframe(self, cursor, df, result, table='revenue_data', batch_size=None, upsert=False):
+        """Writes a DataFrame in batches inside the caller's transaction, adding the outcome to result."""
+        result.rows_received += len(df)
+        batch_size = batch_size or self.batch_size
+        insert_query = f"""
+        INSERT INTO {table} (date, city_code, plans, plan_revenue_crores)
+        VALUES (?, ?, ?, ?)
+        """
+        if upsert:
+            insert_query += """
+            ON CONFLICT (date, city_code, plans) DO UPDATE SET plan_revenue_crores = excluded.plan_revenue_crores
+            """
+
+        missing = df[REVENUE_COLUMNS].isna().any(axis=1)
+        for row in BulkLoader.rows_from_dataframe(df[missing].astype(object).where(df[missing].notna(), None)):
+            result.reject(row, "Missing or invalid value in a required column")
+        df = df[~missing]
+        # SQLite stores dates as ISO text
+        df = df.assign(date=df['date'].astype(str).str[:10])
+
+        for start in range(0, len(df), batch_size):
+            rows = BulkLoader.rows_from_dataframe(df.iloc[start:start + batch_size])
+            cursor.execute("SAVEPOINT batch")
+            try:
+                cursor.executemany(insert_query, rows)
+                result.rows_inserted += len(rows)
+            except sqlite3.Error:
+                # Retry the batch row by row to isolate the rejected rows
+                cursor.execute("ROLLBACK TO batch")
+                for row in rows:
+                    try:
+                        cursor.execute(insert_query, row)
+                        result.rows_inserted += 1
+                    except sqlite3.Error as row_error:
+                        result.reject(row, row_error)
+            cursor.execute("RELEASE batch")
+            result.batches += 1
+
+    @staticmethod
+    def _store_rejects(cursor, rejected):
+        if not rejected:
+            return
+        cursor.executemany(
+            """
+            INSERT INTO revenue_data_rejects (date, city_code, plans, plan_revenue_crores, error)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            [tuple(map(str, reject['row'][:3])) + (reject['row'][3], reject['error'])
+             for reject in rejected],
+        )
+
+    @instrumented_operation
+    def import_file_atomically(self, filename, chunks, fingerprint=None):
+        """Imports a whole file as one transaction and returns a BulkLoadResult, or None if nothing was written.
+
+        Chunks are staged in a temporary table, each in its own short transaction so readers are not
+        blocked while the file is parsed; the merge into revenue_data and the file record commit together.
+        """
+        result = BulkLoadResult()
+        started = time.perf_counter()
+        # The connection is shared by every thread, so each import gets its own stage table
+        stage_table = f"revenue_stage_{uuid.uuid4().hex}"
+        try:
+            with self._cursor() as cursor:
+                cursor.execute(STAGE_TABLE_QUERY.format(table=stage_table))
+            try:
+                for chunk in chunks:
+                    with self._cursor() as cursor:
+                        self._write_dataframe(cursor, chunk, result, table=stage_table, upsert=True)
+
+                with self._cursor() as cursor:
+                    cursor.execute(f"SELECT COUNT(*) FROM temp.{stage_table}")
+                    result.rows_inserted = cursor.fetchone()[0]
+                    cursor.execute(
+                        f"""
+                        INSERT INTO revenue_data (date, city_code, plans, plan_revenue_crores)
+                        SELECT date, city_code, plans, plan_revenue_crores FROM temp.{stage_table} WHERE true
+                        ON CONFLICT (date, city_code, plans) DO UPDATE SET
+                            plan_revenue_crores = excluded.plan_revenue_crores
+                        """
+                    )
+                    self._record_imported_file(cursor, filename, fingerprint)
+                    cursor.execute("DELETE FROM import_checkpoints WHERE filename = ?", (filename,))
+                    self._bump_data_version(cursor)
+                    self._store_rejects(cursor, result.rejected)
+            finally:
+                with self._cursor() as cursor:
+                    cursor.execute(f"DROP TABLE IF EXISTS temp.{stage_table}")
+        except Exception as e:
+            logger.exception("Error while importing '%s'", filename)
+            return None
+
+        result.elapsed = time.perf_counter() - started
+        count('rows_inserted', result.rows_inserted)
+        count('rows_rejected', result.rows_rejected)
+        logger.info(
+            "Merged %s rows of '%s' (%.0f rows/sec), %s rejected.",
+            result.rows_inserted, filename, result.rows_per_second, result.rows_rejected,
+        )
+        return result
+
+    @instrumented_operation
+    def fetch_all_records_as_dataframe(self):
+        """Fetches all records from the revenue_data table and returns them as a DataFrame."""
+        try:
+            with self._lock:
+                return pd.read_sql_query("SELECT * FROM revenue_data", self._connection)
+        except Exception as e:
+            logger.exception("Error while fetching records as DataFrame")
+            return pd.DataFrame()
+
+    @staticmethod
+    def _record_filters(start_date=None, end_date=None, city_code=None, plans=None):
+        """Builds the WHERE conditions and parameters shared by the filtered queries."""
+        conditions, params = [], []
+        if start_date is not None:
+            conditions.append("date >= ?")
+            params.append(str(start_date))
+        if end_date is not None:
+            conditions.append("date <= ?")
+            params.append(str(end_date))
+        if city_code is not None:
+            conditions.append("city_code = ?")
+            params.append(city_code)
+        if plans is not None:
+            conditions.append("plans = ?")
+            params.append(plans)
+        return conditions, params
+
+    @instrumented_operation
+    def fetch_records_page(self, page_size=100, after=None, start_date=None, end_date=None, city_code=None,
+                           plans=None):
+        """Fetches one page of revenue_data in (date, city_code, plans) order as a DataFrame."""
+        try:
+            conditions, params = self._record_filters(start_date, end_date, city_code, plans)
+            if after is not None:
+                conditions.append("(date, city_code, plans) > (?, ?, ?)")
+                after_date, after_city_code, after_plans = after
+                params.extend([str(after_date), after_city_code, after_plans])
+            where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+            query = f"""
+            SELECT date, city_code, plans, plan_revenue_crores
+            FROM revenue_data
+            {where}
+            ORDER BY date, city_code, plans
+            LIMIT ?
+            """
+            with self._lock:
+                return pd.read_sql_query(query, self._connection, params=params + [page_size])
+        except Exception as e:
+            logger.exception("Error while fetching records page")
+            return pd.DataFrame()
+
+    @instrumented_operation
+    def count_records(self, start_date=None, end_date=None, city_code=None, plans=None):
+        """Returns the number of revenue_data rows matching the filters, or None on error."""
+        try:
+            conditions, params = self._record_filters(start_date, end_date, city_code, plans)
+            where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+            with self._cursor() as cursor:
+                cursor.execute(f"SELECT COUNT(*) AS record_count FROM revenue_data {where}", params)
+                return cursor.fetchone()['record_count']
+        except Exception as e:
+            logger.exception("Error while counting records")
+            return None
+
+    @instrumented_operation
+    def fetch_records_columnar(self, columns=None, batch_size=50000, start_date=None, end_date=None, city_code=None,
+                               plans=None):
+        """Fetches revenue_data as a compact, typed DataFrame."""
+        try:
+            selected = ', '.join(columns or ('date', 'city_code', 'plans', 'plan_revenue_crores'))
+            conditions, params = self._record_filters(start_date, end_date, city_code, plans)
+            where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+            with self._lock:
+                cursor = self._connection.cursor()
+                try:
+                    cursor.row_factory = None
+                    cursor.execute(f"SELECT {selected} FROM revenue_data {where}", params)
+                    return ColumnarFetcher(batch_size).fetch(cursor)
+                finally:
+                    cursor.close()
+        except Exception as e:
+            logger.exception("Error while fetching columnar records")
+            return pd.DataFrame()
+
+    def _aggregate_revenue(self, group_by, start_date=None, end_date=None, city_code=None, plans=None):
+        """Sums revenue per group_by ('date', 'month', 'city_code' or 'plans')."""
+        group_expression = "substr(date, 1, 7) || '-01'" if group_by == 'month' else group_by
+        output_column = 'date' if group_by == 'month' else group_by
+        conditions, params = self._record_filters(start_date, end_date, city_code, plans)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        query = f"""
+        SELECT {group_expression} AS {output_column}, SUM(plan_revenue_crores) AS plan_revenue_crores
+        FROM revenue_data
+        {where}
+        GROUP BY {group_expression}
+        ORDER BY {output_column}
+        """
+        try:
+            with self._lock:
+                return pd.read_sql_query(query, self._connection, params=params)
+        except Exception as e:
+            logger.exception("Error while aggregating revenue by %s", group_by)
+            return pd.DataFrame(columns=[output_column, 'plan_revenue_crores'])
+
+    @instrumented_operation
+    def get_revenue_by_date(self, bucket='day', start_date=None, end_date=None, city_code=None, plans=None):
+        """Returns total revenue per day, or per month with bucket='month', as a DataFrame."""
+        group_by = 'month' if bucket == 'month' else 'date'
+        return self._aggregate_revenue(group_by, start_date, end_date, city_code, plans)
+
+    @instrumented_operation
+    def get_revenue_by_city(self, start_date=None, end_date=None, city_code=None, plans=None):
+        """Returns total revenue per city_code as a DataFrame."""
+        return self._aggregate_revenue('city_code', start_date, end_date, city_code, plans)
+
+    @instrumented_operation
+    def get_revenue_by_plan(self, start_date=None, end_date=None, city_code=None, plans=None):
+        """Returns total revenue per plan as a DataFrame."""
+        return self._aggregate_revenue('plans', start_date, end_date, city_code, plans)
+
+    def _fetch_answer(self, query, description):
+        """Runs a single-row analytic query and returns the row as a dict or a message string."""
+        try:
+            with self._cursor() as cursor:
+                cursor.execute(query)
+                row = self._row(cursor.fetchone())
+                if row and all(value is not None for value in row.values()):
+                    return row
+                return "No records found."
+        except Exception as e:
+            logger.exception("Error while fetching %s", description)
+            return "Error fetching record."
+
+    @instrumented_operation
+    def get_total_revenue(self):
+        """Returns the total revenue across all plans and cities."""
+        return self._fetch_answer(
+            "SELECT round(sum(plan_revenue_crores), 2) AS total_revenue FROM revenue_data",
+            "total revenue",
+        )
+
+    @instrumented_operation
+    def get_record_with_max_revenue(self):
+        """Returns the city and day with the highest total revenue."""
+        return self._fetch_answer(
+            """
+            SELECT city_code, date, round(sum(plan_revenue_crores), 2) AS tot_revenue
+            FROM revenue_data
+            GROUP BY city_code, date
+            ORDER BY tot_revenue DESC
+            LIMIT 1
+            """,
+            "record with maximum revenue",
+        )
+
+    @instrumented_operation
+    def get_plan_with_max_revenue(self):
+        """Returns the plan with the highest total revenue."""
+        return self._fetch_answer(
+            """
+            SELECT plans, round(sum(plan_revenue_crores), 2) AS tot_revenue
+            FROM revenue_data
+            GROUP BY plans
+            ORDER BY tot_revenue DESC
+            LIMIT 1
+            """,
+            "plan with maximum revenue",
+        )
+
+    @instrumented_operation
+    def get_total_city_count(self):
+        """Returns the number of cities with revenue for plan p3."""
+        return self._fetch_answer(
+            """
+            SELECT count(DISTINCT city_code) AS city_count
+            FROM revenue_data
+            WHERE plans = 'p3' AND plan_revenue_crores <> 0
+            """,
+            "city count",
+        )
+
+    @instrumented_operation
+    def get_city_by_revenue_across_plans(self):
+        """Returns the city contributing most to the top-ranked revenue of each plan."""
+        return self._fetch_answer(
+            """
+            WITH RankedRevenue AS (
+                SELECT
+                    city_code,
+                    plans,
+                    plan_revenue_crores,
+                    RANK() OVER (PARTITION BY plans ORDER BY plan_revenue_crores DESC) AS ranking
+                FROM revenue_data
+            )
+            SELECT city_code, round(sum(plan_revenue_crores), 2) AS total_revenue
+            FROM RankedRevenue
+            WHERE ranking = 1
+            GROUP BY city_code
+            ORDER BY total_revenue DESC
+            LIMIT 1
+            """,
+            "city with maximum revenue",
+        )
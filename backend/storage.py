@@ -0,0 +1,211 @@
+import contextvars
+import os
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+
+# Columns of ingest_jobs a worker may update through update_ingest_job
+INGEST_JOB_FIELDS = ('status', 'progress', 'rows_inserted', 'rows_rejected', 'rows_per_second', 'message')
+
+# Seconds a query run inside statement_timeout() may take before the backend aborts it
+_statement_timeout = contextvars.ContextVar('statement_timeout', default=None)
+
+
+@contextmanager
+def statement_timeout(seconds):
+    """Asks the storage backend to abort queries run inside the block after the given seconds."""
+    token = _statement_timeout.set(seconds)
+    try:
+        yield
+    finally:
+        _statement_timeout.reset(token)
+
+
+def current_statement_timeout():
+    return _statement_timeout.get()
+
+
+class StorageBackend(ABC):
+    """Everything the ingest pipeline and the dashboard need from a revenue store.
+
+    DatabaseManager (MySQL) and SQLiteManager (embedded) implement it; read methods keep the
+    return conventions of the original MySQL implementation (dict rows, DataFrames, or a
+    message string when there is no answer).
+    """
+
+    # Table DDL
+
+    @abstractmethod
+    def create_tables(self):
+        """Creates the tables the backend needs if they do not exist."""
+
+    @abstractmethod
+    def data_version(self):
+        """Returns a stamp that changes whenever revenue_data changes, or None if it cannot be read."""
+
+    # Import bookkeeping
+
+    @abstractmethod
+    def is_file_imported(self, filename):
+        """Checks if a file has already been imported."""
+
+    @abstractmethod
+    def find_imported_file_by_hash(self, content_hash):
+        """Returns the imported file record with this content hash, or None."""
+
+    @abstractmethod
+    def get_imported_file(self, filename):
+        """Returns the imported file record with its chunk hashes decoded, or None."""
+
+    @abstractmethod
+    def mark_file_as_imported(self, filename, fingerprint=None):
+        """Marks a file as imported, recording its content fingerprint when given."""
+
+    @abstractmethod
+    def get_import_checkpoint(self, filename):
+        """Returns the last committed chunk of an interrupted streaming import, or None."""
+
+    @abstractmethod
+    def save_import_checkpoint(self, filename, last_chunk, rows_committed, chunksize):
+        """Records the last chunk of a streaming import that has been committed."""
+
+    @abstractmethod
+    def clear_import_checkpoint(self, filename):
+        """Removes the checkpoint of a streaming import."""
+
+    # Ingest jobs, processed by the background worker (backend/ingestworker.py)
+
+    @abstractmethod
+    def enqueue_ingest_job(self, filename, path, max_attempts=3):
+        """Queues a spooled upload and returns the job id, or None on error."""
+
+    @abstractmethod
+    def claim_ingest_job(self, worker, lease_seconds=300):
+        """Claims the oldest runnable job (or one whose worker stopped heartbeating); returns it or None."""
+
+    @abstractmethod
+    def update_ingest_job(self, job_id, **fields):
+        """Records progress or the outcome of a job and renews its heartbeat."""
+
+    @abstractmethod
+    def fail_ingest_job(self, job_id, message, retry_delay=30):
+        """Requeues a failed job, or marks it failed after its last attempt."""
+
+    @abstractmethod
+    def list_ingest_jobs(self, limit=20):
+        """Returns the most recent ingest jobs, newest first."""
+
+    # Ingest
+
+    @abstractmethod
+    def insert_data_to_revenue_table(self, df, batch_size=None, use_load_data=None, upsert=False, checkpoint=None):
+        """Inserts a DataFrame into revenue_data and returns a BulkLoadResult.
+
+        If the insert failed as a whole, nothing was written and the result's error says why.
+
+        checkpoint=(filename, last_chunk, rows_committed_before, chunksize) marks the DataFrame as one
+        chunk of a streaming import; the chunk and its import checkpoint are committed together.
+        """
+
+    @abstractmethod
+    def import_file_atomically(self, filename, chunks, fingerprint=None):
+        """Stages an iterable of cleaned DataFrames and upserts them into revenue_data in one transaction.
+
+        The file is recorded as imported in the same transaction. Returns a BulkLoadResult, or None
+        if the import failed and nothing was written.
+        """
+
+    # Fetch
+
+    @abstractmethod
+    def fetch_all_records_as_dataframe(self):
+        """Returns every revenue_data row as a DataFrame."""
+
+    @abstractmethod
+    def fetch_records_page(self, page_size=100, after=None, start_date=None, end_date=None, city_code=None,
+                           plans=None):
+        """Returns one page of revenue_data in the backend's primary-key order.
+
+        after is the (date, city_code, plans) key of the last row of the previous page.
+        """
+
+    @abstractmethod
+    def count_records(self, start_date=None, end_date=None, city_code=None, plans=None):
+        """Returns the number of matching revenue_data rows, or None on error."""
+
+    @abstractmethod
+    def fetch_records_columnar(self, columns=None, batch_size=50000, start_date=None, end_date=None, city_code=None,
+                               plans=None):
+        """Returns revenue_data as a compact, typed DataFrame."""
+
+    @abstractmethod
+    def get_revenue_by_date(self, bucket='day', start_date=None, end_date=None, city_code=None, plans=None):
+        """Returns total revenue per day or month."""
+
+    @abstractmethod
+    def get_revenue_by_city(self, start_date=None, end_date=None, city_code=None, plans=None):
+        """Returns total revenue per city_code."""
+
+    @abstractmethod
+    def get_revenue_by_plan(self, start_date=None, end_date=None, city_code=None, plans=None):
+        """Returns total revenue per plan."""
+
+    # The five dashboard questions
+
+    @abstractmethod
+    def get_total_revenue(self):
+        """Q1: {'total_revenue': ...}"""
+
+    @abstractmethod
+    def get_record_with_max_revenue(self):
+        """Q2: {'city_code': ..., 'date': ..., 'tot_revenue': ...}"""
+
+    @abstractmethod
+    def get_plan_with_max_revenue(self):
+        """Q3: {'plans': ..., 'tot_revenue': ...}"""
+
+    @abstractmethod
+    def get_total_city_count(self):
+        """Q4: {'city_count': ...}"""
+
+    @abstractmethod
+    def get_city_by_revenue_across_plans(self):
+        """Q5: {'city_code': ..., 'total_revenue': ...}"""
+
+
+def create_storage_backend(backend=None, **options):
+    """Builds the configured storage backend.
+
+    The backend and its settings come from the arguments or the environment:
+    REVENUE_DB_BACKEND ('mysql' or 'sqlite'), REVENUE_DB_HOST, REVENUE_DB_PORT, REVENUE_DB_USER,
+    REVENUE_DB_PASSWORD, REVENUE_DB_NAME, REVENUE_DB_REPLICAS (comma-separated host[:port] read
+    replicas) and REVENUE_DB_PARTITION_BY_MONTH for MySQL, and REVENUE_DB_PATH for SQLite.
+    """
+    backend = backend or os.environ.get('REVENUE_DB_BACKEND', 'mysql')
+    if backend == 'sqlite':
+        from backend.sqlitemanager import SQLiteManager
+
+        path = options.pop('path', None) or os.environ.get('REVENUE_DB_PATH', 'revenue.db')
+        return SQLiteManager(path, **options)
+    if backend == 'mysql':
+        from backend.databasemanager import DatabaseManager
+
+        port = options.pop('port', None) or os.environ.get('REVENUE_DB_PORT')
+        replicas = options.pop('replicas', None)
+        if replicas is None:
+            replicas = [replica for replica in os.environ.get('REVENUE_DB_REPLICAS', '').split(',') if replica.strip()]
+        partition_by_month = options.pop('partition_by_month', None)
+        if partition_by_month is None:
+            # '0', 'false' or an empty value leave partitioning off
+            partition_setting = os.environ.get('REVENUE_DB_PARTITION_BY_MONTH', '').strip().lower()
+            partition_by_month = partition_setting in ('1', 'true', 'yes')
+        return DatabaseManager(
+            options.pop('host', None) or os.environ.get('REVENUE_DB_HOST', 'localhost'),
+            options.pop('user', None) or os.environ.get('REVENUE_DB_USER', 'root'),
+            options.pop('password', None) or os.environ.get('REVENUE_DB_PASSWORD', 'root'),
+            options.pop('database', None) or os.environ.get('REVENUE_DB_NAME', 'revenue_db'),
+            partition_by_month=partition_by_month,
+            port=int(port) if port else None,
+            replicas=replicas,
+            **options,
+        )
+    raise ValueError(f"Unknown storage backend '{backend}'")
@@ -0,0 +1,91 @@
+import argparse
+import os
+import numpy as np
+import pandas as pd
+
+PLANS = np.array(['p1', 'p2', 'p3', 'p4', 'p5', 'p6', 'p7', 'p8', 'p9', 'p10'])
+
+# Date formats seen in real uploads, with how often each one appears
+DATE_FORMATS = [('%d-%m-%Y', 0.7), ('%Y-%m-%d', 0.2), ('%d/%m/%Y', 0.1)]
+
+# Kinds of broken rows mixed into the file
+BAD_VALUES = {
+    'date': ['not-a-date', '', '31-02-2024'],
+    'city_code': ['', 'abc'],
+    'plan_revenue_crores': ['', 'n/a'],
+}
+
+
+def generate_chunk(rng, rows, start_row, cities=500, days=730, start_date='2022-01-01', bad_row_rate=0.001,
+                   mixed_dates=True):
+    """Returns one chunk of synthetic revenue rows as a DataFrame of strings.
+
+    Rows are unique on (date, city_code, plans) across chunks: row i maps to a distinct cell of the
+    date x city x plan grid, so files larger than the grid wrap around into duplicates on purpose.
+    """
+    cells = (np.arange(start_row, start_row + rows) * 7919) % (days * cities * len(PLANS))
+    day, rest = np.divmod(cells, cities * len(PLANS))
+    city, plan = np.divmod(rest, len(PLANS))
+    dates = pd.Timestamp(start_date) + pd.to_timedelta(day, unit='D')
+
+    date_strings = np.empty(rows, dtype=object)
+    if mixed_dates:
+        formats = rng.choice(len(DATE_FORMATS), size=rows, p=[share for _, share in DATE_FORMATS])
+    else:
+        formats = np.zeros(rows, dtype=int)
+    for index, (date_format, _) in enumerate(DATE_FORMATS):
+        selected = formats == index
+        date_strings[selected] = dates[selected].strftime(date_format)
+
+    # Revenue is skewed like the real data: most cities earn little, a few earn a lot
+    revenue = np.round(rng.gamma(shape=1.5, scale=4.0, size=rows) * (1 + (city % 50 == 0) * 9), 2)
+    chunk = pd.DataFrame({
+        'date': date_strings,
+        'city_code': (city + 1).astype(str),
+        'plans': PLANS[plan],
+        'plan_revenue_crores': revenue.astype(str),
+    })
+
+    bad_rows = np.flatnonzero(rng.random(rows) < bad_row_rate)
+    if len(bad_rows):
+        columns = rng.choice(list(BAD_VALUES), size=len(bad_rows))
+        for column in BAD_VALUES:
+            targets = bad_rows[columns == column]
+            chunk.loc[targets, column] = rng.choice(BAD_VALUES[column], size=len(targets))
+    return chunk
+
+
+def generate_csv(path, rows, chunk_rows=1000000, seed=42, **options):
+    """Writes a synthetic revenue CSV of the given size, one bounded chunk at a time."""
+    rng = np.random.default_rng(seed)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', newline='') as csv_file:
+        for start_row in range(0, rows, chunk_rows):
+            chunk = generate_chunk(rng, min(chunk_rows, rows - start_row), start_row, **options)
+            chunk.to_csv(csv_file, header=start_row == 0, index=False)
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic revenue CSV.")
+    parser.add_argument('path', help="output CSV file")
+    parser.add_argument('--rows', type=int, default=100000, help="number of data rows (10k to 50M)")
+    parser.add_argument('--cities', type=int, default=500)
+    parser.add_argument('--days', type=int, default=730)
+    parser.add_argument('--bad-row-rate', type=float, default=0.001, help="share of rows with a broken value")
+    parser.add_argument('--single-date-format', action='store_true', help="write every date as DD-MM-YYYY")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    generate_csv(
+        args.path,
+        args.rows,
+        seed=args.seed,
+        cities=args.cities,
+        days=args.days,
+        bad_row_rate=args.bad_row_rate,
+        mixed_dates=not args.single_date_format,
+    )
+    print(f"Wrote {args.rows} rows to {args.path}")
@@ -0,0 +1,202 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+# Add project root to PYTHONPATH
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import numpy as np
+import pandas as pd
+from benchmarks.generate_data import generate_csv
+
+DEFAULT_SIZES = [10000, 100000, 1000000]
+
+ANALYTIC_QUERIES = [
+    'get_total_revenue',
+    'get_record_with_max_revenue',
+    'get_plan_with_max_revenue',
+    'get_total_city_count',
+    'get_city_by_revenue_across_plans',
+]
+
+
+class UploadedFile:
+    """Stands in for a Streamlit upload: a binary file with a name and a size."""
+
+    def __init__(self, path):
+        self.name = os.path.basename(path)
+        self.size = os.path.getsize(path)
+        self._file = open(path, 'rb')
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+    def __iter__(self):
+        return iter(self._file)
+
+    def close(self):
+        self._file.close()
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far (ru_maxrss is KB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def latency_summary(samples):
+    """Latency percentiles in milliseconds."""
+    values = np.array(samples) * 1000
+    return {
+        'min': float(values.min()),
+        'p50': float(np.percentile(values, 50)),
+        'p95': float(np.percentile(values, 95)),
+        'p99': float(np.percentile(values, 99)),
+        'max': float(values.max()),
+    }
+
+
+def time_stage(results, stage, rows, function, repeat=1):
+    """Runs function repeat times and records its latency, throughput and the peak RSS afterwards."""
+    samples = []
+    value = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        value = function()
+        samples.append(time.perf_counter() - started)
+    median = float(np.median(samples))
+    results.append({
+        'stage': stage,
+        'rows': rows,
+        'repeat': repeat,
+        'seconds': median,
+        'rows_per_second': rows / median if rows and median > 0 else None,
+        'latency_ms': latency_summary(samples),
+        'peak_rss_mb': peak_rss_mb(),
+    })
+    print(f"  {stage:<36} {median * 1000:10.1f} ms", flush=True)
+    return value
+
+
+def create_backend(backend, workdir, label):
+    from backend.storage import create_storage_backend
+
+    if backend == 'sqlite':
+        storage = create_storage_backend('sqlite', path=os.path.join(workdir, f'{label}.db'))
+    else:
+        storage = create_storage_backend('mysql')
+    storage.create_tables()
+    return storage
+
+
+def run_size(rows, backend, workdir, repeat):
+    """Benchmarks every stage on one file size; runs in a fresh process so peak RSS is per size."""
+    from backend.analyticsengine import AnalyticsEngine
+    from backend.fileprocessor import FileProcessor
+
+    results = []
+    print(f"{rows} rows ({backend})", flush=True)
+    path = os.path.join(workdir, f'revenue_{rows}.csv')
+    time_stage(results, 'generate_csv', rows, lambda: generate_csv(path, rows))
+
+    # Whole-file and streaming imports, each into an empty database
+    storage = create_backend(backend, workdir, f'process_file_{rows}')
+    upload = UploadedFile(path)
+    time_stage(results, 'process_file', rows, lambda: FileProcessor(storage).process_file(upload))
+    upload.close()
+
+    storage = create_backend(backend, workdir, f'streaming_{rows}')
+    upload = UploadedFile(path)
+    time_stage(results, 'process_file_streaming', rows,
+               lambda: FileProcessor(storage).process_file_streaming(upload))
+    upload.close()
+
+    # Parse and clean alone, then the insert path on the cleaned frame
+    df = time_stage(results, 'read_and_clean_csv', rows,
+                    lambda: FileProcessor.clean_dataframe(pd.read_csv(path, dtype={'city_code': str})))
+    df = df.dropna()
+    storage = create_backend(backend, workdir, f'insert_{rows}')
+    time_stage(results, 'insert_data_to_revenue_table', len(df), lambda: storage.insert_data_to_revenue_table(df))
+    stored_rows = storage.count_records() or 0
+
+    time_stage(results, 'fetch_all_records_as_dataframe', stored_rows, storage.fetch_all_records_as_dataframe,
+               repeat=repeat)
+    time_stage(results, 'fetch_records_columnar', stored_rows, storage.fetch_records_columnar, repeat=repeat)
+    time_stage(results, 'fetch_records_page', 100, lambda: storage.fetch_records_page(page_size=100), repeat=repeat)
+    for query in ANALYTIC_QUERIES:
+        time_stage(results, query, stored_rows, getattr(storage, query), repeat=repeat)
+
+    engine = AnalyticsEngine(max_rows=sys.maxsize)
+    time_stage(results, 'analytics_engine_load', stored_rows, lambda: engine.refresh(storage))
+    time_stage(results, 'analytics_engine_answers', stored_rows, engine.compute, repeat=repeat)
+
+    os.remove(path)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    """Prints the change in median time of every stage against an earlier results file."""
+    with open(baseline_path) as baseline_file:
+        baseline = {(entry['rows'], entry['stage']): entry for entry in json.load(baseline_file)['results']}
+    print(f"\nCompared with {baseline_path}:")
+    for entry in results:
+        previous = baseline.get((entry['rows'], entry['stage']))
+        if previous is None or not previous['seconds']:
+            continue
+        change = (entry['seconds'] - previous['seconds']) / previous['seconds'] * 100
+        print(f"  {entry['rows']:>10} {entry['stage']:<36} {change:+7.1f}%")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the ingest and analysis paths.")
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help="file sizes to benchmark, in rows (10k to 50M)")
+    parser.add_argument('--backend', choices=['sqlite', 'mysql'], default='sqlite',
+                        help="sqlite runs against a local file; mysql uses the REVENUE_DB_* settings")
+    parser.add_argument('--repeat', type=int, default=5, help="runs of each read stage, for the percentiles")
+    parser.add_argument('--workdir', default=None, help="where files and databases go (default: a temp dir)")
+    parser.add_argument('--output', default=None, help="write the results as JSON to this file")
+    parser.add_argument('--compare', default=None, help="JSON results of an earlier run to compare with")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='revenue-bench-')
+    os.makedirs(workdir, exist_ok=True)
+
+    results = []
+    for rows in args.rows:
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+            results.extend(executor.submit(run_size, rows, args.backend, workdir, args.repeat).result())
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'git_commit': git_commit(),
+            'backend': args.backend,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+        print(f"\nResults written to {args.output}")
+    if args.compare:
+        compare(results, args.compare)
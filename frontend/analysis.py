@@ -1,28 +1,61 @@
 from multiprocessing.connection import default_family
 
+import functools
+
 import streamlit as st
-import pandas as pd
-import plotly.express as px
+from backend.instrumentation import operation, timed
+from chartdata import MAX_LABELLED_POINTS, month_tick_interval, prepare_trend, top_n_with_other
+
+# The dashboard answers, in the order of the questions
+ANSWERS = (
+    'total_revenue',
+    'record_with_max_revenue',
+    'plan_with_max_revenue',
+    'total_city_count',
+    'city_by_revenue_across_plans',
+)
 
 class AnalysisManager:
-    def __init__(self, db_manager):
+    def __init__(self, db_manager, snapshot_store=None, analytics_engine=None):
         self.db_manager = db_manager
-
-    def perform_analysis1(self):
+        self.snapshot_store = snapshot_store
+        self.analytics_engine = analytics_engine
+
+    def read_source(self):
+        """Returns the Parquet snapshot when it is up to date with the database, otherwise the database."""
+        if self.snapshot_store is not None and self.snapshot_store.is_current(self.db_manager):
+            return self.snapshot_store
+        return self.db_manager
+
+    def answer(self, name, prefetched=None):
+        """Returns one dashboard answer, from the in-memory analytics engine when it can serve the data.
+
+        prefetched holds results already fetched by name (see dashboard_calls); those are not queried again.
+        """
+        if prefetched is not None and name in prefetched:
+            return prefetched[name]
+        with operation(name), timed('analysis'):
+            if self.analytics_engine is not None:
+                answers = self.analytics_engine.answers(self.db_manager)
+                if answers is not None:
+                    return answers[name]
+            source = self.read_source()
+            if not hasattr(source, f'get_{name}'):
+                # The snapshot only answers the totals
+                source = self.db_manager
+            return getattr(source, f'get_{name}')()
+
+    def perform_analysis1(self, prefetched=None):
         st.write('**Q1. What is the total revenue (in crores) generated from all plans across all cities?**')
-        records = self.db_manager.fetch_all_records_as_dataframe()
-        if not records.empty:
-            if 'plan_revenue_crores' in records.columns:
-                total_revenue = records['plan_revenue_crores'].sum()
-                st.write(f"Ans 1. Total Revenue: {total_revenue} Crores")
-            else:
-                st.write("'plan_revenue_crores' column not found in the DataFrame.")
+        total = self.answer('total_revenue', prefetched)
+        if isinstance(total, dict):
+            st.write(f"Ans 1. Total Revenue: {total['total_revenue']} Crores")
         else:
             st.write("No data available to calculate total revenue.")
 
-    def perform_analysis2(self):
+    def perform_analysis2(self, prefetched=None):
         st.write('**Q2. Which city (city_code) generated the highest revenue on a single day?**')
-        max_revenue_record = self.db_manager.get_record_with_max_revenue()
+        max_revenue_record = self.answer('record_with_max_revenue', prefetched)
         if isinstance(max_revenue_record, dict):
             st.write(
                 f"Ans 2. City Code: {max_revenue_record['city_code']} | "
@@ -31,9 +64,9 @@ class AnalysisManager:
         else:
             st.write("Error fetching the record.")
 
-    def perform_analysis3(self):
+    def perform_analysis3(self, prefetched=None):
         st.write('**Q3. Which plan generated the highest total revenue across all cities?**')
-        all_records = self.db_manager.get_plan_with_max_revenue()
+        all_records = self.answer('plan_with_max_revenue', prefetched)
         if isinstance(all_records, dict):
             st.write(
                 f"Ans 3. Plan: {all_records['plans']} | Total Revenue: {all_records['tot_revenue']}"
@@ -41,17 +74,17 @@ class AnalysisManager:
         else:
             st.write("Error fetching the record.")
 
-    def perform_analysis4(self):
+    def perform_analysis4(self, prefetched=None):
         st.write('**Q4. How many cities (city_code) contributed to the total revenue for the plan "p3"?**')
-        count = self.db_manager.get_total_city_count()
+        count = self.answer('total_city_count', prefetched)
         if isinstance(count, dict):
             st.write(f"Ans 4. Total City Count: {count['city_count']}")
         else:
             st.write("Error fetching the count.")
 
-    def perform_analysis5(self):
+    def perform_analysis5(self, prefetched=None):
         st.write('**Q5. Which city contributed the most to the total revenue across all plans?**')
-        city_details = self.db_manager.get_city_by_revenue_across_plans()
+        city_details = self.answer('city_by_revenue_across_plans', prefetched)
         if isinstance(city_details, dict):
             st.write(
                 f"Ans 5. City Code: {city_details['city_code']} | "
@@ -60,104 +93,152 @@ class AnalysisManager:
         else:
             st.write("Error fetching the details.")
 
-    def display_visualizations(self):
-
-        # Fetch all records as a DataFrame
-        df = self.db_manager.fetch_all_records_as_dataframe()
-        df['city_code'] = df['city_code'].astype(str)
-        import pandas as pd
+    def dashboard_calls(self, filters, bucket):
+        """Returns {name: function} for every answer and chart series, for running them concurrently."""
+        calls = {name: functools.partial(self.answer, name) for name in ANSWERS}
+        calls.update(self.chart_calls(filters, bucket))
+        return calls
+
+    def chart_calls(self, filters, bucket):
+        source = self.read_source()
+        return {
+            'revenue_by_date': functools.partial(source.get_revenue_by_date, bucket=bucket, **filters),
+            'revenue_by_city': functools.partial(source.get_revenue_by_city, **filters),
+            'revenue_by_plan': functools.partial(source.get_revenue_by_plan, **filters),
+        }
+
+    def chart_filters(self):
+        """Renders the chart filter widgets and returns (filters, bucket) for the aggregate queries."""
+        with st.expander("Chart filters"):
+            bucket = st.radio("Trend granularity", ['day', 'month'], horizontal=True, key="chart_bucket")
+            date_range = st.date_input("Date range", value=(), key="chart_dates")
+            plan_filter = st.text_input("Plan", key="chart_plan").strip() or None
+            city_filter = st.text_input("City code", key="chart_city_code").strip() or None
+
+        filters = {
+            'start_date': date_range[0] if len(date_range) > 0 else None,
+            'end_date': date_range[1] if len(date_range) > 1 else None,
+            'plans': plan_filter,
+            'city_code': int(city_filter) if city_filter is not None and city_filter.isdigit() else None,
+        }
+        return filters, bucket
+
+    def display_visualizations(self, filters=None, bucket=None, prefetched=None):
+        """Draws the charts; without filters the filter widgets are rendered here first."""
+        if filters is None:
+            filters, bucket = self.chart_filters()
+        prefetched = prefetched or {}
+
+        def series(name):
+            return prefetched[name] if name in prefetched else self.chart_calls(filters, bucket)[name]()
+
+        # Each chart gets only its grouped series; the grouping happens in the database or the snapshot
+        df_monthly = series('revenue_by_date')
+        if df_monthly is None or df_monthly.empty:
+            st.write("No data available for the charts.")
+            return
+        # plotly is only loaded once there is a chart to draw, so the page starts without it
         import plotly.express as px
-        import streamlit as st
 
         st.subheader('Revenue Trend By Month')
-        df['date'] = pd.to_datetime(df['date'])
-
-        # Aggregate data by month
-        df_monthly = df.groupby('date', as_index=False)['plan_revenue_crores'].sum()
+        # Long histories are bucketed by month and downsampled, so the chart payload stays bounded
+        with timed('chart_prepare', operation='revenue_by_date'):
+            df_monthly, _ = prepare_trend(df_monthly, bucket or 'day')
 
         # Calculate the max value for the y-axis
         max_value = df_monthly['plan_revenue_crores'].max()
 
-        # Create the line chart
-        fig_line = px.line(
-            df_monthly,
-            x='date',
-            y='plan_revenue_crores',
-            labels={'date': 'Date', 'plan_revenue_crores': 'Revenue (in Crores)'},
-            text='plan_revenue_crores',  # Add data labels
-        )
-
-        # Update layout to show all months on the x-axis
-        fig_line.update_traces(
-            textposition='top center'  # Position data labels above the data points
-        )
-
-        fig_line.update_layout(
-            xaxis_title='Date',
-            yaxis_title='Revenue (in Crores)',
-            xaxis_tickformat='%b %Y',  # Format ticks as "Month Year"
-            xaxis=dict(
-                tickmode='linear',  # Show all ticks
-                dtick="M1",  # Force tick interval to 1 month
-            ),
-            yaxis=dict(range=[0, max_value * 1.1]),  # Ensure y-axis starts at 0 and ends slightly above max value
-            hovermode='x unified',
-            showlegend=False,  # Hide the legend as the line is self-explanatory
-        )
-
-        # Display the chart
-        st.plotly_chart(fig_line)
-
-        # Group by city_code and sum the revenue
-        df_grouped = df.groupby('city_code')['plan_revenue_crores'].sum().reset_index()
-
-        # # Ensure city_code is treated as a string to avoid formatting issues
-
-        # Create the bar chart for Sales By City
-        fig_bar = px.bar(
-            df_grouped,
-            x='city_code',  # Column name as a string
-            y='plan_revenue_crores',  # Column name as a string
-            labels={'city_code': 'City Code', 'plan_revenue_crores': 'Revenue (in Crores)'}
-        )
-
-        # Add data labels
-        fig_bar.update_traces(texttemplate='%{y:.2f}', textposition='outside')
-
-        # Update layout for readability
-        fig_bar.update_layout(
-            xaxis_title='City Code',
-            yaxis_title='Revenue (in Crores)',
-            xaxis=dict(type='category'),  # Ensure city codes are treated as categories
-            showlegend=False
-        )
-        st.subheader('Revenue By City')
-        # Display the bar chart
-        st.plotly_chart(fig_bar)
-
-        # Group by city_code and sum the revenue
-        df_grouped = df.groupby('plans')['plan_revenue_crores'].sum().reset_index()
-
-        # # Ensure city_code is treated as a string to avoid formatting issues
-
-        # Create the bar chart for Sales By City
-        fig_bar = px.bar(
-            df_grouped,
-            x='plans',  # Column name as a string
-            y='plan_revenue_crores',  # Column name as a string
-            labels={'city_code': 'Plans', 'plan_revenue_crores': 'Revenue (in Crores)'}
-        )
-
-        # Add data labels
-        fig_bar.update_traces(texttemplate='%{y:.2f}', textposition='outside')
-
-        # Update layout for readability
-        fig_bar.update_layout(
-            xaxis_title='Plans',
-            yaxis_title='Revenue (in Crores)',
-            xaxis=dict(type='category'),  # Ensure city codes are treated as categories
-            showlegend=False
-        )
-        st.subheader('Revenue By City')
-        # Display the bar chart
-        st.plotly_chart(fig_bar)
\ No newline at end of file
+        with timed('chart_build', operation='revenue_by_date'):
+            # Create the line chart; only a short series gets a data label on every point
+            labelled = len(df_monthly) <= MAX_LABELLED_POINTS
+            fig_line = px.line(
+                df_monthly,
+                x='date',
+                y='plan_revenue_crores',
+                labels={'date': 'Date', 'plan_revenue_crores': 'Revenue (in Crores)'},
+                text='plan_revenue_crores' if labelled else None,
+            )
+
+            if labelled:
+                fig_line.update_traces(
+                    textposition='top center'  # Position data labels above the data points
+                )
+
+            fig_line.update_layout(
+                xaxis_title='Date',
+                yaxis_title='Revenue (in Crores)',
+                xaxis_tickformat='%b %Y',  # Format ticks as "Month Year"
+                xaxis=dict(
+                    tickmode='linear',
+                    dtick=month_tick_interval(df_monthly),  # Whole months, at most about two dozen ticks
+                ),
+                yaxis=dict(range=[0, max_value * 1.1]),  # Ensure y-axis starts at 0 and ends slightly above max value
+                hovermode='x unified',
+                showlegend=False,  # Hide the legend as the line is self-explanatory
+            )
+
+            # Display the chart
+            st.plotly_chart(fig_line)
+
+        # Revenue per city_code
+        df_grouped = series('revenue_by_city')
+        if df_grouped is None:
+            st.write("The revenue by city query did not finish in time.")
+            return
+        # The largest cities get a bar each, the rest share one
+        with timed('chart_prepare', operation='revenue_by_city'):
+            df_grouped = top_n_with_other(df_grouped, 'city_code')
+
+        with timed('chart_build', operation='revenue_by_city'):
+            # Create the bar chart for Sales By City
+            fig_bar = px.bar(
+                df_grouped,
+                x='city_code',  # Column name as a string
+                y='plan_revenue_crores',  # Column name as a string
+                labels={'city_code': 'City Code', 'plan_revenue_crores': 'Revenue (in Crores)'}
+            )
+
+            # Add data labels
+            fig_bar.update_traces(texttemplate='%{y:.2f}', textposition='outside')
+
+            # Update layout for readability
+            fig_bar.update_layout(
+                xaxis_title='City Code',
+                yaxis_title='Revenue (in Crores)',
+                xaxis=dict(type='category'),  # Ensure city codes are treated as categories
+                showlegend=False
+            )
+            st.subheader('Revenue By City')
+            # Display the bar chart
+            st.plotly_chart(fig_bar)
+
+        # Revenue per plan
+        df_grouped = series('revenue_by_plan')
+        if df_grouped is None:
+            st.write("The revenue by plan query did not finish in time.")
+            return
+        with timed('chart_prepare', operation='revenue_by_plan'):
+            df_grouped = top_n_with_other(df_grouped, 'plans')
+
+        with timed('chart_build', operation='revenue_by_plan'):
+            # Create the bar chart for Sales By City
+            fig_bar = px.bar(
+                df_grouped,
+                x='plans',  # Column name as a string
+                y='plan_revenue_crores',  # Column name as a string
+                labels={'city_code': 'Plans', 'plan_revenue_crores': 'Revenue (in Crores)'}
+            )
+
+            # Add data labels
+            fig_bar.update_traces(texttemplate='%{y:.2f}', textposition='outside')
+
+            # Update layout for readability
+            fig_bar.update_layout(
+                xaxis_title='Plans',
+                yaxis_title='Revenue (in Crores)',
+                xaxis=dict(type='category'),  # Ensure city codes are treated as categories
+                showlegend=False
+            )
+            st.subheader('Revenue By City')
+            # Display the bar chart
+            st.plotly_chart(fig_bar)
\ No newline at end of file
@@ -1,27 +1,46 @@
+import functools
 import sys
 import os
 # Add project root to PYTHONPATH
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from backend import DatabaseManager
+from backend import create_storage_backend
+from backend.snapshot import create_snapshot_store
+from backend.analyticsengine import get_shared_engine
+from backend.asyncqueries import get_shared_runner
 from backend import FileProcessor
+from backend.ingestworker import enqueue_uploads
+from backend.instrumentation import request
 from analysis import AnalysisManager
+from diagnostics import display_diagnostics
+from reporting import StreamlitReporter
 import streamlit as st
 
 # Set the page layout to wide
 st.set_page_config(page_title="Revenue Dashboard", layout="wide")
 
+# 'queue' hands uploads to the background ingest worker; 'inline' imports them during the page run
+INGEST_MODE = os.environ.get('REVENUE_INGEST_MODE', 'queue')
+# Seconds between refreshes of the import status table while jobs are pending
+JOB_POLL_SECONDS = 2
+
 class StreamlitApp:
     def __init__(self):
-        # Replace these with your actual database credentials
-        host = "localhost"
-        user = "root"
-        password = "root"
-        database = "revenue_db"
-
-        # Initialize the DatabaseManager with proper arguments
-        self.db_manager = DatabaseManager(host, user, password, database)
-        self.file_processor = FileProcessor(self.db_manager)
-        self.analysis_manager = AnalysisManager(self.db_manager)
+        # The storage backend (MySQL or embedded SQLite) and its credentials come from the
+        # REVENUE_DB_* environment variables; see README.md
+        self.db_manager = create_storage_backend()
+        # Parquet snapshot for the dashboard reads; None when pyarrow is not installed
+        self.snapshot_store = create_snapshot_store()
+        self.file_processor = FileProcessor(
+            self.db_manager, snapshot_store=self.snapshot_store, notifier=StreamlitReporter()
+        )
+        self.analysis_manager = AnalysisManager(
+            self.db_manager,
+            snapshot_store=self.snapshot_store,
+            # Answers the five questions from in-memory arrays, reloaded only when the data changes
+            analytics_engine=get_shared_engine(self.snapshot_store),
+        )
+        # Runs the dashboard queries concurrently, each with the REVENUE_QUERY_TIMEOUT timeout
+        self.query_runner = get_shared_runner()
     def run(self):
         # Create database tables if they don't exist
         self.db_manager.create_tables()
@@ -34,31 +53,184 @@ class StreamlitApp:
             uploaded_files = st.file_uploader(
                 "Choose one or more CSV files", type=["csv"], accept_multiple_files=True
             )
-            if uploaded_files:
-                self.file_processor.process_multiple_files(uploaded_files)
-            self.analysis_manager.perform_analysis1()
-            self.analysis_manager.perform_analysis2()
-            self.analysis_manager.perform_analysis3()
-            self.analysis_manager.perform_analysis4()
-            self.analysis_manager.perform_analysis5()
+            if uploaded_files and INGEST_MODE == 'inline':
+                # Batches of files are parsed and inserted in parallel; a single upload is streamed in chunks
+                self.file_processor.process_multiple_files(
+                    uploaded_files, streaming=True, parallel=len(uploaded_files) > 1
+                )
+            elif uploaded_files:
+                self.enqueue_uploads(uploaded_files)
+            if INGEST_MODE != 'inline':
+                self.display_ingest_jobs()
+            # Filled in once the queries below have run
+            answers_container = st.container()
         with col2:
             # Display records from the database in the right column
             st.header("Database Records")
-            df = self.db_manager.fetch_all_records_as_dataframe()
-            df['city_code'] = df['city_code'].astype(str)
-            if not df.empty:
-                # Reset the index to start from 1
-                df.index = df.index + 1
-
-                # Display the DataFrame as an interactive table with container width
-                st.dataframe(df, use_container_width=True)
-            else:
-                st.write("No records found in the database.")
-                # Display the record with the maximum revenue
+            records_request = self.records_request()
+            records_container = st.container()
         st.title('Data Visualization')
-        self.analysis_manager.display_visualizations()
+        filters, bucket = self.analysis_manager.chart_filters()
+
+        # All the widgets are drawn, so every query the page needs is known: run them at once
+        calls = self.analysis_manager.dashboard_calls(filters, bucket)
+        if records_request is not None:
+            calls.update(self.records_calls(records_request))
+        prefetched = self.query_runner.run_all(calls)
+
+        with answers_container:
+            self.analysis_manager.perform_analysis1(prefetched)
+            self.analysis_manager.perform_analysis2(prefetched)
+            self.analysis_manager.perform_analysis3(prefetched)
+            self.analysis_manager.perform_analysis4(prefetched)
+            self.analysis_manager.perform_analysis5(prefetched)
+        with records_container:
+            if records_request is not None:
+                self.display_records(records_request, prefetched)
+        self.analysis_manager.display_visualizations(filters, bucket, prefetched)
+
+    def enqueue_uploads(self, uploaded_files):
+        """Spools new uploads and queues them for the ingest worker, once per file per session."""
+        # The uploader hands back the same files on every rerun until they are removed from it
+        enqueued = st.session_state.setdefault("enqueued_uploads", set())
+        new_files = [
+            uploaded_file for uploaded_file in uploaded_files
+            if self.upload_key(uploaded_file) not in enqueued
+        ]
+        if not new_files:
+            return
+        job_ids = enqueue_uploads(self.db_manager, new_files)
+        enqueued.update(self.upload_key(uploaded_file) for uploaded_file in new_files)
+        if len(job_ids) < len(new_files):
+            st.error("Some files could not be queued for import.")
+        st.info(f"Queued {len(job_ids)} file(s) for import.")
+
+    @staticmethod
+    def upload_key(uploaded_file):
+        return getattr(uploaded_file, 'file_id', None) or (uploaded_file.name, uploaded_file.size)
+
+    def display_ingest_jobs(self):
+        """Shows the recent import jobs, refreshed in place while any are still pending."""
+        jobs = self.db_manager.list_ingest_jobs(limit=10)
+        pending = any(job['status'] in ('queued', 'running') for job in jobs)
+        if pending and hasattr(st, 'fragment'):
+            # Only the status table reruns on the timer, not the whole page
+            st.fragment(self.render_ingest_jobs, run_every=JOB_POLL_SECONDS)()
+        else:
+            self.render_ingest_jobs(jobs)
+
+    def render_ingest_jobs(self, jobs=None):
+        jobs = jobs if jobs is not None else self.db_manager.list_ingest_jobs(limit=10)
+        if not jobs:
+            return
+        st.subheader("Imports")
+        for job in jobs:
+            text = f"{job['filename']}: {job['status']}, {job['rows_inserted']} rows"
+            if job['rows_per_second']:
+                text += f" ({job['rows_per_second']:.0f} rows/sec)"
+            if job['status'] in ('queued', 'failed') and job['message']:
+                text += f" - {job['message']}"
+            st.progress(min(float(job['progress'] or 0.0), 1.0), text=text)
+
+        pending = {job['id'] for job in jobs if job['status'] in ('queued', 'running')}
+        # Rerun the whole page when a job finishes so the answers and charts show the new data
+        previously_pending = st.session_state.get("pending_ingest_jobs", set())
+        st.session_state["pending_ingest_jobs"] = pending
+        if previously_pending - pending:
+            st.rerun()
+        if pending:
+            st.caption("Imports are run by the ingest worker: `python -m backend.ingestworker`.")
+            if not hasattr(st, 'fragment') and st.button("Refresh", key="ingest_jobs_refresh"):
+                st.rerun()
+
+    def records_request(self):
+        """Renders the record filters and returns the page to fetch, or None if the filters are invalid."""
+        with st.expander("Filters"):
+            plan_filter = st.text_input("Plan", key="records_plan").strip() or None
+            city_filter = st.text_input("City code", key="records_city_code").strip() or None
+            date_range = st.date_input("Date range", value=(), key="records_dates")
+        page_size = st.selectbox("Rows per page", [25, 50, 100, 500], index=2, key="records_page_size")
+
+        if city_filter is not None and not city_filter.isdigit():
+            st.write("City code must be a number.")
+            return None
+        filters = {
+            'plans': plan_filter,
+            'city_code': int(city_filter) if city_filter is not None else None,
+            'start_date': date_range[0] if len(date_range) > 0 else None,
+            'end_date': date_range[1] if len(date_range) > 1 else None,
+        }
+
+        # The keys of the last row of each visited page; reset whenever the filters change
+        signature = (tuple(sorted(filters.items())), page_size)
+        if st.session_state.get("records_signature") != signature:
+            st.session_state["records_signature"] = signature
+            st.session_state["records_page_keys"] = []
+        page_keys = st.session_state["records_page_keys"]
+        return {'filters': filters, 'page_size': page_size, 'page_keys': page_keys}
+
+    def records_calls(self, records_request):
+        filters = records_request['filters']
+        page_keys = records_request['page_keys']
+        return {
+            'records_count': functools.partial(self.db_manager.count_records, **filters),
+            'records_page': functools.partial(
+                self.db_manager.fetch_records_page,
+                page_size=records_request['page_size'],
+                after=page_keys[-1] if page_keys else None,
+                **filters,
+            ),
+        }
+
+    def display_records(self, records_request=None, prefetched=None):
+        """Shows revenue_data one page at a time; only the visible page and the total count are fetched."""
+        if records_request is None:
+            records_request = self.records_request()
+            if records_request is None:
+                return
+        if prefetched is None:
+            prefetched = {name: call() for name, call in self.records_calls(records_request).items()}
+        page_size = records_request['page_size']
+        page_keys = records_request['page_keys']
+
+        total = prefetched['records_count']
+        if not total:
+            st.write("No records found in the database.")
+            return
+
+        df = prefetched['records_page']
+        if df is None or df.empty:
+            st.write("No records found in the database.")
+            return
+
+        page_number = len(page_keys)
+        last_page = max((total - 1) // page_size, 0)
+        # Number rows from 1 across pages
+        df.index = df.index + page_number * page_size + 1
+
+        # Display the DataFrame as an interactive table with container width
+        # City codes stay integers; the column format only stops them being shown with separators
+        st.dataframe(
+            df,
+            use_container_width=True,
+            column_config={'city_code': st.column_config.NumberColumn('city_code', format='%d')},
+        )
+        st.caption(f"Page {page_number + 1} of {last_page + 1} ({total} records)")
+
+        previous_col, next_col = st.columns(2)
+        if previous_col.button("Previous", disabled=page_number == 0, key="records_previous"):
+            page_keys.pop()
+            st.rerun()
+        if next_col.button("Next", disabled=page_number >= last_page, key="records_next"):
+            last_row = df.iloc[-1]
+            page_keys.append((last_row['date'], int(last_row['city_code']), last_row['plans']))
+            st.rerun()
 
 
 if __name__ == "__main__":
     app = StreamlitApp()
-    app.run()
+    # Page loads slower than REVENUE_SLOW_REQUEST_MS are profiled (with pyinstrument, if installed)
+    with request('page_load'):
+        app.run()
+    if os.environ.get('REVENUE_DIAGNOSTICS'):
+        display_diagnostics(app.db_manager, app.analysis_manager.analytics_engine)
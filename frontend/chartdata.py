@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+
+# Most points the revenue trend line is drawn with, whatever the length of the history
+MAX_TREND_POINTS = 500
+# Daily data spanning more days than this is summed into months before it is drawn
+MONTH_BUCKET_SPAN_DAYS = 731
+# Points are only labelled with their value when there are few enough to read
+MAX_LABELLED_POINTS = 40
+# Bars drawn per bar chart; the remaining categories are summed into one "Other" bar
+TOP_CATEGORIES = 20
+OTHER_LABEL = 'Other'
+
+
+def lttb_indices(x, y, threshold):
+    """Picks threshold points of a series with Largest-Triangle-Three-Buckets; returns their indexes.
+
+    The first and last points are always kept. Every bucket in between keeps the point forming
+    the largest triangle with the point kept before it and the average of the next bucket, so
+    peaks and dips survive the downsampling.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_start = end
+        next_end = edges[bucket + 2] if bucket + 2 < len(edges) else n
+        average_x = x[next_start:next_end].mean()
+        average_y = y[next_start:next_end].mean()
+        areas = np.abs(
+            (x[previous] - average_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (average_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    selected[-1] = n - 1
+    return selected
+
+
+def prepare_trend(df, bucket='day', max_points=MAX_TREND_POINTS, month_span_days=MONTH_BUCKET_SPAN_DAYS):
+    """Bounds the revenue trend to max_points; returns (df, bucket) with the bucket actually drawn.
+
+    Daily totals over a span wider than month_span_days are summed into true monthly totals; a
+    series still longer than max_points is downsampled with LTTB.
+    """
+    df = df.assign(date=pd.to_datetime(df['date'])).sort_values('date', ignore_index=True)
+    if bucket == 'day' and len(df) > 1 and (df['date'].iloc[-1] - df['date'].iloc[0]).days > month_span_days:
+        months = df['date'].dt.to_period('M').dt.to_timestamp()
+        df = df.groupby(months)['plan_revenue_crores'].sum().rename_axis('date').reset_index()
+        bucket = 'month'
+
+    if len(df) > max_points:
+        days = df['date'].to_numpy(dtype='datetime64[D]').astype(np.float64)
+        revenue = df['plan_revenue_crores'].to_numpy(dtype=np.float64)
+        df = df.iloc[lttb_indices(days, revenue, max_points)].reset_index(drop=True)
+    return df, bucket
+
+
+def month_tick_interval(df, max_ticks=24):
+    """Returns a Plotly dtick of whole months that keeps the axis to about max_ticks labels."""
+    if df.empty:
+        return 'M1'
+    span = df['date'].iloc[-1].to_period('M') - df['date'].iloc[0].to_period('M')
+    months = span.n + 1
+    for step in (1, 2, 3, 6, 12):
+        if months / step <= max_ticks:
+            return f'M{step}'
+    return f'M{12 * int(np.ceil(months / 12 / max_ticks))}'
+
+
+def top_n_with_other(df, key, value='plan_revenue_crores', n=TOP_CATEGORIES, other_label=OTHER_LABEL):
+    """Keeps the n largest categories by value, largest first, and sums the rest into other_label."""
+    if len(df) <= n + 1:
+        return df.sort_values(value, ascending=False, ignore_index=True)
+    ranked = df.sort_values(value, ascending=False, ignore_index=True)
+    top = ranked.iloc[:n].astype({key: object})
+    other = pd.DataFrame({key: [other_label], value: [ranked[value].iloc[n:].sum()]})
+    return pd.concat([top, other], ignore_index=True)
@@ -0,0 +1,51 @@
+import pandas as pd
+import streamlit as st
+from backend.instrumentation import get_metrics
+
+
+def display_diagnostics(db_manager, analytics_engine=None):
+    """Sidebar panel with stage timings, counters, pool and cache statistics and slow requests."""
+    metrics = get_metrics()
+    snapshot = metrics.snapshot()
+
+    with st.sidebar.expander("Diagnostics", expanded=False):
+        st.write("**Stage timings**")
+        if snapshot['timers']:
+            timers = pd.DataFrame(snapshot['timers'])
+            st.dataframe(
+                timers[['stage', 'operation', 'count', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms']].round(2),
+                use_container_width=True,
+                hide_index=True,
+            )
+        else:
+            st.write("Nothing recorded yet.")
+
+        st.write("**Counters**")
+        if snapshot['counters']:
+            st.dataframe(pd.DataFrame(snapshot['counters']), use_container_width=True, hide_index=True)
+
+        connection_manager = getattr(db_manager, 'db_manager', None)
+        if hasattr(connection_manager, 'pool_stats'):
+            st.write("**Connection pool**")
+            st.json(connection_manager.pool_stats())
+        query_cache = getattr(db_manager, 'query_cache', None)
+        if query_cache is not None:
+            st.write("**Query cache**")
+            st.json(query_cache.stats())
+        if analytics_engine is not None:
+            st.write(
+                f"**Analytics engine**: load {analytics_engine.last_load_seconds * 1000:.1f} ms, "
+                f"answers {analytics_engine.last_answer_seconds * 1000:.2f} ms"
+            )
+
+        if metrics.slow_reports:
+            st.write("**Slow requests**")
+            for report in reversed(metrics.slow_reports):
+                st.write(f"{report['at']} `{report['request']}` took {report['seconds']:.2f}s")
+                if report['profile']:
+                    st.code(report['profile'], language=None)
+
+        st.download_button("Prometheus metrics", metrics.export_prometheus(), file_name="metrics.prom")
+        st.download_button("JSON metrics", metrics.export_json(), file_name="metrics.json")
+        if st.button("Reset metrics", key="diagnostics_reset"):
+            metrics.reset()
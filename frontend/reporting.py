@@ -0,0 +1,33 @@
+import streamlit as st
+from backend.reporting import Reporter
+
+
+class StreamlitReporter(Reporter):
+    """Shows ingest messages on the page and progress as a progress bar."""
+
+    def __init__(self):
+        self._progress_bar = None
+
+    def info(self, message):
+        st.info(message)
+
+    def success(self, message):
+        st.success(message)
+
+    def warning(self, message):
+        st.warning(message)
+
+    def error(self, message):
+        st.error(message)
+
+    def progress(self, fraction, text=None):
+        fraction = fraction if fraction is not None else 0.0
+        if self._progress_bar is None:
+            self._progress_bar = st.progress(fraction, text=text)
+        else:
+            self._progress_bar.progress(fraction, text=text)
+
+    def progress_done(self):
+        if self._progress_bar is not None:
+            self._progress_bar.empty()
+            self._progress_bar = None
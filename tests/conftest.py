@@ -0,0 +1,79 @@
+import os
+import sys
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.fileprocessor import FileProcessor
+from backend.ingest import LocalFile
+from backend.sqlitemanager import SQLiteManager
+
+HEADER = 'date,city_code,plans,plan_revenue_crores'
+# Seven rows over four days; with chunksize=3 a file of them has chunks of 3, 3 and 1 rows
+ROWS = [
+    ('2023-01-01', 1, 'p1', 1.5),
+    ('2023-01-01', 2, 'p1', 2.5),
+    ('2023-01-02', 1, 'p2', 3.5),
+    ('2023-01-02', 2, 'p2', 4.5),
+    ('2023-01-03', 1, 'p3', 5.5),
+    ('2023-01-03', 2, 'p3', 6.5),
+    ('2023-01-04', 1, 'p1', 7.5),
+]
+
+
+@pytest.fixture
+def storage():
+    storage = SQLiteManager(':memory:')
+    storage.create_tables()
+    return storage
+
+
+@pytest.fixture
+def csv_file(tmp_path):
+    """Writes rows (tuples or raw lines) under a file name and returns it opened like an upload."""
+    opened = []
+
+    def write(name, rows, header=HEADER):
+        lines = [header] + [row if isinstance(row, str) else ','.join(str(value) for value in row) for row in rows]
+        path = tmp_path / name
+        path.write_text('\n'.join(lines) + '\n')
+        upload = LocalFile(str(path))
+        opened.append(upload)
+        return upload
+
+    yield write
+    for upload in opened:
+        upload.close()
+
+
+@pytest.fixture
+def rows():
+    return list(ROWS)
+
+
+@pytest.fixture
+def stored_revenue(storage):
+    """Returns a function that reads every stored row as {(date, city_code, plans): revenue}."""
+    def read():
+        df = storage.fetch_records_page(page_size=1000)
+        return {(row.date, row.city_code, row.plans): row.plan_revenue_crores for row in df.itertuples()}
+
+    return read
+
+
+@pytest.fixture
+def revenue_storage(storage):
+    """Storage holding rows with a tie for the top p1 revenue, for the five dashboard answers."""
+    df = pd.DataFrame([
+        ('2023-01-01', 1, 'p1', 10.0),
+        ('2023-01-01', 2, 'p1', 10.0),  # ties city 1 for the top p1 revenue
+        ('2023-01-02', 1, 'p1', 4.0),
+        ('2023-01-01', 2, 'p2', 7.0),
+        ('2023-01-02', 1, 'p2', 3.0),
+        ('2023-01-02', 3, 'p3', 6.0),
+        ('2023-01-03', 4, 'p3', 0.0),  # no revenue, so city 4 does not count for p3
+        ('2023-01-03', 1, 'p3', 2.0),
+    ], columns=['date', 'city_code', 'plans', 'plan_revenue_crores'])
+    storage.insert_data_to_revenue_table(FileProcessor.clean_dataframe(df))
+    return storage
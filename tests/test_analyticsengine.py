@@ -0,0 +1,60 @@
+import time
+import pandas as pd
+from backend import analyticsengine
+from backend.analyticsengine import AnalyticsEngine
+
+
+def engine_with(rows):
+    engine = AnalyticsEngine()
+    df = pd.DataFrame(rows, columns=['date', 'city_code', 'plans', 'plan_revenue_crores'])
+    df['date'] = pd.to_datetime(df['date'])
+    engine.load(df)
+    return engine
+
+
+def comparable(answers):
+    return {
+        name: {key: str(value) if key == 'date' else value for key, value in answer.items()}
+        for name, answer in answers.items()
+    }
+
+
+def test_analytics_engine_matches_the_database(revenue_storage):
+    engine = AnalyticsEngine()
+    assert engine.refresh(revenue_storage)
+
+    for name, answer in comparable(engine.compute()).items():
+        assert answer == getattr(revenue_storage, f'get_{name}')()
+
+
+def test_every_tied_top_row_counts_for_its_city():
+    engine = engine_with([
+        ('2023-01-01', 1, 'p1', 5.0),
+        ('2023-01-02', 2, 'p1', 5.0),
+        ('2023-01-03', 2, 'p1', 5.0),  # city 2 holds the p1 maximum twice
+        ('2023-01-01', 1, 'p2', 4.0),
+    ])
+
+    assert engine.compute()['city_by_revenue_across_plans'] == {'city_code': 2, 'total_revenue': 10.0}
+
+
+def test_sparse_grouping_gives_the_same_answers(revenue_storage, monkeypatch):
+    engine = AnalyticsEngine()
+    engine.refresh(revenue_storage)
+    dense = engine.compute()
+
+    monkeypatch.setattr(analyticsengine, 'DENSE_GROUP_FACTOR', 0)
+    assert engine.compute() == dense
+
+
+def test_answers_fall_back_to_the_database_until_the_background_load_finishes(revenue_storage):
+    engine = AnalyticsEngine()
+
+    assert engine.answers(revenue_storage) is None
+    deadline = time.monotonic() + 5
+    answers = None
+    while answers is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+        answers = engine.answers(revenue_storage)
+
+    assert answers['total_revenue'] == {'total_revenue': 42.0}
@@ -0,0 +1,38 @@
+ANSWERS = (
+    'total_revenue',
+    'record_with_max_revenue',
+    'plan_with_max_revenue',
+    'total_city_count',
+    'city_by_revenue_across_plans',
+)
+
+
+def test_total_revenue(revenue_storage):
+    assert revenue_storage.get_total_revenue() == {'total_revenue': 42.0}
+
+
+def test_record_with_max_revenue(revenue_storage):
+    assert revenue_storage.get_record_with_max_revenue() == {
+        'city_code': 2, 'date': '2023-01-01', 'tot_revenue': 17.0,
+    }
+
+
+def test_plan_with_max_revenue(revenue_storage):
+    assert revenue_storage.get_plan_with_max_revenue() == {'plans': 'p1', 'tot_revenue': 24.0}
+
+
+def test_total_city_count(revenue_storage):
+    assert revenue_storage.get_total_city_count() == {'city_count': 2}
+
+
+def test_city_by_revenue_across_plans_counts_every_tied_top_row(revenue_storage):
+    # Top rows: p1 in cities 1 and 2 (10.0 each), p2 in city 2 (7.0), p3 in city 3 (6.0)
+    assert revenue_storage.get_city_by_revenue_across_plans() == {'city_code': 2, 'total_revenue': 17.0}
+
+
+def test_answers_without_rows(storage):
+    for name in ANSWERS:
+        if name != 'total_city_count':
+            assert getattr(storage, f'get_{name}')() == "No records found."
+    # COUNT answers even an empty table
+    assert storage.get_total_city_count() == {'city_count': 0}
@@ -0,0 +1,151 @@
+from contextlib import contextmanager
+import pandas as pd
+from mysql.connector import Error
+from backend.bulkloader import BulkLoader, BulkLoadResult
+from backend.fileprocessor import FileProcessor
+
+
+class FakeConnection:
+    """Just enough of a MySQL connection for BulkLoader: keyed rows, commits and one savepoint."""
+
+    def __init__(self, stored=()):
+        self.stored = set(stored)
+        self.pending = set()
+        self.savepoint = None
+        self.statements = []
+
+    def commit(self):
+        self.statements.append('COMMIT')
+        self.stored |= self.pending
+        self.pending = set()
+
+    def rollback(self):
+        self.statements.append('ROLLBACK')
+        self.pending = set()
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, query, params=None):
+        statement = ' '.join(query.split())
+        connection = self.connection
+        if statement.startswith('INSERT INTO'):
+            self.executemany(query, [params])
+            return
+        connection.statements.append(statement)
+        if statement == 'SAVEPOINT bulk_batch':
+            connection.savepoint = set(connection.pending)
+        elif statement == 'ROLLBACK TO SAVEPOINT bulk_batch':
+            connection.pending = set(connection.savepoint)
+        elif statement == 'RELEASE SAVEPOINT bulk_batch':
+            connection.savepoint = None
+        elif statement.startswith('LOAD DATA'):
+            raise Error(msg="Lost connection to MySQL server during query")
+
+    def executemany(self, query, rows):
+        connection = self.connection
+        connection.statements.append(f'INSERT {len(rows)}')
+        keys = [tuple(row[:3]) for row in rows]
+        if len(set(keys)) < len(keys) or set(keys) & (connection.stored | connection.pending):
+            raise Error(msg="Duplicate entry")
+        connection.pending |= set(keys)
+
+
+class FakeConnectionManager:
+    def __init__(self, connection):
+        self.connection = connection
+
+    @contextmanager
+    def get_connection_and_cursor(self):
+        yield self.connection, FakeCursor(self.connection)
+
+
+def revenue_frame(rows):
+    df = pd.DataFrame(rows, columns=['date', 'city_code', 'plans', 'plan_revenue_crores'])
+    df['date'] = pd.to_datetime(df['date'])
+    return df
+
+
+def key(date, city_code, plans):
+    return pd.Timestamp(date).date(), city_code, plans
+
+
+def test_single_transaction_undoes_a_failed_batch_to_its_savepoint():
+    connection = FakeConnection(stored={key('2023-01-02', 1, 'p1')})
+    loader = BulkLoader(FakeConnectionManager(connection), batch_size=2, single_transaction=True)
+    df = revenue_frame([
+        ('2023-01-01', 1, 'p1', 1.0),
+        ('2023-01-01', 2, 'p1', 2.0),
+        ('2023-01-02', 1, 'p1', 3.0),  # already stored, so the second batch fails
+        ('2023-01-02', 2, 'p1', 4.0),
+    ])
+    seen_before_commit = []
+
+    result = loader.load(df, before_commit=lambda cursor, result: seen_before_commit.append(set(connection.pending)))
+
+    assert (result.rows_inserted, result.rows_rejected) == (3, 1)
+    assert connection.statements == [
+        'SAVEPOINT bulk_batch', 'INSERT 2', 'RELEASE SAVEPOINT bulk_batch',
+        'SAVEPOINT bulk_batch', 'INSERT 2', 'ROLLBACK TO SAVEPOINT bulk_batch',
+        'INSERT 1', 'INSERT 1', 'RELEASE SAVEPOINT bulk_batch',
+        'COMMIT',
+    ]
+    # Nothing is committed before the caller's before_commit hook has run in the same transaction
+    assert seen_before_commit == [{key('2023-01-01', 1, 'p1'), key('2023-01-01', 2, 'p1'), key('2023-01-02', 2, 'p1')}]
+    assert len(connection.stored) == 4
+
+
+def test_failed_batch_is_retried_row_by_row_to_isolate_rejects():
+    connection = FakeConnection(stored={key('2023-01-02', 1, 'p1')})
+    loader = BulkLoader(FakeConnectionManager(connection), batch_size=10)
+    df = revenue_frame([
+        ('2023-01-01', 1, 'p1', 1.0),
+        ('2023-01-02', 1, 'p1', 3.0),
+        ('2023-01-02', 2, 'p1', 4.0),
+    ])
+
+    result = loader.load(df)
+
+    assert (result.rows_inserted, result.rows_rejected, result.batches) == (2, 1, 1)
+    assert result.rejected[0]['row'][:3] == key('2023-01-02', 1, 'p1')
+    assert 'Duplicate entry' in result.rejected[0]['error']
+    assert connection.statements == ['INSERT 3', 'ROLLBACK', 'INSERT 1', 'INSERT 1', 'INSERT 1', 'COMMIT']
+    assert len(connection.stored) == 3
+
+
+def test_invalid_rows_are_rejected(storage, csv_file, rows):
+    processor = FileProcessor(storage, chunksize=3)
+    bad_rows = rows[:2] + [
+        ('2023-01-05', 'abc', 'p1', 1.0), ('2023-01-05', 3, 'p1', 'n/a'), ('not-a-date', 3, 'p1', 1.0),
+    ]
+
+    # The unparseable date is dropped while cleaning; the other two bad rows are rejected
+    assert processor.process_file_streaming(csv_file('bad.csv', bad_rows)) == (2, 2)
+    assert storage.count_records() == 2
+
+
+def test_failed_insert_does_not_mark_the_file_imported(storage, csv_file, rows, monkeypatch):
+    def failed_load(*args, **kwargs):
+        result = BulkLoadResult()
+        result.error = "database connection error"
+        return result
+
+    monkeypatch.setattr(storage, 'insert_data_to_revenue_table', failed_load)
+    FileProcessor(storage).process_file(csv_file('a.csv', rows))
+
+    assert not storage.is_file_imported('a.csv')
+
+
+def test_failed_load_data_batch_is_undone_and_rejected():
+    connection = FakeConnection()
+    loader = BulkLoader(FakeConnectionManager(connection), batch_size=2, use_load_data=True, single_transaction=True)
+    df = revenue_frame([('2023-01-01', 1, 'p1', 1.0), ('2023-01-01', 2, 'p1', 2.0)])
+
+    result = loader.load(df)
+
+    assert (result.rows_inserted, result.rows_rejected) == (0, 2)
+    assert 'Lost connection' in result.rejected[0]['error']
+    assert connection.statements[0] == 'SAVEPOINT bulk_batch'
+    assert connection.statements[-2:] == ['ROLLBACK TO SAVEPOINT bulk_batch', 'COMMIT']
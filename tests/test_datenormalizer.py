@@ -0,0 +1,79 @@
+import pandas as pd
+import pytest
+from backend.datenormalizer import AmbiguousDateError, DateNormalizer
+from backend.fileprocessor import FileProcessor
+
+
+def normalize(values, normalizer=None):
+    parsed = (normalizer or DateNormalizer()).normalize(pd.Series(values))
+    return [None if pd.isna(value) else value.strftime('%Y-%m-%d') for value in parsed]
+
+
+def test_unambiguous_layouts():
+    assert normalize(['2023-01-05', '2023/02/06', '2023-03-07T10:30:00']) == ['2023-01-05', '2023-02-06', '2023-03-07']
+
+
+def test_day_first_is_detected_from_a_day_above_12():
+    assert normalize(['05-06-2022', '13-06-2022']) == ['2022-06-05', '2022-06-13']
+
+
+def test_month_first_is_detected_from_a_day_above_12():
+    assert normalize(['05/06/2022', '06/13/2022']) == ['2022-05-06', '2022-06-13']
+
+
+def test_each_separator_gets_its_own_order():
+    assert normalize(['05-06-2022', '13-06-2022', '05/06/2022', '06/13/2022']) == [
+        '2022-06-05', '2022-06-13', '2022-05-06', '2022-06-13',
+    ]
+
+
+def test_single_day_file_is_read_month_first():
+    assert normalize(['05-06-2022', '05-06-2022']) == ['2022-05-06', '2022-05-06']
+
+
+def test_undecidable_order_is_read_month_first():
+    assert normalize(['05-06-2022', '06-07-2022']) == ['2022-05-06', '2022-06-07']
+
+
+def test_both_orders_seen_are_rejected():
+    with pytest.raises(AmbiguousDateError):
+        normalize(['13-06-2022', '06-13-2022'])
+
+
+def test_unknown_layouts_and_invalid_dates():
+    assert normalize(['Jan 5 2022', 'not-a-date', None]) == ['2022-01-05', None, None]
+
+
+def test_order_scanned_from_the_whole_file_holds_for_every_chunk():
+    normalizer = DateNormalizer()
+    chunks = [pd.Series(['05-06-2022', '06-06-2022']), pd.Series(['13-06-2022', '14-06-2022'])]
+    for chunk in chunks:
+        normalizer.scan(chunk)
+    normalizer.decide_order()
+
+    assert normalize(chunks[0], normalizer) == ['2022-06-05', '2022-06-06']
+    assert normalize(chunks[1], normalizer) == ['2022-06-13', '2022-06-14']
+
+
+@pytest.mark.parametrize('chunksize', [2, 50000])
+def test_stored_dates_do_not_depend_on_the_chunk_size(storage, csv_file, chunksize):
+    rows = [('05-06-2022', 1, 'p1', 1.0), ('06-06-2022', 1, 'p1', 2.0), ('13-06-2022', 1, 'p1', 3.0),
+            ('14-06-2022', 1, 'p1', 4.0)]
+    FileProcessor(storage, chunksize=chunksize).process_file_streaming(csv_file('dmy.csv', rows))
+
+    assert list(storage.fetch_records_page()['date']) == ['2022-06-05', '2022-06-06', '2022-06-13', '2022-06-14']
+
+
+def test_file_with_undecidable_dates_is_imported_month_first(storage, csv_file):
+    rows = [('05-06-2022', 1, 'p1', 1.0), ('06-07-2022', 1, 'p1', 2.0)]
+
+    assert FileProcessor(storage, chunksize=1).process_file_streaming(csv_file('amb.csv', rows)) == (2, 0)
+    assert list(storage.fetch_records_page()['date']) == ['2022-05-06', '2022-06-07']
+
+
+def test_file_with_both_orders_is_not_imported(storage, csv_file):
+    rows = [('13-06-2022', 1, 'p1', 1.0), ('06-14-2022', 1, 'p1', 2.0)]
+
+    assert FileProcessor(storage, chunksize=1).process_file_streaming(csv_file('mixed.csv', rows)) is None
+    assert storage.count_records() == 0
+    assert not storage.is_file_imported('mixed.csv')
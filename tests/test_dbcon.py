@@ -0,0 +1,129 @@
+import mysql.connector
+import pytest
+from mysql.connector import Error
+from backend import dbcon
+from backend.dbcon import DatabaseConnectionManager, get_shared_pool
+
+
+class FakeServer:
+    def __init__(self, version=0):
+        self.version = version
+        self.up = True
+        self.queries = []
+
+
+class FakeCursor:
+    def __init__(self, connection, buffered):
+        self.connection = connection
+        self.buffered = buffered
+        self.row = None
+
+    def execute(self, query, params=()):
+        if self.connection.unread_result:
+            raise Error(msg="Unread result found")
+        if not self.connection.server.up:
+            raise Error(msg="Lost connection to MySQL server during query")
+        self.connection.server.queries.append(query)
+        if query.startswith('SELECT'):
+            self.row = (self.connection.server.version,)
+            self.connection.unread_result = not self.buffered
+
+    def fetchone(self):
+        return self.row
+
+    def close(self):
+        if self.connection.unread_result:
+            raise Error(msg="Unread result found")
+
+
+class FakeConnection:
+    def __init__(self, server):
+        self.server = server
+        self.in_transaction = False
+        self.unread_result = False
+
+    def cursor(self, dictionary=None, raw=None, buffered=None):
+        return FakeCursor(self, buffered)
+
+    def consume_results(self):
+        self.unread_result = False
+
+    def is_connected(self):
+        return self.server.up
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def servers(monkeypatch):
+    """Fake MySQL servers by port: 3306 is the primary, 3307 and 3308 are read replicas."""
+    servers = {3306: FakeServer(), 3307: FakeServer(), 3308: FakeServer()}
+
+    def connect(**connect_kwargs):
+        server = servers[connect_kwargs.get('port', 3306)]
+        if not server.up:
+            raise Error(msg="Can't connect to MySQL server")
+        return FakeConnection(server)
+
+    monkeypatch.setattr(mysql.connector, 'connect', connect)
+    monkeypatch.setattr(dbcon, '_pools', {})
+    return servers
+
+
+def manager(**options):
+    return DatabaseConnectionManager('127.0.0.1', 'user', 'password', 'revenue_db', port=3306, **options)
+
+
+def served_by(manager, servers, read_only=True):
+    with manager.get_connection_and_cursor(read_only=read_only) as (connection, cursor):
+        cursor.execute("SELECT 1")
+        cursor.fetchone()
+        return next(port for port, server in servers.items() if server is connection.server)
+
+
+def test_pool_settings_are_part_of_the_pool_key(servers):
+    small = get_shared_pool('127.0.0.1', 'user', 'password', 'revenue_db', port=3306, pool_size=2)
+
+    assert get_shared_pool('127.0.0.1', 'user', 'password', 'revenue_db', port=3306, pool_size=2) is small
+    larger = get_shared_pool('127.0.0.1', 'user', 'password', 'revenue_db', port=3306, pool_size=8)
+    assert larger is not small
+    assert larger.pool_size == 8
+
+
+def test_connection_with_an_unread_result_is_not_handed_to_the_next_borrower(servers):
+    connections = manager()
+    with connections.get_connection_and_cursor() as (connection, cursor):
+        cursor.execute("SELECT 1")  # result left unread
+
+    assert served_by(connections, servers, read_only=False) == 3306
+    assert connections.pool.stats()['in_use'] == 0
+
+
+def test_reads_rotate_over_replicas_and_writes_go_to_the_primary(servers):
+    connections = manager(replicas=['127.0.0.1:3307', '127.0.0.1:3308'])
+
+    assert sorted(served_by(connections, servers) for _ in range(4)) == [3307, 3307, 3308, 3308]
+    assert served_by(connections, servers, read_only=False) == 3306
+
+
+def test_reads_wait_for_a_replica_to_catch_up_with_the_known_version(servers):
+    connections = manager(replicas=['127.0.0.1:3307', '127.0.0.1:3308'])
+    servers[3307].version, servers[3308].version = 5, 3
+    connections.require_version(5)
+
+    assert {served_by(connections, servers) for _ in range(4)} == {3307}
+
+    connections.require_version(6)
+    assert {served_by(connections, servers) for _ in range(4)} == {3306}
+
+
+def test_a_replica_that_is_down_is_skipped(servers):
+    connections = manager(replicas=['127.0.0.1:3307', '127.0.0.1:3308'])
+    servers[3307].up = False
+
+    assert {served_by(connections, servers) for _ in range(4)} == {3308}
+    assert connections.pool_stats()['replicas']['127.0.0.1:3307']['available'] is False
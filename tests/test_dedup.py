@@ -0,0 +1,54 @@
+import io
+from backend.filehasher import fingerprint_file
+from backend.fileprocessor import FileProcessor
+
+
+def fingerprint(text, chunk_rows=2):
+    return fingerprint_file(io.BytesIO(text.encode()), chunk_rows)
+
+
+def test_chunk_hashes_ignore_blank_lines_and_line_endings():
+    plain = fingerprint('h\na\nb\nc\n')
+    spaced = fingerprint('h\r\na\r\n\r\nb\r\nc\r\n')
+
+    assert (plain.row_count, len(plain.chunk_hashes)) == (3, 2)
+    assert spaced.chunk_hashes == plain.chunk_hashes
+    assert spaced.content_hash != plain.content_hash
+
+
+def test_changed_chunks_include_edited_and_appended_chunks():
+    previous = fingerprint('h\na\nb\nc\n').chunk_hashes
+
+    assert fingerprint('h\na\nb\nc\n').changed_chunks(previous) == []
+    assert fingerprint('h\na\nB\nc\n').changed_chunks(previous) == [0]
+    assert fingerprint('h\na\nb\nc\nd\ne\n').changed_chunks(previous) == [1, 2]
+
+
+def test_identical_content_is_skipped_under_any_name(storage, csv_file, rows):
+    processor = FileProcessor(storage, chunksize=3)
+    processor.process_file_streaming(csv_file('a.csv', rows))
+    version = storage.data_version()
+
+    assert processor.process_file_streaming(csv_file('a.csv', rows)) is None
+    assert processor.process_file_streaming(csv_file('copy.csv', rows)) is None
+    assert storage.count_records() == 7
+    assert storage.data_version() == version
+
+
+def test_modified_file_reimports_only_changed_chunks(storage, csv_file, rows, stored_revenue):
+    processor = FileProcessor(storage, chunksize=3)
+    processor.process_file_streaming(csv_file('a.csv', rows))
+
+    edited = list(rows)
+    edited[4] = ('2023-01-03', 1, 'p3', 50.0)
+    upload = csv_file('a.csv', edited)
+    _, chunks = processor.plan_import(upload)
+    assert chunks == [1]
+
+    # Only the three rows of the changed chunk are upserted
+    assert processor.process_file_streaming(upload) == (3, 0)
+    stored = stored_revenue()
+    assert len(stored) == 7
+    assert stored[('2023-01-03', 1, 'p3')] == 50.0
+    assert stored[('2023-01-01', 1, 'p1')] == 1.5
+    assert processor.process_file_streaming(csv_file('a.csv', edited)) is None
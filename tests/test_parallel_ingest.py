@@ -0,0 +1,43 @@
+from backend.bulkloader import BulkLoadResult
+from backend.fileprocessor import FileProcessor
+from backend.parallelingest import ParallelIngestScheduler
+
+ROWS = [('2023-01-01', 1, 'p1', 1.5), ('2023-01-01', 2, 'p1', 2.5), ('2023-01-02', 1, 'p2', 3.5)]
+
+
+def failed_load(*args, **kwargs):
+    result = BulkLoadResult()
+    result.error = "database connection error"
+    return result
+
+
+def test_parallel_ingest_imports_new_files(storage, csv_file):
+    scheduler = ParallelIngestScheduler(storage, FileProcessor(storage), max_parse_workers=1, max_insert_workers=1)
+
+    statuses = scheduler.ingest([csv_file('a.csv', ROWS)])
+
+    assert [(status.status, status.rows_inserted) for status in statuses] == [('imported', 3)]
+    assert storage.is_file_imported('a.csv')
+
+
+def test_failed_insert_does_not_mark_the_file_imported(storage, csv_file, monkeypatch):
+    scheduler = ParallelIngestScheduler(storage, FileProcessor(storage), max_parse_workers=1, max_insert_workers=1)
+    monkeypatch.setattr(storage, 'insert_data_to_revenue_table', failed_load)
+
+    statuses = scheduler.ingest([csv_file('a.csv', ROWS)])
+
+    assert [status.status for status in statuses] == ['failed']
+    assert 'database connection error' in statuses[0].message
+    assert not storage.is_file_imported('a.csv')
+
+
+def test_failed_reimport_is_reported_as_failed(storage, csv_file, monkeypatch):
+    processor = FileProcessor(storage, chunksize=2)
+    processor.process_file_streaming(csv_file('a.csv', ROWS))
+    scheduler = ParallelIngestScheduler(storage, processor, max_parse_workers=1, max_insert_workers=1)
+    monkeypatch.setattr(processor, 'process_file_streaming', lambda uploaded_file, plan=None: None)
+
+    edited = ROWS[:2] + [('2023-01-02', 1, 'p2', 30.0)]
+    statuses = scheduler.ingest([csv_file('a.csv', edited)])
+
+    assert [(status.status, status.reported) for status in statuses] == [('failed', True)]
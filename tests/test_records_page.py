@@ -0,0 +1,96 @@
+from contextlib import contextmanager
+import pandas as pd
+import pytest
+from backend.databasemanager import DatabaseManager
+from backend.fileprocessor import FileProcessor
+from backend.querycache import QueryCache
+
+
+@pytest.fixture
+def records(storage):
+    rows = [
+        (f'2023-01-{day:02d}', city_code, plans, float(day * 10 + city_code))
+        for day in (3, 1, 2)
+        for city_code in (2, 1)
+        for plans in ('p2', 'p1')
+    ]
+    df = pd.DataFrame(rows, columns=['date', 'city_code', 'plans', 'plan_revenue_crores'])
+    storage.insert_data_to_revenue_table(FileProcessor.clean_dataframe(df))
+    return sorted((date, city_code, plans) for date, city_code, plans, _ in rows)
+
+
+def keys(page):
+    return list(zip(page['date'], page['city_code'], page['plans']))
+
+
+def walk(storage, page_size, **filters):
+    pages, after = [], None
+    while True:
+        page = storage.fetch_records_page(page_size=page_size, after=after, **filters)
+        if page.empty:
+            return pages
+        pages.append(keys(page))
+        after = pages[-1][-1]
+
+
+def test_pages_follow_the_key_order_without_gaps_or_repeats(storage, records):
+    pages = walk(storage, page_size=5)
+
+    assert [len(page) for page in pages] == [5, 5, 2]
+    assert [key for page in pages for key in page] == records
+
+
+def test_the_key_after_the_last_row_gives_an_empty_page(storage, records):
+    assert storage.fetch_records_page(page_size=5, after=records[-1]).empty
+
+
+def test_pages_with_filters(storage, records):
+    pages = walk(storage, page_size=2, city_code=1, start_date='2023-01-02')
+
+    expected = [key for key in records if key[1] == 1 and key[0] >= '2023-01-02']
+    assert [key for page in pages for key in page] == expected
+    assert storage.count_records(city_code=1, start_date='2023-01-02') == len(expected)
+
+
+class RecordingCursor:
+    description = [('date',), ('city_code',), ('plans',), ('plan_revenue_crores',)]
+
+    def __init__(self, statements):
+        self.statements = statements
+
+    def execute(self, query, params=()):
+        self.statements.append((' '.join(query.split()), list(params)))
+
+    def fetchall(self):
+        return []
+
+
+class RecordingConnectionManager:
+    def __init__(self):
+        self.statements = []
+
+    @contextmanager
+    def get_connection_and_cursor(self, **options):
+        yield object(), RecordingCursor(self.statements)
+
+
+@pytest.fixture
+def mysql_storage():
+    storage = DatabaseManager.__new__(DatabaseManager)
+    storage.db_manager = RecordingConnectionManager()
+    storage.query_cache = QueryCache()
+    storage.cache_namespace = ('localhost', 'revenue_db')
+    storage.data_version = lambda: None  # no version, so nothing is cached
+    return storage
+
+
+def test_mysql_pages_seek_on_the_fact_table_key(mysql_storage):
+    mysql_storage.fetch_records_page(page_size=5, after=('2023-01-02', 1, 'p2'), city_code=1, plans='p1')
+
+    [(query, params)] = mysql_storage.db_manager.statements
+    assert 'OFFSET' not in query
+    assert 'FROM revenue_fact STRAIGHT_JOIN dim_plan' in query
+    assert query.endswith('ORDER BY revenue_fact.date, revenue_fact.city_code, revenue_fact.plan_id LIMIT %s')
+    assert 'revenue_fact.plan_id > (SELECT plan_id FROM dim_plan WHERE plans = %s)' in query
+    assert query.count('%s') == len(params)
+    assert params == [1, 'p1', '2023-01-02', '2023-01-02', 1, 1, 'p2', 5]
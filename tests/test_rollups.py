@@ -0,0 +1,157 @@
+import random
+from collections import defaultdict
+from backend.rollups import RollupManager, _as_float32
+
+ADDITIVE_TABLES = {
+    'revenue_rollup_city_date': 2,
+    'revenue_rollup_plan': 1,
+    'revenue_rollup_city': 1,
+    'revenue_rollup_month': 1,
+}
+
+
+class FakeRollupCursor:
+    """Runs the statements RollupManager.apply_changes sends against in-memory rollup tables.
+
+    revenue_data ({(date, city_code, plans): revenue}) is what the revenue table holds once the batch
+    is written; only the plan maximum recompute reads it.
+    """
+
+    def __init__(self):
+        self.revenue_data = {}
+        self.totals = defaultdict(lambda: defaultdict(float))
+        self.plan_city = defaultdict(lambda: [0.0, 0])
+        self.plan_max = {}  # (plans, date, city_code) -> revenue
+        self._result = []
+
+    def execute(self, query, params=()):
+        statement = ' '.join(query.split())
+        if statement.startswith('SELECT plans, MAX(plan_revenue_crores)'):
+            maxima = {}
+            for (plans, _, _), revenue in self.plan_max.items():
+                if plans in params:
+                    maxima[plans] = max(maxima.get(plans, revenue), revenue)
+            self._result = [{'plans': plans, 'max_revenue': revenue} for plans, revenue in maxima.items()]
+        elif statement.startswith('SELECT EXISTS'):
+            self._result = [{'has_rows': any(key[0] == params[0] for key in self.plan_max)}]
+        elif statement.startswith('DELETE FROM revenue_rollup_plan_max WHERE plans = %s AND date'):
+            self.plan_max.pop(tuple(params), None)
+        elif statement.startswith('DELETE FROM revenue_rollup_plan_max WHERE plans = %s'):
+            self.plan_max = {key: value for key, value in self.plan_max.items() if key[0] != params[0]}
+        elif statement.startswith('INSERT INTO revenue_rollup_plan_max') and 'FROM revenue_data' in statement:
+            plans = params[0]
+            rows = {key: value for key, value in self.revenue_data.items() if key[2] == plans}
+            top = max(rows.values())
+            for (date, city_code, _), revenue in rows.items():
+                if revenue == top:
+                    self.plan_max[(plans, date, city_code)] = revenue
+        else:
+            raise AssertionError(f"unexpected statement: {statement}")
+
+    def executemany(self, query, rows):
+        statement = ' '.join(query.split())
+        table = statement.split()[2]
+        for row in rows:
+            if table in ADDITIVE_TABLES:
+                key_length = ADDITIVE_TABLES[table]
+                self.totals[table][tuple(row[:key_length])] += row[key_length]
+            elif table == 'revenue_rollup_plan_city':
+                self.plan_city[row[:2]][0] += row[2]
+                self.plan_city[row[:2]][1] += row[3]
+            elif table == 'revenue_rollup_plan_max':
+                plans, date, city_code, revenue = row
+                self.plan_max[(plans, date, city_code)] = revenue
+            else:
+                raise AssertionError(f"unexpected table: {table}")
+
+    def fetchall(self):
+        return self._result
+
+    def fetchone(self):
+        return self._result[0]
+
+
+def write(rollups, cursor, rows, upsert=True):
+    """Writes a batch the way BulkLoader does: compute the changes, store the rows, apply the rollups."""
+    accepted, rejected, changes = rollups.compute_changes(rows, dict(cursor.revenue_data), upsert)
+    for key, (_, new_revenue) in changes.items():
+        cursor.revenue_data[key] = new_revenue
+    rollups.apply_changes(cursor, changes)
+    return accepted, rejected
+
+
+def expected_plan_max(revenue_data):
+    top = {}
+    for (_, _, plans), revenue in revenue_data.items():
+        top[plans] = max(top.get(plans, revenue), revenue)
+    return {
+        (plans, date, city_code): revenue
+        for (date, city_code, plans), revenue in revenue_data.items()
+        if revenue == top[plans]
+    }
+
+
+def test_without_upsert_the_first_row_for_a_key_wins():
+    rows = [('2023-01-01', 1, 'p1', 1.0), ('2023-01-01', 1, 'p1', 2.0), ('2023-01-01', 2, 'p1', 3.0)]
+
+    accepted, rejected, changes = RollupManager.compute_changes(rows, {('2023-01-01', 2, 'p1'): 3.0}, upsert=False)
+
+    assert accepted == rows[:1]
+    assert [error.split(' for ')[0] for _, error in rejected] == ['Duplicate entry', 'Duplicate entry']
+    assert changes == {('2023-01-01', 1, 'p1'): (None, 1.0)}
+
+
+def test_with_upsert_the_last_row_wins_and_unchanged_rows_are_no_change():
+    rows = [('2023-01-01', 1, 'p1', 1.0), ('2023-01-01', 1, 'p1', 2.0), ('2023-01-01', 2, 'p1', 0.1)]
+    # Stored revenue comes back from the FLOAT column as a double; it still equals the new float32 value
+    existing = {('2023-01-01', 1, 'p1'): 5.0, ('2023-01-01', 2, 'p1'): _as_float32(0.1)}
+
+    accepted, rejected, changes = RollupManager.compute_changes(rows, existing, upsert=True)
+
+    assert (accepted, rejected) == (rows, [])
+    assert changes == {('2023-01-01', 1, 'p1'): (5.0, 2.0)}
+
+
+def test_invalid_values_are_rejected():
+    rows = [('2023-01-01', 'abc', 'p1', 1.0), ('2023-01-01', 1, 'p1', 'n/a'), ('2023-01-01', 1, 'p1', 1e300)]
+
+    accepted, rejected, changes = RollupManager.compute_changes(rows, {}, upsert=False)
+
+    assert (accepted, changes) == ([], {})
+    assert all(error.startswith('Invalid value') for _, error in rejected)
+
+
+def test_plan_max_keeps_ties_and_drops_lowered_top_rows():
+    rollups, cursor = RollupManager(), FakeRollupCursor()
+    write(rollups, cursor, [('2023-01-01', 1, 'p1', 5.0), ('2023-01-01', 2, 'p1', 3.0)])
+    write(rollups, cursor, [('2023-01-02', 2, 'p1', 5.0)])  # ties the maximum
+    assert set(cursor.plan_max) == {('p1', '2023-01-01', 1), ('p1', '2023-01-02', 2)}
+
+    write(rollups, cursor, [('2023-01-01', 1, 'p1', 1.0)])  # one tied row is lowered
+    assert cursor.plan_max == {('p1', '2023-01-02', 2): 5.0}
+
+    write(rollups, cursor, [('2023-01-02', 2, 'p1', 2.0)])  # the last top row is lowered
+    assert cursor.plan_max == {('p1', '2023-01-01', 2): 3.0}
+
+
+def test_incremental_rollups_match_a_rebuild():
+    rollups, cursor = RollupManager(), FakeRollupCursor()
+    generator = random.Random(7)
+    for _ in range(200):
+        batch = [
+            (f'2023-0{generator.randint(1, 2)}-0{generator.randint(1, 3)}', generator.randint(1, 3),
+             generator.choice(['p1', 'p2']), float(generator.choice([0, 1, 2, 3, 4])))
+            for _ in range(generator.randint(1, 4))
+        ]
+        write(rollups, cursor, batch)
+
+    assert cursor.plan_max == expected_plan_max(cursor.revenue_data)
+    plan_totals, plan_city = defaultdict(float), defaultdict(lambda: [0.0, 0])
+    for (date, city_code, plans), revenue in cursor.revenue_data.items():
+        plan_totals[(plans,)] += revenue
+        plan_city[(plans, city_code)][0] += revenue
+        plan_city[(plans, city_code)][1] += revenue != 0
+    assert {key: round(total, 6) for key, total in cursor.totals['revenue_rollup_plan'].items()} == dict(plan_totals)
+    assert {key: [round(total, 6), rows] for key, (total, rows) in cursor.plan_city.items()} == {
+        key: [total, rows] for key, (total, rows) in plan_city.items()
+    }
@@ -0,0 +1,90 @@
+import logging
+from contextlib import contextmanager
+import pandas as pd
+from mysql.connector import Error
+from backend.databasemanager import DatabaseManager
+from backend.fileprocessor import FileProcessor
+from backend.rollups import RollupManager
+
+
+def test_staged_import_upserts_a_changed_file(storage, csv_file, rows, stored_revenue):
+    processor = FileProcessor(storage, chunksize=3, staged=True)
+    assert processor.process_file_staged(csv_file('a.csv', rows)) == (7, 0)
+
+    edited = rows[:6] + [('2023-01-04', 1, 'p1', 70.0), ('2023-01-05', 1, 'p1', 8.5)]
+    assert processor.process_file_staged(csv_file('a.csv', edited)) == (2, 0)
+    stored = stored_revenue()
+    assert len(stored) == 8
+    assert stored[('2023-01-04', 1, 'p1')] == 70.0
+    assert stored[('2023-01-05', 1, 'p1')] == 8.5
+
+
+def test_staged_import_of_a_broken_file_writes_nothing(storage, csv_file, rows):
+    processor = FileProcessor(storage, chunksize=3, staged=True)
+    # The unterminated quote only fails the parser in the last chunk
+    rows = rows + ['2023-01-05,1,"p1,1.0']
+
+    assert processor.process_file_staged(csv_file('broken.csv', rows)) is None
+    assert storage.count_records() == 0
+    assert not storage.is_file_imported('broken.csv')
+
+
+class LostConnectionCursor:
+    """Cursor of a MySQL connection that drops while the stage is merged."""
+
+    def __init__(self):
+        self.connected = True
+
+    def execute(self, query, params=None):
+        if not self.connected:
+            raise Error(msg="MySQL Connection not available")
+        if query.lstrip().startswith('INSERT INTO revenue_rollup_city_date'):
+            self.connected = False
+            raise Error(msg="Lost connection to MySQL server during query")
+
+    def executemany(self, query, rows):
+        self.execute(query)
+
+    def fetchone(self):
+        return {'staged': 1}
+
+    def fetchall(self):
+        return [{'plans': 'p1'}]
+
+
+class LostConnection:
+    def rollback(self):
+        raise Error(msg="MySQL Connection not available")
+
+    def commit(self):
+        pass
+
+
+class LostConnectionManager:
+    @contextmanager
+    def get_connection_and_cursor(self):
+        yield LostConnection(), LostConnectionCursor()
+
+
+class KnownPlans:
+    def register(self, connection, cursor, labels):
+        return {label: 1 for label in labels}
+
+
+def test_staged_import_reports_the_error_that_ended_it(caplog):
+    storage = DatabaseManager.__new__(DatabaseManager)
+    storage.db_manager = LostConnectionManager()
+    storage.batch_size = 100
+    storage.use_load_data = False
+    storage.plan_codes = KnownPlans()
+    storage.rollups = RollupManager()
+    chunk = FileProcessor.clean_dataframe(
+        pd.DataFrame([('2023-01-01', 1, 'p1', 1.0)], columns=['date', 'city_code', 'plans', 'plan_revenue_crores'])
+    )
+
+    with caplog.at_level(logging.WARNING, logger='backend.databasemanager'):
+        assert storage.import_file_atomically('a.csv', [chunk]) is None
+
+    failure = [record for record in caplog.records if record.exc_info]
+    assert len(failure) == 1
+    assert "Lost connection" in str(failure[0].exc_info[1])
@@ -0,0 +1,30 @@
+import pytest
+from backend.storage import create_storage_backend
+
+
+@pytest.mark.parametrize('setting, expected', [
+    (None, False), ('', False), ('0', False), ('false', False), ('no', False),
+    ('1', True), ('true', True), ('YES', True),
+])
+def test_partition_setting_is_parsed(monkeypatch, setting, expected):
+    if setting is None:
+        monkeypatch.delenv('REVENUE_DB_PARTITION_BY_MONTH', raising=False)
+    else:
+        monkeypatch.setenv('REVENUE_DB_PARTITION_BY_MONTH', setting)
+
+    storage = create_storage_backend('mysql')
+
+    assert storage.schema.partition_by_month is expected
+
+
+def test_explicit_partition_argument_wins_over_the_environment(monkeypatch):
+    monkeypatch.setenv('REVENUE_DB_PARTITION_BY_MONTH', '1')
+
+    assert create_storage_backend('mysql', partition_by_month=False).schema.partition_by_month is False
+
+
+def test_sqlite_backend(tmp_path):
+    storage = create_storage_backend('sqlite', path=str(tmp_path / 'revenue.db'))
+    storage.create_tables()
+
+    assert storage.count_records() == 0
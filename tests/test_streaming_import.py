@@ -0,0 +1,47 @@
+import pandas as pd
+from backend.bulkloader import BulkLoadResult
+from backend.fileprocessor import FileProcessor
+
+
+def test_streaming_import_stores_every_row(storage, csv_file, rows, stored_revenue):
+    processor = FileProcessor(storage, chunksize=3)
+
+    assert processor.process_file_streaming(csv_file('a.csv', rows)) == (7, 0)
+    assert storage.count_records() == 7
+    assert stored_revenue()[('2023-01-03', 2, 'p3')] == 6.5
+    assert storage.is_file_imported('a.csv')
+    assert storage.get_import_checkpoint('a.csv') is None
+
+
+def test_resume_continues_after_the_committed_chunk(storage, csv_file, rows):
+    processor = FileProcessor(storage, chunksize=3)
+    # A run that stopped right after committing the first chunk
+    first_chunk = pd.DataFrame(rows[:3], columns=['date', 'city_code', 'plans', 'plan_revenue_crores'])
+    storage.insert_data_to_revenue_table(FileProcessor.clean_dataframe(first_chunk), checkpoint=('a.csv', 0, 0, 3))
+    assert storage.get_import_checkpoint('a.csv') == {'last_chunk': 0, 'rows_committed': 3, 'chunksize': 3}
+
+    assert processor.process_file_streaming(csv_file('a.csv', rows)) == (7, 0)
+    assert storage.count_records() == 7
+    assert storage.get_import_checkpoint('a.csv') is None
+
+
+def test_failed_chunk_stops_the_import_for_a_resume(storage, csv_file, rows, monkeypatch):
+    processor = FileProcessor(storage, chunksize=3)
+    insert = storage.insert_data_to_revenue_table
+
+    def fail_second_chunk(df, checkpoint=None, **kwargs):
+        if checkpoint[1] == 1:
+            result = BulkLoadResult()
+            result.error = "database connection error"
+            return result
+        return insert(df, checkpoint=checkpoint, **kwargs)
+
+    monkeypatch.setattr(storage, 'insert_data_to_revenue_table', fail_second_chunk)
+    assert processor.process_file_streaming(csv_file('a.csv', rows)) is None
+    assert not storage.is_file_imported('a.csv')
+    assert storage.get_import_checkpoint('a.csv') == {'last_chunk': 0, 'rows_committed': 3, 'chunksize': 3}
+
+    monkeypatch.setattr(storage, 'insert_data_to_revenue_table', insert)
+    assert processor.process_file_streaming(csv_file('a.csv', rows)) == (7, 0)
+    assert storage.count_records() == 7
+